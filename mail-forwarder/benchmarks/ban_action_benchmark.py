@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Ban action benchmark for the mail forwarder.
+
+Bans --count addresses the way each fail2ban ban action does (one iptables
+rule per address, an ipset member or an nftables set element, each added
+with its own command) and reports the insert time as the ban list grows.
+It then measures the packet path: TCP connections to a local port have to
+pass the ban check, so connect time with all bans in place shows what every
+incoming packet pays. Run it as root in the container (it needs NET_ADMIN);
+everything it creates is removed afterwards.
+"""
+
+import sys
+import time
+import socket
+import argparse
+import ipaddress
+import statistics
+import subprocess
+import threading
+
+CHAIN = "BANBENCH"
+IPSET_NAME = "banbench"
+NFT_TABLE = "banbench"
+
+def sh(*command, check=True):
+    return subprocess.run(command, capture_output=True, text=True, check=check)
+
+def banned_address(index):
+    """Addresses from 10.0.0.0/8; test traffic comes from 127.0.0.1, so every check walks the full list."""
+    return str(ipaddress.IPv4Address("10.0.0.1") + index)
+
+class IptablesRules:
+    """iptables-multiport: one rule per banned address in the jail's chain."""
+    name = "iptables-multiport"
+
+    def setup(self, port):
+        sh("iptables", "-N", CHAIN)
+        sh("iptables", "-I", "INPUT", "-p", "tcp", "--dport", str(port), "-j", CHAIN)
+
+    def ban(self, address):
+        sh("iptables", "-I", CHAIN, "1", "-s", address, "-j", "REJECT")
+
+    def teardown(self, port):
+        sh("iptables", "-D", "INPUT", "-p", "tcp", "--dport", str(port), "-j", CHAIN, check=False)
+        sh("iptables", "-F", CHAIN, check=False)
+        sh("iptables", "-X", CHAIN, check=False)
+
+class IPSetMembers:
+    """iptables-ipset-proto6: one rule matching a hash set, one set member per address."""
+    name = "iptables-ipset-proto6"
+
+    def setup(self, port):
+        sh("ipset", "create", IPSET_NAME, "hash:ip", "maxelem", "1000000")
+        sh("iptables", "-I", "INPUT", "-p", "tcp", "--dport", str(port),
+           "-m", "set", "--match-set", IPSET_NAME, "src", "-j", "REJECT")
+
+    def ban(self, address):
+        sh("ipset", "add", IPSET_NAME, address, "-exist")
+
+    def teardown(self, port):
+        sh("iptables", "-D", "INPUT", "-p", "tcp", "--dport", str(port),
+           "-m", "set", "--match-set", IPSET_NAME, "src", "-j", "REJECT", check=False)
+        sh("ipset", "destroy", IPSET_NAME, check=False)
+
+class NftablesSet:
+    """nftables-multiport: one rule matching a named set, one element per address."""
+    name = "nftables-multiport"
+
+    def setup(self, port):
+        sh("nft", "add", "table", "inet", NFT_TABLE)
+        sh("nft", "add", "set", "inet", NFT_TABLE, "banned", "{ type ipv4_addr; }")
+        sh("nft", "add", "chain", "inet", NFT_TABLE, "input", "{ type filter hook input priority -1; }")
+        sh("nft", "add", "rule", "inet", NFT_TABLE, "input", "tcp", "dport", str(port),
+           "ip", "saddr", "@banned", "reject")
+
+    def ban(self, address):
+        sh("nft", "add", "element", "inet", NFT_TABLE, "banned", f"{{ {address} }}")
+
+    def teardown(self, port):
+        sh("nft", "delete", "table", "inet", NFT_TABLE, check=False)
+
+BACKENDS = {backend.name: backend for backend in (IptablesRules, IPSetMembers, NftablesSet)}
+
+def serve(port, stop):
+    """Accept and close connections until stopped."""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", port))
+    listener.listen(1024)
+    listener.settimeout(0.2)
+    while not stop.is_set():
+        try:
+            conn, _ = listener.accept()
+            conn.close()
+        except socket.timeout:
+            pass
+    listener.close()
+
+def connect_time(port, count):
+    """Median microseconds for a TCP connect to the local port."""
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        with socket.create_connection(("127.0.0.1", port), timeout=5):
+            pass
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1e6
+
+def run(backend, args):
+    """Ban args.count addresses and measure; returns the result dictionary."""
+    try:
+        backend.setup(args.port)
+        baseline = connect_time(args.port, args.connections)
+        insert_times = []
+        for index in range(args.count):
+            start = time.perf_counter()
+            backend.ban(banned_address(index))
+            insert_times.append(time.perf_counter() - start)
+        loaded = connect_time(args.port, args.connections)
+    finally:
+        backend.teardown(args.port)
+
+    window = min(100, args.count)
+    return {
+        "backend": backend.name,
+        "first_ms": statistics.mean(insert_times[:window]) * 1000,
+        "last_ms": statistics.mean(insert_times[-window:]) * 1000,
+        "total_s": sum(insert_times),
+        "baseline_us": baseline,
+        "loaded_us": loaded,
+    }
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Compare fail2ban ban actions at a large number of bans")
+    parser.add_argument("backends", nargs="*", default=list(BACKENDS), metavar="BACKEND",
+                        help=f"Ban actions to measure (default: all of {', '.join(BACKENDS)})")
+    parser.add_argument("--count", type=int, default=10000, help="Addresses to ban")
+    parser.add_argument("--connections", type=int, default=2000, help="Connections per packet path measurement")
+    parser.add_argument("--port", type=int, default=20025, help="Local port used for the packet path test")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.backends if name not in BACKENDS]
+    if unknown:
+        parser.error(f"unknown ban action: {', '.join(unknown)}")
+
+    stop = threading.Event()
+    server = threading.Thread(target=serve, args=(args.port, stop), daemon=True)
+    server.start()
+    time.sleep(0.3)
+
+    results = []
+    try:
+        for name in args.backends:
+            try:
+                results.append(run(BACKENDS[name](), args))
+            except (subprocess.CalledProcessError, OSError) as e:
+                detail = e.stderr.strip() if isinstance(e, subprocess.CalledProcessError) else e
+                print(f"{name}: not supported here ({detail})", file=sys.stderr)
+    finally:
+        stop.set()
+        server.join()
+
+    print(f"{'ban action':<22} {'first ban ms':>12} {'last ban ms':>11} {'total s':>8} "
+          f"{'connect us (0 bans)':>19} {f'connect us ({args.count} bans)':>22}")
+    for r in results:
+        print(f"{r['backend']:<22} {r['first_ms']:>12.2f} {r['last_ms']:>11.2f} {r['total_s']:>8.1f} "
+              f"{r['baseline_us']:>19.1f} {r['loaded_us']:>22.1f}")
+
+    return 0 if results else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
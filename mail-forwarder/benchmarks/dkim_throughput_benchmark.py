@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+DKIM signing throughput benchmark for the mail forwarder.
+
+Pushes N messages through a running Postfix + OpenDKIM whose relay host
+points at the local sink started by this script, then reports signed
+messages/sec and the end-to-end latency. With --baseline-port (a listener
+without milters, e.g. "-o smtpd_milters=" in master.cf) the same run is
+repeated unsigned and the latency added by signing is reported.
+
+With --port given more than once, all listeners are loaded at the same
+time and reported separately. Running that with DKIM_ISOLATE_LISTENERS off
+and on shows whether a separate OpenDKIM process per listener changes the
+rates or latencies.
+"""
+
+import sys
+import time
+import uuid
+import asyncio
+import smtplib
+import ssl
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+from smtp_sink import SMTPSink
+
+def percentile(values, fraction):
+    """Return the given percentile of a sorted list."""
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def build_message(args, run_id, index):
+    """Build a test message carrying its send timestamp."""
+    msg = EmailMessage()
+    msg["From"] = args.sender
+    msg["To"] = args.recipient
+    msg["Subject"] = f"DKIM benchmark {index}"
+    msg["Message-ID"] = f"<{run_id}.{index}@benchmark.local>"
+    msg["X-Benchmark-Run"] = run_id
+    msg["X-Benchmark-Sent"] = repr(time.time())
+    msg.set_content("x" * args.size)
+    return msg
+
+def connect(args, port):
+    """Open an SMTP session: implicit TLS on 465, and STARTTLS plus AUTH with --login except on port 25."""
+    # The benchmark talks to its own server, whose certificate may well be self-signed
+    context = ssl._create_unverified_context()
+    if port == 465:
+        smtp = smtplib.SMTP_SSL(args.host, port, timeout=30, context=context)
+    else:
+        smtp = smtplib.SMTP(args.host, port, timeout=30)
+        if args.login and port != 25:
+            smtp.starttls(context=context)
+    if args.login and port != 25:
+        user, _, password = args.login.partition(":")
+        smtp.login(user, password)
+    return smtp
+
+def run(args, sink, ports):
+    """Send args.count messages to each of the given ports at once and wait for them at the sink."""
+    run_ids = {port: uuid.uuid4().hex for port in ports}
+    arrivals = {run_id: [] for run_id in run_ids.values()}
+    done = {run_id: threading.Event() for run_id in run_ids.values()}
+
+    def on_message(message):
+        run_id = message.headers.get("x-benchmark-run")
+        if run_id not in arrivals:
+            return
+        arrivals[run_id].append(message)
+        if len(arrivals[run_id]) >= args.count:
+            done[run_id].set()
+
+    sink.on_message = on_message
+
+    def load(port):
+        local = threading.local()
+
+        def send(index):
+            if not hasattr(local, "smtp"):
+                local.smtp = connect(args, port)
+            local.smtp.send_message(build_message(args, run_ids[port], index))
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(send, range(args.count)))
+        return start, time.time() - start
+
+    with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+        timings = dict(zip(ports, pool.map(load, ports)))
+
+    return [summarize(args, port, *timings[port], arrivals[run_ids[port]], done[run_ids[port]]) for port in ports]
+
+def summarize(args, port, start, submitted, arrivals, done):
+    """Wait for one port's messages and compute its rates and latencies."""
+    done.wait(args.timeout)
+    elapsed = (max(m.arrived_at for m in arrivals) if arrivals else time.time()) - start
+
+    latencies = sorted(m.arrived_at - float(m.headers["x-benchmark-sent"]) for m in arrivals)
+    signed = sum(1 for m in arrivals if "dkim-signature" in m.headers)
+    return {
+        "port": port,
+        "received": len(arrivals),
+        "signed": signed,
+        "submit_rate": args.count / submitted if submitted else 0.0,
+        "signed_rate": signed / elapsed if elapsed > 0 else 0.0,
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+    }
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Measure DKIM signing throughput through Postfix + OpenDKIM")
+    parser.add_argument("--host", default="127.0.0.1", help="Postfix host")
+    parser.add_argument("--port", type=int, action="append",
+                        help="Postfix port with DKIM signing; repeat to load several listeners at once (default 25)")
+    parser.add_argument("--baseline-port", type=int, help="Postfix port without milters, for comparison")
+    parser.add_argument("--login", help="USER:PASSWORD to authenticate with on the submission and SMTPS ports")
+    parser.add_argument("--sink-host", default="0.0.0.0", help="Address the sink listens on")
+    parser.add_argument("--sink-port", type=int, default=2525, help="Port the sink listens on (Postfix relay target)")
+    parser.add_argument("--sender", default="bench@example.com", help="Envelope and header sender (a DKIM domain)")
+    parser.add_argument("--recipient", default="sink@example.net", help="Recipient address")
+    parser.add_argument("--count", type=int, default=1000, help="Messages per run")
+    parser.add_argument("--size", type=int, default=4096, help="Body size in bytes")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent SMTP sessions")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for deliveries")
+    args = parser.parse_args()
+    args.port = args.port or [25]
+
+    loop = asyncio.new_event_loop()
+    sink = SMTPSink(args.sink_host, args.sink_port)
+    loop.run_until_complete(sink.start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+
+    results = run(args, sink, args.port)
+    if args.baseline_port:
+        results += run(args, sink, [args.baseline_port])
+
+    print(f"{'port':>6} {'received':>9} {'signed':>7} {'submit/s':>9} {'signed/s':>9} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        print(f"{r['port']:>6} {r['received']:>9} {r['signed']:>7} {r['submit_rate']:>9.1f} "
+              f"{r['signed_rate']:>9.1f} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f}")
+
+    if args.baseline_port:
+        signed, baseline = results[0], results[-1]
+        print(f"\nLatency added by signing on port {signed['port']}: p50 {signed['p50'] - baseline['p50']:+.1f} ms, "
+              f"p99 {signed['p99'] - baseline['p99']:+.1f} ms")
+
+    return 0 if all(r["received"] == args.count for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
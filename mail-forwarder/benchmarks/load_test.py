@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Load-test harness for the mail forwarder.
+
+Pushes mail at a configurable rate and size mix into a running forwarder
+whose relay host points at the SMTP sink started by this script (see
+docker-compose.loadtest.yml), then reports accepted msgs/sec, end-to-end
+latency percentiles, queue growth and CPU time per message. Queue depth and
+CPU are sampled from the container with "docker exec" when --container is
+given.
+"""
+
+import sys
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import subprocess
+from email.utils import formatdate
+
+from smtp_sink import SMTPSink
+
+def percentile(values, fraction):
+    """Return the given percentile of a sorted list."""
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+class SMTPClient:
+    """A minimal asyncio SMTP client that sends several messages per connection."""
+
+    def __init__(self, host, port, timeout):
+        self.host, self.port, self.timeout = host, port, timeout
+        self.reader = self.writer = None
+
+    async def _reply(self):
+        while True:
+            line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            if not line:
+                raise ConnectionError("Connection closed by server")
+            if line[3:4] != b"-":
+                return int(line[:3])
+
+    async def _command(self, command):
+        self.writer.write(command + b"\r\n")
+        await self.writer.drain()
+        return await self._reply()
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+        if await self._reply() != 220 or await self._command(b"EHLO loadtest.local") != 250:
+            raise ConnectionError("Server did not greet us")
+
+    async def send(self, sender, recipient, data):
+        """Send one message; returns the final reply code."""
+        if self.writer is None:
+            await self.connect()
+        code = await self._command(b"MAIL FROM:<%s>" % sender.encode())
+        if code == 250:
+            code = await self._command(b"RCPT TO:<%s>" % recipient.encode())
+        if code == 250:
+            code = await self._command(b"DATA")
+            if code == 354:
+                self.writer.write(data + b"\r\n.\r\n")
+                await self.writer.drain()
+                return await self._reply()
+        await self._command(b"RSET")
+        return code
+
+    async def close(self):
+        if self.writer is not None:
+            try:
+                await self._command(b"QUIT")
+            except (ConnectionError, asyncio.TimeoutError):
+                pass
+            self.writer.close()
+            self.writer = None
+
+def build_message(args, run_id, index, size):
+    """Build a message of roughly the given size carrying its send timestamp."""
+    headers = (
+        f"From: <{args.sender}>\r\n"
+        f"To: <{args.recipient}>\r\n"
+        f"Subject: Load test {index}\r\n"
+        f"Date: {formatdate()}\r\n"
+        f"Message-ID: <{run_id}.{index}@loadtest.local>\r\n"
+        f"X-Benchmark-Run: {run_id}\r\n"
+        f"X-Benchmark-Sent: {time.time()!r}\r\n"
+        f"\r\n"
+    ).encode()
+    body_lines = max(size - len(headers), 0) // 78
+    return headers + b"\r\n".join([b"x" * 76] * body_lines)
+
+def docker_exec(container, command):
+    """Run a command in the container and return its output, or None on failure."""
+    try:
+        return subprocess.run(["docker", "exec", container] + command, capture_output=True,
+                              text=True, timeout=10, check=True).stdout
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+def queue_depth(container):
+    """Return the number of messages in the Postfix queue."""
+    output = docker_exec(container, ["postqueue", "-j"])
+    return None if output is None else len(output.splitlines())
+
+def cpu_seconds(container):
+    """Return the container's total CPU time in seconds (cgroup v2, then v1)."""
+    output = docker_exec(container, ["cat", "/sys/fs/cgroup/cpu.stat"])
+    if output:
+        for line in output.splitlines():
+            if line.startswith("usage_usec "):
+                return int(line.split()[1]) / 1e6
+    output = docker_exec(container, ["cat", "/sys/fs/cgroup/cpuacct/cpuacct.usage"])
+    return int(output) / 1e9 if output and output.strip().isdigit() else None
+
+async def sample_queue(args, samples, stop):
+    """Sample the queue depth until stopped."""
+    while not stop.is_set():
+        depth = await asyncio.get_running_loop().run_in_executor(None, queue_depth, args.container)
+        if depth is not None:
+            samples.append((time.time(), depth))
+        try:
+            await asyncio.wait_for(stop.wait(), args.sample_interval)
+        except asyncio.TimeoutError:
+            pass
+
+async def run(args):
+    """Run the load test and return the result dictionary."""
+    run_id = uuid.uuid4().hex
+    sizes = [int(size) for size in args.sizes.split(",")]
+    arrivals = []
+    all_arrived = asyncio.Event()
+
+    def on_message(message):
+        if message.headers.get("x-benchmark-run") != run_id:
+            return
+        arrivals.append(message)
+        if len(arrivals) >= accepted:
+            all_arrived.set()
+
+    sink = SMTPSink(args.sink_host, args.sink_port, on_message=on_message)
+    await sink.start()
+
+    accepted = rejected = errors = 0
+    accepted_latencies = []
+    queue_samples = []
+    stop_sampling = asyncio.Event()
+    sampler = asyncio.create_task(sample_queue(args, queue_samples, stop_sampling)) if args.container else None
+    cpu_before = cpu_seconds(args.container) if args.container else None
+
+    # Messages are scheduled at a fixed rate and shared out over the connections
+    queue = asyncio.Queue()
+    for index in range(args.count):
+        queue.put_nowait(index)
+    start = time.time()
+
+    async def worker():
+        nonlocal accepted, rejected, errors
+        client = SMTPClient(args.host, args.port, args.timeout)
+        while True:
+            try:
+                index = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if args.rate:
+                delay = start + index / args.rate - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            data = build_message(args, run_id, index, random.choice(sizes))
+            sent_at = time.time()
+            try:
+                code = await client.send(args.sender, args.recipient, data)
+            except (ConnectionError, OSError, asyncio.TimeoutError):
+                errors += 1
+                await client.close()
+                continue
+            if code == 250:
+                accepted += 1
+                accepted_latencies.append(time.time() - sent_at)
+            else:
+                rejected += 1
+        await client.close()
+
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    submit_elapsed = time.time() - start
+
+    # Wait for the forwarder to deliver what it accepted
+    if accepted:
+        try:
+            await asyncio.wait_for(all_arrived.wait(), args.drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+    total_elapsed = time.time() - start
+
+    cpu_after = cpu_seconds(args.container) if args.container else None
+    if sampler:
+        stop_sampling.set()
+        await sampler
+    await sink.stop()
+
+    latencies = sorted(m.arrived_at - float(m.headers["x-benchmark-sent"]) for m in arrivals)
+    accepted_latencies.sort()
+    depths = [depth for _, depth in queue_samples]
+    cpu = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return {
+        "submitted": args.count,
+        "accepted": accepted,
+        "rejected": rejected,
+        "errors": errors,
+        "delivered": len(arrivals),
+        "accept_rate": accepted / submit_elapsed if submit_elapsed else 0.0,
+        "delivery_rate": len(arrivals) / total_elapsed if total_elapsed else 0.0,
+        "accept_p50": percentile(accepted_latencies, 0.50) * 1000,
+        "accept_p99": percentile(accepted_latencies, 0.99) * 1000,
+        "e2e_p50": percentile(latencies, 0.50) * 1000,
+        "e2e_p95": percentile(latencies, 0.95) * 1000,
+        "e2e_p99": percentile(latencies, 0.99) * 1000,
+        "queue_start": depths[0] if depths else None,
+        "queue_max": max(depths) if depths else None,
+        "queue_end": depths[-1] if depths else None,
+        "cpu_ms_per_msg": cpu * 1000 / len(arrivals) if cpu is not None and arrivals else None,
+    }
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Load-test a running mail forwarder")
+    parser.add_argument("--host", default="127.0.0.1", help="Forwarder host")
+    parser.add_argument("--port", type=int, default=25, help="Forwarder SMTP port")
+    parser.add_argument("--sink-host", default="0.0.0.0", help="Address the sink listens on")
+    parser.add_argument("--sink-port", type=int, default=2525, help="Port the sink listens on (forwarder relay target)")
+    parser.add_argument("--sender", default="loadtest@sender.example.org", help="Envelope sender")
+    parser.add_argument("--recipient", default="user@loadtest.example.com",
+                        help="Recipient, forwarded by the forwarder to the sink")
+    parser.add_argument("--count", type=int, default=5000, help="Messages to send")
+    parser.add_argument("--rate", type=float, default=0, help="Target messages/sec (0 = as fast as possible)")
+    parser.add_argument("--sizes", default="4096", help="Comma-separated message sizes in bytes, picked at random")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent SMTP connections")
+    parser.add_argument("--timeout", type=float, default=60.0, help="SMTP command timeout in seconds")
+    parser.add_argument("--drain-timeout", type=float, default=300.0,
+                        help="Seconds to wait for accepted messages to reach the sink")
+    parser.add_argument("--container", help="Forwarder container to sample queue depth and CPU from")
+    parser.add_argument("--sample-interval", type=float, default=2.0, help="Seconds between queue samples")
+    args = parser.parse_args()
+
+    r = asyncio.run(run(args))
+
+    def fmt(value, spec=""):
+        return "n/a" if value is None else format(value, spec)
+
+    print(f"Submitted {r['submitted']}: {r['accepted']} accepted, {r['rejected']} rejected, "
+          f"{r['errors']} connection errors; {r['delivered']} delivered to the sink")
+    print(f"Accepted:     {r['accept_rate']:.1f} msgs/sec "
+          f"(accept latency p50 {r['accept_p50']:.1f} ms, p99 {r['accept_p99']:.1f} ms)")
+    print(f"Delivered:    {r['delivery_rate']:.1f} msgs/sec")
+    print(f"End-to-end:   p50 {r['e2e_p50']:.1f} ms, p95 {r['e2e_p95']:.1f} ms, p99 {r['e2e_p99']:.1f} ms")
+    print(f"Queue depth:  start {fmt(r['queue_start'])}, max {fmt(r['queue_max'])}, end {fmt(r['queue_end'])}")
+    print(f"CPU/message:  {fmt(r['cpu_ms_per_msg'], '.2f')} ms")
+
+    return 0 if r["delivered"] == r["accepted"] and not r["errors"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Mail log fan-out overhead benchmark for the mail forwarder.
+
+Starts log_fanout.py on a temporary socket and file, floods it with
+Postfix-like syslog messages the way smtpd does under load, and reports
+messages/sec, the time a sender spends per message and the CPU time the
+fan-out uses per message. Each flush interval given is measured separately,
+so batched writing can be compared with writing every message immediately.
+"""
+
+import os
+import sys
+import time
+import socket
+import signal
+import argparse
+import tempfile
+import subprocess
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+
+def count_lines(path):
+    """Count the lines in the log file and its rotated copies."""
+    total = 0
+    for name in os.listdir(os.path.dirname(path)):
+        if name.startswith(os.path.basename(path)):
+            with open(os.path.join(os.path.dirname(path), name), 'rb') as f:
+                total += sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+    return total
+
+def run(args, flush_interval):
+    """Measure one flush interval, returning the result dictionary."""
+    with tempfile.TemporaryDirectory() as tmp:
+        sock_path = os.path.join(tmp, "log.sock")
+        log_path = os.path.join(tmp, "mail.log")
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(args.scripts_dir, "log_fanout.py"), "--socket", sock_path,
+             "--file", log_path, "--max-bytes", str(args.max_bytes), "--backups", "1",
+             "--flush-interval", str(flush_interval)],
+            stdout=None if args.stdout else subprocess.DEVNULL
+        )
+        try:
+            deadline = time.time() + 10
+            while not os.path.exists(sock_path):
+                if time.time() > deadline:
+                    raise RuntimeError("log_fanout.py did not start")
+                time.sleep(0.05)
+
+            sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sender.connect(sock_path)
+            # Roughly the size of a Postfix smtpd/cleanup/qmgr line
+            message = (b"<22>Oct 18 12:00:00 postfix/smtpd[4242]: 4B2F81C0A3F: client=mail-sor-f41.google.com"
+                       b"[209.85.220.41], sasl_method=PLAIN, sasl_username=user@example.com %d")
+
+            start = time.perf_counter()
+            for index in range(args.count):
+                sender.send(message % index)
+            send_elapsed = time.perf_counter() - start
+
+            # Wait for every message to reach the file
+            while count_lines(log_path) < args.count:
+                if time.perf_counter() - start > args.timeout:
+                    break
+                time.sleep(0.05)
+            total_elapsed = time.perf_counter() - start
+            written = count_lines(log_path)
+        finally:
+            process.send_signal(signal.SIGTERM)
+            _, _, usage = os.wait4(process.pid, 0)
+
+    cpu = usage.ru_utime + usage.ru_stime
+    return {
+        "flush_interval": flush_interval,
+        "written": written,
+        "rate": written / total_elapsed if total_elapsed else 0.0,
+        "send_us": send_elapsed / args.count * 1e6,
+        "cpu_us": cpu / written * 1e6 if written else 0.0,
+    }
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Measure the overhead of the mail log fan-out")
+    parser.add_argument("--count", type=int, default=200000, help="Messages per run")
+    parser.add_argument("--flush-intervals", default="1,0",
+                        help="Comma-separated flush intervals to compare (0 = write every message)")
+    parser.add_argument("--max-bytes", type=int, default=1 << 30,
+                        help="Mail log rotation size; keep it above the run's output, rotated-out lines aren't counted")
+    parser.add_argument("--stdout", action="store_true", help="Show the stdout copy instead of discarding it")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds to wait for messages to be written")
+    parser.add_argument("--scripts-dir", default=SCRIPTS_DIR, help="Directory containing log_fanout.py")
+    args = parser.parse_args()
+
+    results = [run(args, float(interval)) for interval in args.flush_intervals.split(",")]
+
+    print(f"{'flush interval':>14} {'written':>8} {'msgs/s':>9} {'send us/msg':>12} {'cpu us/msg':>11}")
+    for r in results:
+        print(f"{r['flush_interval']:>13.1f}s {r['written']:>8} {r['rate']:>9.0f} "
+              f"{r['send_us']:>12.2f} {r['cpu_us']:>11.2f}")
+
+    return 0 if all(r["written"] == args.count for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
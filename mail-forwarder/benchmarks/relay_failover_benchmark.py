@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Relay failover benchmark for the mail forwarder.
+
+Starts two SMTP sinks as a stand-in relay pair (relay A and relay B) for a
+forwarder whose relay pool points at them (see docker-compose.failover.yml),
+then sends mail through the forwarder in three phases: both relays up,
+relay A refusing connections, and relay A accepting connections but never
+greeting, like a hung server. For each phase it reports how the mail was
+spread over the relays and the end-to-end delivery latency, which shows
+what a relay failure costs the mail that tried that relay first.
+"""
+
+import sys
+import time
+import uuid
+import asyncio
+import argparse
+
+from load_test import SMTPClient, build_message, percentile
+from smtp_sink import SMTPSink
+
+PHASES = ["healthy", "refusing", "hung"]
+
+class HungServer:
+    """Accepts connections and holds them open without ever sending a greeting."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self._server = None
+        self._writers = []
+
+    async def _handle(self, reader, writer):
+        self._writers.append(writer)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        for writer in self._writers:
+            writer.close()
+
+async def run_phase(args, phase):
+    """Send args.count messages with relay A in the given state; returns the result dictionary."""
+    run_id = uuid.uuid4().hex
+    arrivals = {"A": [], "B": []}
+    all_arrived = asyncio.Event()
+
+    def receiver(relay):
+        def on_message(message):
+            if message.headers.get("x-benchmark-run") != run_id:
+                return
+            arrivals[relay].append(message)
+            if sum(len(messages) for messages in arrivals.values()) >= accepted:
+                all_arrived.set()
+        return on_message
+
+    relay_b = SMTPSink(args.sink_host, args.port_b, on_message=receiver("B"))
+    await relay_b.start()
+    relay_a = None
+    if phase == "healthy":
+        relay_a = SMTPSink(args.sink_host, args.port_a, on_message=receiver("A"))
+    elif phase == "hung":
+        relay_a = HungServer(args.sink_host, args.port_a)
+    if relay_a:
+        await relay_a.start()
+
+    accepted = 0
+    client = SMTPClient(args.host, args.port, args.timeout)
+    start = time.time()
+    try:
+        for index in range(args.count):
+            if args.rate:
+                delay = start + index / args.rate - time.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if await client.send(args.sender, args.recipient, build_message(args, run_id, index, args.size)) == 250:
+                accepted += 1
+    finally:
+        await client.close()
+
+    if accepted:
+        try:
+            await asyncio.wait_for(all_arrived.wait(), args.drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    if relay_a:
+        await relay_a.stop()
+    await relay_b.stop()
+
+    latencies = sorted(m.arrived_at - float(m.headers["x-benchmark-sent"])
+                       for messages in arrivals.values() for m in messages)
+    return {
+        "phase": phase,
+        "accepted": accepted,
+        "relay_a": len(arrivals["A"]),
+        "relay_b": len(arrivals["B"]),
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "max": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+async def run(args):
+    results = []
+    for phase in args.phases.split(","):
+        results.append(await run_phase(args, phase))
+        # Let Postfix forget the failed relay's connections before the next phase
+        await asyncio.sleep(args.pause)
+    return results
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Measure relay failover latency of a running mail forwarder")
+    parser.add_argument("--host", default="127.0.0.1", help="Forwarder host")
+    parser.add_argument("--port", type=int, default=2500, help="Forwarder SMTP port")
+    parser.add_argument("--sink-host", default="0.0.0.0", help="Address the stand-in relays listen on")
+    parser.add_argument("--port-a", type=int, default=2525, help="Port of relay A, the one that fails")
+    parser.add_argument("--port-b", type=int, default=2526, help="Port of relay B")
+    parser.add_argument("--sender", default="failover@sender.example.org", help="Envelope sender")
+    parser.add_argument("--recipient", default="user@loadtest.example.com",
+                        help="Recipient, forwarded by the forwarder through the relays")
+    parser.add_argument("--phases", default=",".join(PHASES), help=f"Phases to run (default: {','.join(PHASES)})")
+    parser.add_argument("--count", type=int, default=200, help="Messages per phase")
+    parser.add_argument("--rate", type=float, default=20, help="Messages/sec (0 = as fast as possible)")
+    parser.add_argument("--size", type=int, default=4096, help="Message size in bytes")
+    parser.add_argument("--timeout", type=float, default=60.0, help="SMTP command timeout in seconds")
+    parser.add_argument("--drain-timeout", type=float, default=300.0,
+                        help="Seconds to wait for a phase's messages to reach the relays")
+    parser.add_argument("--pause", type=float, default=5.0, help="Seconds between phases")
+    args = parser.parse_args()
+
+    unknown = [phase for phase in args.phases.split(",") if phase not in PHASES]
+    if unknown:
+        parser.error(f"unknown phase: {', '.join(unknown)}")
+
+    results = asyncio.run(run(args))
+
+    print(f"{'relay A':<9} {'accepted':>8} {'via A':>6} {'via B':>6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for r in results:
+        print(f"{r['phase']:<9} {r['accepted']:>8} {r['relay_a']:>6} {r['relay_b']:>6} "
+              f"{r['p50']:>9.1f} {r['p95']:>9.1f} {r['max']:>9.1f}")
+
+    return 0 if all(r["relay_a"] + r["relay_b"] == r["accepted"] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Local SMTP sink for mail forwarder benchmarks.
+Accepts and discards mail, recording when each message arrived and which
+headers it carried. Used as a stand-in for the relay or destination server.
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('smtp_sink')
+
+@dataclass
+class ReceivedMessage:
+    """A message accepted by the sink."""
+    arrived_at: float
+    size: int
+    headers: Dict[str, str] = field(default_factory=dict)
+
+def parse_headers(data: bytes) -> Dict[str, str]:
+    """Parse the header block of a message into a dict of lowercased names."""
+    headers = {}
+    name = None
+    for line in data.split(b"\r\n\r\n", 1)[0].split(b"\r\n"):
+        if line[:1] in (b" ", b"\t") and name:
+            headers[name] += " " + line.strip().decode("utf-8", "replace")
+        elif b":" in line:
+            raw_name, value = line.split(b":", 1)
+            name = raw_name.strip().lower().decode("ascii", "replace")
+            headers.setdefault(name, value.strip().decode("utf-8", "replace"))
+    return headers
+
+class SMTPSink:
+    """A minimal asyncio ESMTP server that accepts every message."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 2525, reply_delay: float = 0.0,
+                 on_message: Optional[Callable[[ReceivedMessage], None]] = None):
+        self.host = host
+        self.port = port
+        self.reply_delay = reply_delay
+        self.on_message = on_message
+        self.messages: List[ReceivedMessage] = []
+        self._server = None
+
+    async def _reply(self, writer, line: bytes):
+        if self.reply_delay:
+            await asyncio.sleep(self.reply_delay)
+        writer.write(line + b"\r\n")
+        await writer.drain()
+
+    async def _handle(self, reader, writer):
+        try:
+            await self._reply(writer, b"220 sink.local ESMTP benchmark sink")
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                verb = line[:4].upper()
+                if verb in (b"EHLO", b"HELO"):
+                    writer.write(b"250-sink.local\r\n250-PIPELINING\r\n250-8BITMIME\r\n250 SIZE 0\r\n")
+                    await writer.drain()
+                elif verb == b"DATA":
+                    await self._reply(writer, b"354 End data with <CR><LF>.<CR><LF>")
+                    data = await reader.readuntil(b"\r\n.\r\n")
+                    message = ReceivedMessage(time.time(), len(data), parse_headers(data))
+                    self.messages.append(message)
+                    if self.on_message:
+                        self.on_message(message)
+                    await self._reply(writer, b"250 2.0.0 Ok: queued")
+                elif verb == b"QUIT":
+                    await self._reply(writer, b"221 2.0.0 Bye")
+                    break
+                else:
+                    # MAIL, RCPT, RSET, NOOP and anything else
+                    await self._reply(writer, b"250 2.0.0 Ok")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        """Start listening."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"SMTP sink listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        """Stop listening."""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+async def serve(args):
+    """Run the sink until interrupted, printing a rate line every interval."""
+    sink = SMTPSink(args.host, args.port, args.reply_delay)
+    await sink.start()
+    last_count, last_time = 0, time.time()
+    while True:
+        await asyncio.sleep(args.interval)
+        now = time.time()
+        count = len(sink.messages)
+        print(f"{count} messages received, {(count - last_count) / (now - last_time):.1f} msgs/sec", flush=True)
+        last_count, last_time = count, now
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="SMTP sink that accepts and discards mail")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=2525, help="Port to listen on")
+    parser.add_argument("--reply-delay", type=float, default=0.0,
+                        help="Delay every reply by this many seconds to simulate a slow server")
+    parser.add_argument("--interval", type=float, default=5.0, help="Seconds between rate reports")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
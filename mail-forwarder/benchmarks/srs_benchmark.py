@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+SRS rewrite throughput benchmark for the mail forwarder.
+
+Sends forward (sender rewrite) lookups to postsrsd over Postfix's tcp_table
+protocol and to the native SRS server over the socketmap protocol, the same
+way Postfix's cleanup daemon does, and reports lookups/sec and latency.
+Run it inside the container, or with the ports published, while the service
+being measured is running.
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+from urllib.parse import quote, unquote
+
+def percentile(values, fraction):
+    """Return the given percentile of a sorted list."""
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+class TCPTableClient:
+    """Postfix tcp_table client: "get <key>" -> "200 <value>" / "500 <reason>"."""
+
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+
+    async def lookup(self, key):
+        self.writer.write(f"get {quote(key)}\n".encode())
+        await self.writer.drain()
+        reply = (await self.reader.readline()).decode().rstrip("\n")
+        return unquote(reply[4:]) if reply.startswith("200 ") else None
+
+class SocketmapClient:
+    """Postfix socketmap client: netstring "<map> <key>" -> "OK <value>" / "NOTFOUND "."""
+
+    def __init__(self, reader, writer, map_name):
+        self.reader, self.writer, self.map_name = reader, writer, map_name
+
+    async def lookup(self, key):
+        request = f"{self.map_name} {key}".encode()
+        self.writer.write(b"%d:%s," % (len(request), request))
+        await self.writer.drain()
+        length = await self.reader.readuntil(b":")
+        reply = (await self.reader.readexactly(int(length[:-1]) + 1))[:-1].decode()
+        return reply[3:] if reply.startswith("OK ") else None
+
+async def run(args, protocol, port):
+    """Run args.count lookups over args.concurrency persistent connections."""
+    latencies = []
+    rewritten = 0
+    per_client = args.count // args.concurrency
+
+    async def client(index):
+        nonlocal rewritten
+        reader, writer = await asyncio.open_connection(args.host, port)
+        if protocol == "socketmap":
+            conn = SocketmapClient(reader, writer, "forward")
+        else:
+            conn = TCPTableClient(reader, writer)
+        for i in range(per_client):
+            # A limited pool of senders, like real traffic from a few mailing lists
+            sender = f"user{(index * per_client + i) % args.unique_senders}@sender{i % 97}.example.org"
+            start = time.perf_counter()
+            if await conn.lookup(sender):
+                rewritten += 1
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "backend": f"{protocol}:{port}",
+        "lookups": len(latencies),
+        "rewritten": rewritten,
+        "rate": len(latencies) / elapsed if elapsed else 0.0,
+        "p50": percentile(latencies, 0.50) * 1e6,
+        "p99": percentile(latencies, 0.99) * 1e6,
+    }
+
+async def main_async(args):
+    results = []
+    if args.postsrsd_port:
+        results.append(await run(args, "tcp", args.postsrsd_port))
+    if args.native_port:
+        results.append(await run(args, "socketmap", args.native_port))
+    return results
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Compare SRS rewrite throughput of postsrsd and the native server")
+    parser.add_argument("--host", default="127.0.0.1", help="Host running the SRS services")
+    parser.add_argument("--postsrsd-port", type=int, default=10001, help="postsrsd forward port (0 to skip)")
+    parser.add_argument("--native-port", type=int, default=10003, help="Native socketmap port (0 to skip)")
+    parser.add_argument("--count", type=int, default=50000, help="Lookups per backend")
+    parser.add_argument("--concurrency", type=int, default=4, help="Persistent connections (cleanup processes)")
+    parser.add_argument("--unique-senders", type=int, default=1000, help="Distinct senders in the lookup stream")
+    args = parser.parse_args()
+
+    results = asyncio.run(main_async(args))
+
+    print(f"{'backend':<16} {'lookups':>8} {'rewritten':>9} {'lookups/s':>10} {'p50 us':>8} {'p99 us':>8}")
+    for r in results:
+        print(f"{r['backend']:<16} {r['lookups']:>8} {r['rewritten']:>9} {r['rate']:>10.0f} "
+              f"{r['p50']:>8.1f} {r['p99']:>8.1f}")
+
+    if len(results) == 2 and results[0]["rate"]:
+        print(f"\nNative / postsrsd throughput: {results[1]['rate'] / results[0]['rate']:.2f}x")
+
+    return 0 if all(r["rewritten"] == r["lookups"] for r in results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
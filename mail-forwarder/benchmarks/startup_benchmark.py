@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Interpreter startup benchmark for the mail forwarder scripts.
+
+Runs the imports each command needs in a fresh interpreter with
+"-X importtime" and reports the total import time and the heaviest modules.
+With --max-ms the exit code is non-zero when a command exceeds its budget.
+With --check each command is compared with the checked-in baseline
+(startup_baseline.json): its time budget, the scripts it may import and
+the heavy libraries it must not import. tests/test_startup.py runs the
+same check.
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+
+# What each command imports before doing any work
+COMMANDS = {
+    "healthcheck": "import healthcheck",
+    "config": "import entrypoint; entrypoint.load_configuration",
+    "reload": "import entrypoint, config_reload",
+    "initialize": "import entrypoint, snapshot, postfix_config, dkim_config, tls_config, "
+                  "security_config, supervisor_config",
+}
+
+def measure(code, scripts_dir):
+    """Import the given code once, returning (total microseconds, {module: cumulative microseconds})."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=scripts_dir, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "import failed")
+
+    total = 0
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            cumulative = int(cumulative)
+        except ValueError:
+            continue  # Header line
+        # Top-level imports (no indentation) add up to the total
+        if not name.startswith("  "):
+            total += cumulative
+        modules[name.strip()] = cumulative
+    return total, modules
+
+def script_modules(modules, scripts_dir):
+    """Return the imported modules that are mail forwarder scripts."""
+    return {name for name in modules if os.path.exists(os.path.join(scripts_dir, f"{name}.py"))}
+
+def load_baseline(path=BASELINE_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+def check(command, baseline, runs=3, scripts_dir=SCRIPTS_DIR):
+    """Compare a command's imports with the baseline; returns (median ms, list of problems)."""
+    expected = baseline["commands"][command]
+    results = [measure(COMMANDS[command], scripts_dir) for _ in range(runs)]
+    median = statistics.median(total for total, _ in results) / 1000
+    modules = results[-1][1]
+
+    problems = []
+    if median > expected["budget_ms"]:
+        problems.append(f"imports take {median:.1f} ms, budget is {expected['budget_ms']} ms")
+    heavy = sorted(name for name in modules if name.split(".")[0] in baseline["heavy_modules"])
+    if heavy:
+        problems.append(f"imports heavy modules at startup: {', '.join(heavy)}")
+    extra = sorted(script_modules(modules, scripts_dir) - set(expected["modules"]))
+    if extra:
+        problems.append(f"imports scripts not in the baseline: {', '.join(extra)}")
+    return median, problems
+
+def write_baseline(baseline, scripts_dir=SCRIPTS_DIR, path=BASELINE_FILE):
+    """Record the scripts each command imports now, keeping the budgets."""
+    for command, expected in baseline["commands"].items():
+        _, modules = measure(COMMANDS[command], scripts_dir)
+        expected["modules"] = sorted(script_modules(modules, scripts_dir))
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Measure import time per entrypoint command")
+    parser.add_argument("commands", nargs="*", default=list(COMMANDS), metavar="COMMAND",
+                        help="Commands to measure (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per command; the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="Number of heaviest modules to list")
+    parser.add_argument("--max-ms", type=float, help="Fail if a command's median import time exceeds this")
+    parser.add_argument("--scripts-dir", default=SCRIPTS_DIR, help="Directory containing the scripts")
+    parser.add_argument("--check", action="store_true", help=f"Compare each command with {BASELINE_FILE}")
+    parser.add_argument("--write-baseline", action="store_true",
+                        help="Record the scripts each command imports in the baseline, keeping the budgets")
+    args = parser.parse_args()
+
+    unknown = [command for command in args.commands if command not in COMMANDS]
+    if unknown:
+        parser.error(f"unknown command(s): {', '.join(unknown)} (choose from {', '.join(COMMANDS)})")
+
+    if args.write_baseline:
+        write_baseline(load_baseline(), args.scripts_dir)
+        return 0
+
+    if args.check:
+        baseline = load_baseline()
+        failed = False
+        for command in args.commands:
+            median, problems = check(command, baseline, args.runs, args.scripts_dir)
+            print(f"{command:<12} {median:8.1f} ms  {'; '.join(problems) or 'ok'}")
+            failed |= bool(problems)
+        return 1 if failed else 0
+
+    failed = False
+    for command in args.commands:
+        try:
+            runs = [measure(COMMANDS[command], args.scripts_dir) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{command:<12} import failed: {e}")
+            failed = True
+            continue
+
+        median = statistics.median(total for total, _ in runs) / 1000
+        over_budget = args.max_ms is not None and median > args.max_ms
+        failed |= over_budget
+        print(f"{command:<12} {median:8.1f} ms{'  OVER BUDGET' if over_budget else ''}")
+
+        # Heaviest modules of the last run, by cumulative time
+        _, modules = runs[-1]
+        for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+TLS handshake benchmark for the mail forwarder.
+Measures handshakes per second against a running Postfix with and without
+TLS session resumption, using either implicit TLS (SMTPS) or STARTTLS.
+"""
+
+import sys
+import ssl
+import time
+import socket
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+def read_reply(f):
+    """Read a (possibly multi-line) SMTP reply and return its code."""
+    while True:
+        line = f.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        if line[3:4] != b"-":
+            return int(line[:3])
+
+def smtp_command(sock, f, command):
+    """Send an SMTP command and return the reply code."""
+    sock.sendall(command + b"\r\n")
+    return read_reply(f)
+
+def handshake(args, context, session=None):
+    """Perform one TLS handshake, returning (seconds, session, reused)."""
+    start = time.perf_counter()
+    raw = socket.create_connection((args.host, args.port), timeout=args.timeout)
+    try:
+        if args.starttls:
+            f = raw.makefile("rb")
+            read_reply(f)
+            smtp_command(raw, f, b"EHLO benchmark.local")
+            if smtp_command(raw, f, b"STARTTLS") != 220:
+                raise RuntimeError("Server refused STARTTLS")
+            f.close()
+
+        tls = context.wrap_socket(raw, server_hostname=args.host, session=session)
+        f = tls.makefile("rb")
+        if args.starttls:
+            smtp_command(tls, f, b"EHLO benchmark.local")
+        else:
+            read_reply(f)
+        # TLS 1.3 tickets arrive after the handshake; by now they've been read
+        elapsed = time.perf_counter() - start
+        new_session, reused = tls.session, tls.session_reused
+
+        smtp_command(tls, f, b"QUIT")
+        f.close()
+        tls.close()
+        return elapsed, new_session, reused
+    finally:
+        raw.close()
+
+def run(args, resume):
+    """Run the benchmark in one mode and return a result dictionary."""
+    context = ssl.create_default_context()
+    if not args.verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+    lock = threading.Lock()
+    latencies = []
+    reused_count = 0
+    errors = 0
+    shared = {"session": None}
+
+    def worker(_):
+        nonlocal reused_count, errors
+        try:
+            elapsed, session, reused = handshake(args, context, shared["session"] if resume else None)
+        except Exception as e:
+            with lock:
+                errors += 1
+            if args.verbose:
+                print(f"handshake failed: {e}", file=sys.stderr)
+            return
+        with lock:
+            latencies.append(elapsed)
+            reused_count += reused
+            if resume and session is not None:
+                shared["session"] = session
+
+    # Prime the session so every measured handshake can resume
+    if resume:
+        _, shared["session"], _ = handshake(args, context)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(worker, range(args.count)))
+    total = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "mode": "resumed" if resume else "full",
+        "handshakes": len(latencies),
+        "errors": errors,
+        "reused": reused_count,
+        "rate": len(latencies) / total if total else 0.0,
+        "p50": latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0.0,
+    }
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Measure TLS handshakes/sec with and without session resumption")
+    parser.add_argument("--host", default="127.0.0.1", help="Server to connect to")
+    parser.add_argument("--port", type=int, default=465, help="Server port")
+    parser.add_argument("--starttls", action="store_true", help="Use STARTTLS instead of implicit TLS")
+    parser.add_argument("--count", type=int, default=200, help="Handshakes per mode")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients")
+    parser.add_argument("--timeout", type=float, default=10.0, help="Socket timeout in seconds")
+    parser.add_argument("--verify", action="store_true", help="Verify the server certificate")
+    parser.add_argument("--verbose", action="store_true", help="Print individual handshake errors")
+    args = parser.parse_args()
+
+    results = [run(args, resume=False), run(args, resume=True)]
+
+    print(f"{'mode':<8} {'ok':>6} {'errors':>6} {'reused':>6} {'hs/sec':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['handshakes']:>6} {r['errors']:>6} {r['reused']:>6} "
+              f"{r['rate']:>9.1f} {r['p50']:>8.2f} {r['p99']:>8.2f}")
+
+    full, resumed = results
+    if full["rate"] and resumed["handshakes"]:
+        print(f"\nResumption speedup: {resumed['rate'] / full['rate']:.2f}x "
+              f"({resumed['reused']}/{resumed['handshakes']} handshakes resumed)")
+
+    return 0 if not (full["errors"] or resumed["errors"]) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
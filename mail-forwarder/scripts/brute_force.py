@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Native brute-force protection for the mail forwarder.
+Used by the log fan-out in place of fail2ban when FAIL2BAN_BACKEND=native:
+SASL failures in the Postfix log stream are counted per client in a sliding
+window, and clients that reach the limit are added to an ipset that a single
+iptables rule drops. The kernel looks clients up in the set in constant time
+and expires bans by itself, so there is no per-IP rule or unban bookkeeping.
+"""
+
+import re
+import sys
+import time
+import logging
+import ipaddress
+import subprocess
+from collections import OrderedDict, deque
+from typing import Iterable, Optional
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('brute_force')
+
+# Constants
+IPSET_NAME = "mail-forwarder-ban"
+IPSET_NAME6 = "mail-forwarder-ban6"
+BANNED_PORTS = "25,465,587"
+MAX_TRACKED_CLIENTS = 100000  # Least recently failing clients are forgotten beyond this
+IGNORED_NETWORKS = ("127.0.0.0/8", "::1/128")
+FAILURE_MARKER = b"authentication failed"  # Cheap substring test before the regex runs
+# Anchored at the start of the line: the timestamp and hostname contain no "[", so the pattern cannot match
+# a forged warning inside client-controlled text such as a logged sender address
+FAILURE_PATTERN = re.compile(rb"[^\[\n]* postfix(?:-\w+)?/[\w/]+\[\d+\]: warning: [-._\w]+\[([0-9a-fA-F.:]+)\]: "
+                             rb"SASL \S+ authentication failed")
+
+class SlidingWindowCounter:
+    """Counts failures per client over the last window seconds, tracking at most max_clients."""
+
+    def __init__(self, max_attempts: int, window: float, max_clients: int = MAX_TRACKED_CLIENTS):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.max_clients = max_clients
+        self._failures = OrderedDict()  # client -> deque of the last max_attempts failure times
+
+    def hit(self, client: str, now: float) -> bool:
+        """Record a failure; returns True when the client reached the limit within the window."""
+        failures = self._failures.pop(client, None)
+        if failures is None:
+            failures = deque(maxlen=self.max_attempts)
+        failures.append(now)
+
+        if len(failures) == self.max_attempts and now - failures[0] <= self.window:
+            return True
+
+        self._failures[client] = failures
+        if len(self._failures) > self.max_clients:
+            self._failures.popitem(last=False)
+        return False
+
+    def __len__(self) -> int:
+        return len(self._failures)
+
+class IPSetBanner:
+    """Bans clients by adding them to ipsets with a timeout, matched by one iptables rule per family."""
+
+    def __init__(self, ban_time: int, ports: str = BANNED_PORTS):
+        self.ban_time = ban_time
+        self.ports = ports
+
+    def setup(self) -> None:
+        """Create the sets and the iptables rules that drop their members, if they don't exist yet."""
+        for name, family, iptables in ((IPSET_NAME, "inet", "iptables"), (IPSET_NAME6, "inet6", "ip6tables")):
+            subprocess.run(["ipset", "create", name, "hash:ip", "family", family,
+                            "timeout", str(self.ban_time), "-exist"], check=True)
+            rule = ["INPUT", "-p", "tcp", "-m", "multiport", "--dports", self.ports,
+                    "-m", "set", "--match-set", name, "src", "-j", "DROP"]
+            if subprocess.run([iptables, "-C"] + rule, capture_output=True).returncode != 0:
+                subprocess.run([iptables, "-I"] + rule, check=True)
+
+    def ban(self, client: str) -> None:
+        """Add a client to the set; the kernel removes it again after the ban time."""
+        name = IPSET_NAME6 if ":" in client else IPSET_NAME
+        try:
+            subprocess.run(["ipset", "add", name, client, "timeout", str(self.ban_time), "-exist"],
+                           check=True, capture_output=True)
+            logger.warning(f"Banned {client} for {self.ban_time} seconds")
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.error(f"Failed to ban {client}: {e}")
+
+class BruteForceDetector:
+    """Feeds mail log lines to the counter and bans clients that reach the limit."""
+
+    def __init__(self, counter: SlidingWindowCounter, banner: IPSetBanner,
+                 ignored_networks: Iterable[str] = IGNORED_NETWORKS):
+        self.counter = counter
+        self.banner = banner
+        self.ignored_networks = [ipaddress.ip_network(network) for network in ignored_networks]
+
+    def _is_ignored(self, client: str) -> bool:
+        try:
+            address = ipaddress.ip_address(client)
+        except ValueError:
+            return True
+        return any(address in network for network in self.ignored_networks)
+
+    def feed(self, line: bytes, now: Optional[float] = None) -> Optional[str]:
+        """Process one log line; returns the client to ban, if the line pushed one over the limit."""
+        if FAILURE_MARKER not in line:
+            return None
+        match = FAILURE_PATTERN.match(line)
+        if not match:
+            return None
+
+        client = match.group(1).decode()
+        if self._is_ignored(client):
+            return None
+        if self.counter.hit(client, time.time() if now is None else now):
+            return client
+        return None
+
+def list_bans() -> int:
+    """Print the currently banned clients and their remaining ban time."""
+    for name in (IPSET_NAME, IPSET_NAME6):
+        result = subprocess.run(["ipset", "list", name], capture_output=True, text=True)
+        if result.returncode != 0:
+            continue
+        members = result.stdout.split("Members:", 1)[-1].strip().splitlines()
+        for member in members:
+            address, _, remaining = member.partition(" timeout ")
+            print(f"{address}: {remaining or '?'} seconds left")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(list_bans())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Cluster mode support for the mail forwarder.
+Replicas share DKIM keys and certificates through common volumes and
+coordinate through lock files in a shared directory: only the replica
+holding a lock generates keys or talks to Let's Encrypt.
+"""
+
+import os
+import time
+import fcntl
+import socket
+import logging
+from contextlib import contextmanager, nullcontext
+
+from config import Configuration
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('cluster')
+
+# Constants
+LOCKS_SUBDIR = "locks"
+LOCK_POLL_INTERVAL = 1
+
+def get_node_id() -> str:
+    """Return an identifier for this replica (the container hostname)."""
+    return socket.gethostname()
+
+@contextmanager
+def cluster_lock(shared_dir: str, name: str, timeout: float = 600, blocking: bool = True):
+    """
+    Hold an exclusive lock shared by all replicas.
+
+    Yields True once the lock is held. If blocking is False, yields False
+    immediately when another replica holds it. Raises TimeoutError if the
+    lock can't be acquired within timeout seconds.
+    """
+    locks_dir = os.path.join(shared_dir, LOCKS_SUBDIR)
+    os.makedirs(locks_dir, exist_ok=True)
+    lock_path = os.path.join(locks_dir, f"{name}.lock")
+
+    with open(lock_path, 'a+') as f:
+        deadline = time.time() + timeout
+        while True:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if not blocking:
+                    f.seek(0)
+                    logger.info(f"Cluster lock {name} is held by {f.read().strip() or 'another replica'}")
+                    yield False
+                    return
+                if time.time() >= deadline:
+                    raise TimeoutError(f"Timed out waiting for cluster lock {name}")
+                time.sleep(LOCK_POLL_INTERVAL)
+
+        # Record the holder so other replicas can tell who is leading
+        f.seek(0)
+        f.truncate()
+        f.write(f"{get_node_id()} {int(time.time())}\n")
+        f.flush()
+        logger.info(f"Acquired cluster lock {name}")
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def lock_for(config: Configuration, name: str, blocking: bool = True):
+    """Return the cluster lock for name, or a no-op context when not clustered."""
+    if not config.cluster.enabled:
+        return nullcontext(True)
+    return cluster_lock(config.cluster.shared_dir, name, config.cluster.lock_timeout, blocking)
+
+if __name__ == "__main__":
+    # Show who holds the cluster locks
+    from config_reload import load_configuration
+
+    try:
+        config = load_configuration()
+        if not config.cluster.enabled:
+            print("Cluster mode is disabled")
+        else:
+            locks_dir = os.path.join(config.cluster.shared_dir, LOCKS_SUBDIR)
+            for lock_file in sorted(os.listdir(locks_dir)) if os.path.isdir(locks_dir) else []:
+                with open(os.path.join(locks_dir, lock_file), 'r') as f:
+                    print(f"{lock_file[:-len('.lock')]}: last held by {f.read().strip() or 'nobody'}")
+    except Exception as e:
+        logger.error(f"Error reading cluster state: {e}")
@@ -7,8 +7,9 @@ Handles parsing and validating environment variables into a structured configura
 import os
 import re
 import logging
-from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Set, Tuple
+from fnmatch import fnmatchcase
+from dataclasses import dataclass, field, fields, asdict, is_dataclass
+from typing import Any, Dict, List, Mapping, Optional, Set, Tuple
 
 # Configure logging
 logging.basicConfig(
@@ -41,22 +42,97 @@ class ForwardingRule:
         """Extract the domain from the source email."""
         return self.source.split('@')[1] if '@' in self.source else None
 
+@dataclass
+class RelayHost:
+    """An SMTP relay in the relay pool."""
+    host: str
+    port: int = 587
+    weight: int = 1  # Relative share of the mail that tries this relay first
+    username: Optional[str] = None
+    password: Optional[str] = None
+    
+    @property
+    def nexthop(self) -> str:
+        """The relay as a Postfix next-hop destination (no MX lookup)."""
+        return f"[{self.host}]:{self.port}"
+
 @dataclass
 class SRSConfig:
     """Configuration for Sender Rewriting Scheme (SRS)."""
     enabled: bool = True
-    secret: str = ""
+    secret: str = ""  # If empty, a persisted secret is generated (see srs_secrets.py)
     domain: Optional[str] = None  # If None, will use SMTP hostname
     exclude_domains: Set[str] = field(default_factory=set)
-    
-    def __post_init__(self):
-        # Generate a random secret if one isn't provided and SRS is enabled
-        if self.enabled and not self.secret:
-            import secrets
-            import string
-            alphabet = string.ascii_letters + string.digits
-            self.secret = ''.join(secrets.choice(alphabet) for _ in range(32))
-            logger.info("Generated random SRS secret")
+    rotation_grace_days: int = 21  # Retired secrets stay valid for reverse lookups this long
+    backend: str = "postsrsd"  # "postsrsd" or "native" (srs_server.py socketmap service)
+
+@dataclass
+class PostscreenConfig:
+    """Configuration for postscreen, which screens port 25 clients before they reach smtpd."""
+    enabled: bool = False
+    dnsbl_sites: List[str] = field(default_factory=lambda: ["zen.spamhaus.org*2", "bl.spamcop.net*1"])
+    dnsbl_threshold: int = 2  # Combined weight of the listings that gets a client rejected
+    dnsbl_action: str = "enforce"  # "ignore", "enforce" or "drop"
+    greet_action: str = "enforce"  # Action for clients that talk before the greeting
+    greet_wait: int = 6  # Seconds to wait for clients that talk too early
+
+# Optional mounted configuration file, read on top of the environment
+DEFAULT_CONFIG_FILE = "/etc/mail-forwarder/mail-forwarder.env"
+
+# Persistent state (applied configuration, snapshots), kept on a volume
+STATE_DIR = "/var/lib/mail-forwarder"
+
+# Postfix listeners that get their own OpenDKIM instance when a pool is configured
+MILTER_LISTENERS = ("smtp", "submission", "smtps", "non_smtpd")
+
+# fail2ban ban actions; all but iptables-multiport keep banned clients in a kernel set
+BAN_ACTIONS = ("auto", "iptables-multiport", "iptables-ipset-proto6", "iptables-ipset-proto6-allports",
+               "nftables-multiport", "nftables-allports")
+
+# smtp transport in master.cf that delivers through a relay pool, with the relay timeouts
+RELAY_POOL_TRANSPORT = "relaypool"
+
+# Services in master.cf that a delivery pool can't be named after
+MASTER_SERVICES = ("smtp", "smtpd", "submission", "smtps", "relay", "local", "virtual", "lmtp", "pickup", "cleanup",
+                   "qmgr", "tlsmgr", "rewrite", "bounce", "defer", "trace", "verify", "flush", "proxymap",
+                   "proxywrite", "showq", "error", "retry", "discard", "anvil", "scache", "dnsblog", "tlsproxy",
+                   "postscreen", RELAY_POOL_TRANSPORT)
+
+# What postscreen does with clients that fail a test
+POSTSCREEN_ACTIONS = ("ignore", "enforce", "drop")
+
+# Process limits not set explicitly scale with the CPUs available at boot: (per CPU, minimum)
+PROCESS_LIMIT_SCALING = {
+    "default": (25, 100),  # default_process_limit, also used by the smtp delivery agents
+    "smtp": (50, 100),
+    "submission": (25, 100),
+    "smtps": (25, 100),
+}
+
+def detect_cpu_count() -> int:
+    """Return the number of CPUs available to the container, honouring cgroup CPU quotas."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+
+    # cgroup v2 ("max 100000" or "<quota> <period>"), then cgroup v1
+    quota = period = None
+    try:
+        with open("/sys/fs/cgroup/cpu.max", 'r') as f:
+            quota, period = f.read().split()
+    except (OSError, ValueError):
+        try:
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us", 'r') as f:
+                quota = f.read().strip()
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us", 'r') as f:
+                period = f.read().strip()
+        except OSError:
+            pass
+    if quota and period and quota not in ("max", "-1"):
+        cpus = min(cpus, max(1, -(-int(quota) // int(period))))
+
+    return max(1, cpus)
 
 @dataclass
 class DKIMConfig:
@@ -65,6 +141,46 @@ class DKIMConfig:
     selector: str = "mail"
     key_size: int = 2048
     domains: Set[str] = field(default_factory=set)
+    key_algorithm: str = "rsa"  # "rsa", "ed25519" or "dual" (RSA + Ed25519 dual-signing)
+    ed25519_selector: Optional[str] = None  # If None, will use "<selector>-ed25519"
+    
+    # Milter settings
+    isolate_listeners: bool = False  # One OpenDKIM process per Postfix listener (see MILTER_LISTENERS)
+    milter_connect_timeout: int = 10
+    milter_command_timeout: int = 30
+    milter_content_timeout: int = 60
+    
+    @property
+    def signers(self) -> List[Tuple[str, str]]:
+        """
+        The (OpenDKIM program, algorithm) pairs. OpenDKIM applies its
+        SignatureAlgorithm to every key it signs with, so dual-signing takes
+        one program per algorithm, chained as milters.
+        """
+        if self.key_algorithm == "dual":
+            return [("opendkim", "rsa"), ("opendkim-ed25519", "ed25519")]
+        return [("opendkim", self.key_algorithm)]
+    
+    @property
+    def processes(self) -> int:
+        """The number of processes of each OpenDKIM program."""
+        return len(MILTER_LISTENERS) if self.isolate_listeners else 1
+    
+    def milters_for(self, listener: str) -> str:
+        """The milter list a Postfix listener (see MILTER_LISTENERS) should use, one socket per signer."""
+        suffix = f"-{MILTER_LISTENERS.index(listener)}" if self.isolate_listeners else ""
+        # No spaces, so the list also works as a master.cf -o value
+        return ",".join(f"unix:/var/run/opendkim/{program}{suffix}.sock" for program, _ in self.signers)
+    
+    @property
+    def keys(self) -> List[Tuple[str, str]]:
+        """The (selector, algorithm) pairs every domain is signed with."""
+        keys = []
+        if self.key_algorithm in ("rsa", "dual"):
+            keys.append((self.selector, "rsa"))
+        if self.key_algorithm in ("ed25519", "dual"):
+            keys.append((self.ed25519_selector or f"{self.selector}-ed25519", "ed25519"))
+        return keys
 
 @dataclass
 class TLSConfig:
@@ -75,12 +191,19 @@ class TLSConfig:
     challenge_type: str = "tls-alpn"  # "tls-alpn" or "http"
     staging: bool = False
     renewal_days: int = 7  # Changed from 30 to 7
+    renewal_stagger_days: int = 3  # Spread renewals over this many days before the deadline
+    renewal_max_per_run: int = 2  # Cap on certificates renewed per scheduler run
     use_letsencrypt: bool = True
     key_size: int = 2048
+    key_algorithm: str = "rsa"  # "rsa", "ecdsa" (P-256) or "dual" (RSA + ECDSA)
     params_bits: int = 2048
     security_level: str = "may"
-    protocols: str = "!SSLv2, !SSLv3"
+    protocols: str = "!SSLv2, !SSLv3, !TLSv1, !TLSv1.1"
     ciphers: str = "high"
+    session_cache_type: str = "lmdb"  # "lmdb" or "btree"
+    session_cache_timeout: int = 3600  # Also the lifetime of session ticket keys
+    session_tickets: bool = True
+    session_ticket_cipher: str = "aes-256-cbc"
 
 @dataclass
 class SMTPConfig:
@@ -92,6 +215,15 @@ class SMTPConfig:
     relay_password: Optional[str] = None
     use_tls: bool = True
     helo_name: Optional[str] = None  # If None, will use hostname
+    relays: List[RelayHost] = field(default_factory=list)  # Relay pool, used instead of relay_host
+    relay_timeout: int = 10  # Seconds a pool relay gets to accept the connection and greet (relay pool transport only)
+    sender_relays: Dict[str, RelayHost] = field(default_factory=dict)  # Sender domain -> relay that domain's mail uses
+    fallback_relay_host: Optional[str] = None  # Tried when a destination (or the relay) can't be reached
+    fallback_relay_port: int = 25
+    
+    # Delivery pools: own smtp transports for some destination domains, so slow ones can't hold up the rest
+    delivery_pools: Dict[str, int] = field(default_factory=dict)  # pool name -> concurrency
+    delivery_pool_domains: Dict[str, str] = field(default_factory=dict)  # destination domain -> pool name
     
     # Ports to enable
     enable_smtp: bool = True
@@ -102,6 +234,33 @@ class SMTPConfig:
     smtp_auth_enabled: bool = False
     smtp_users: Dict[str, str] = field(default_factory=dict)  # username -> password mapping
     
+    # Process and connection limits; unset limits are scaled from the CPU count in validate()
+    default_process_limit: Optional[int] = None
+    smtp_process_limit: Optional[int] = None  # Port 25
+    submission_process_limit: Optional[int] = None
+    smtps_process_limit: Optional[int] = None
+    listen_backlog: Optional[int] = None  # Kernel accept queue limit (net.core.somaxconn)
+    client_connection_count_limit: Optional[int] = None  # Concurrent connections per client
+    client_connection_rate_limit: int = 0  # Connections per client per rate time unit, 0 = unlimited
+    client_message_rate_limit: int = 0  # Messages per client per rate time unit, 0 = unlimited
+    anvil_rate_time_unit: int = 60
+    
+    # Queue management; a forwarder should hand mail on quickly, so lifetimes are short and sizes capped
+    message_size_limit_mb: int = 25  # The limit of the large mailbox providers mail is forwarded to
+    queue_lifetime: int = 86400  # Seconds before undeliverable mail is bounced
+    bounce_queue_lifetime: int = 14400  # Seconds before undeliverable bounces are dropped
+    queue_run_delay: int = 300  # Seconds between deferred queue scans
+    spool_budget_mb: int = 2048  # Spool size above which the healthcheck fails, 0 = don't check
+    
+    @property
+    def relay_pool(self) -> List[RelayHost]:
+        """The relays mail is sent through: the relay pool, or the single relay host."""
+        if self.relays:
+            return self.relays
+        if self.relay_host:
+            return [RelayHost(self.relay_host, self.relay_port, 1, self.relay_username, self.relay_password)]
+        return []
+    
     def __post_init__(self):
         # Use hostname for helo_name if not specified
         if not self.helo_name:
@@ -115,9 +274,32 @@ class SMTPConfig:
 class SecurityConfig:
     """Configuration for security settings."""
     fail2ban_enabled: bool = True
+    backend: str = "fail2ban"  # "fail2ban" or "native" (brute_force.py, fed by the log fan-out)
+    ban_action: str = "auto"  # fail2ban ban action (see BAN_ACTIONS); "auto" picks a set-based one if supported
     max_attempts: int = 5
     ban_time: int = 3600
     find_time: int = 600
+    
+    # Ban database, kept in STATE_DIR so bans are restored after a restart
+    db_purge_age: Optional[int] = None  # Seconds a ban stays in the database; None keeps it as long as a ban can last
+    ban_time_increment: bool = False  # Ban repeat offenders for longer, based on their history in the database
+    ban_time_max: int = 604800  # Upper limit for incremented ban times
+
+@dataclass
+class LoggingConfig:
+    """Configuration for the mail log fan-out (see log_fanout.py)."""
+    file: str = "/var/log/mail.log"  # Rotated copy of the mail log followed by fail2ban; empty to disable
+    max_size_mb: int = 10
+    backups: int = 1
+    stdout: bool = True  # Copy all log messages to the container output
+    flush_interval: int = 1  # Seconds between batched writes; 0 writes every message immediately
+
+@dataclass
+class ClusterConfig:
+    """Configuration for running several replicas that serve the same domains."""
+    enabled: bool = False
+    shared_dir: str = "/var/lib/mail-forwarder-shared"  # Common store for locks and the SRS secrets
+    lock_timeout: int = 600  # Seconds to wait for another replica holding a cluster lock
 
 @dataclass
 class Configuration:
@@ -128,6 +310,9 @@ class Configuration:
     tls: TLSConfig = field(default_factory=TLSConfig)
     security: SecurityConfig = field(default_factory=SecurityConfig)
     srs: SRSConfig = field(default_factory=SRSConfig)
+    cluster: ClusterConfig = field(default_factory=ClusterConfig)
+    postscreen: PostscreenConfig = field(default_factory=PostscreenConfig)
+    logging: LoggingConfig = field(default_factory=LoggingConfig)
     forwarding_rules: List[ForwardingRule] = field(default_factory=list)
 
     def validate(self) -> None:
@@ -171,14 +356,160 @@ class Configuration:
             self.srs.domain = self.smtp.hostname
             logger.info(f"Auto-configuring SRS domain: {self.srs.domain}")
         
+        # Scale process limits that weren't set with the CPUs available at boot
+        cpus = detect_cpu_count()
+        for listener, (per_cpu, minimum) in PROCESS_LIMIT_SCALING.items():
+            if getattr(self.smtp, f"{listener}_process_limit") is None:
+                setattr(self.smtp, f"{listener}_process_limit", max(minimum, per_cpu * cpus))
+        
+        # Postfix asks for a listen backlog as large as the process limit; the kernel caps it
+        if self.smtp.listen_backlog is None:
+            self.smtp.listen_backlog = max(getattr(self.smtp, f"{listener}_process_limit")
+                                           for listener in PROCESS_LIMIT_SCALING)
+        
+        # Like Postfix's default, one client may hold at most half of the port 25 processes
+        if self.smtp.client_connection_count_limit is None:
+            self.smtp.client_connection_count_limit = max(1, self.smtp.smtp_process_limit // 2)
+        
+        # Process limit validation
+        for listener in PROCESS_LIMIT_SCALING:
+            if getattr(self.smtp, f"{listener}_process_limit") < 1:
+                raise ValueError(f"The {listener} process limit must be at least 1")
+        
+        if self.smtp.listen_backlog < 1:
+            raise ValueError("Listen backlog must be at least 1")
+        
+        if min(self.smtp.client_connection_count_limit, self.smtp.client_connection_rate_limit,
+               self.smtp.client_message_rate_limit) < 0:
+            raise ValueError("Client connection and rate limits cannot be negative")
+        
+        if self.smtp.anvil_rate_time_unit < 1:
+            raise ValueError("Anvil rate time unit must be at least 1 second")
+        
+        # Delivery pool validation
+        for pool, concurrency in self.smtp.delivery_pools.items():
+            if not re.match(r'^[a-z][a-z0-9_]*$', pool) or pool in MASTER_SERVICES:
+                raise ValueError(f"Invalid delivery pool name: {pool}")
+            if concurrency < 1:
+                raise ValueError(f"Delivery pool {pool} needs a concurrency of at least 1")
+        
+        for domain, pool in self.smtp.delivery_pool_domains.items():
+            if pool not in self.smtp.delivery_pools:
+                raise ValueError(f"Domain {domain} is assigned to unknown delivery pool {pool}")
+        
+        # Queue validation
+        if self.smtp.message_size_limit_mb < 1:
+            raise ValueError("Message size limit must be at least 1 MB")
+        
+        if min(self.smtp.queue_lifetime, self.smtp.bounce_queue_lifetime, self.smtp.queue_run_delay) < 1:
+            raise ValueError("Queue lifetimes and the queue run delay must be at least 1 second")
+        
+        # Bounces are never kept longer than the mail they report on
+        if self.smtp.bounce_queue_lifetime > self.smtp.queue_lifetime:
+            self.smtp.bounce_queue_lifetime = self.smtp.queue_lifetime
+        
+        if self.smtp.spool_budget_mb < 0:
+            raise ValueError("Spool budget cannot be negative")
+        
+        # DKIM validation
+        if self.dkim.key_algorithm not in ("rsa", "ed25519", "dual"):
+            raise ValueError(f"Invalid DKIM key algorithm: {self.dkim.key_algorithm}")
+        
         # TLS validation
         if self.tls.enabled and not self.tls.email:
             raise ValueError("TLS is enabled but no email provided for Let's Encrypt")
         
+        if self.tls.key_algorithm not in ("rsa", "ecdsa", "dual"):
+            raise ValueError(f"Invalid TLS key algorithm: {self.tls.key_algorithm}")
+        
+        if self.tls.challenge_type not in ("tls-alpn", "http"):
+            raise ValueError(f"Invalid TLS challenge type: {self.tls.challenge_type}")
+        
+        if self.tls.session_cache_type not in ("lmdb", "btree"):
+            raise ValueError(f"Invalid TLS session cache type: {self.tls.session_cache_type}")
+        
+        if not 0 <= self.tls.session_cache_timeout <= 8640000:
+            raise ValueError("TLS session cache timeout must be between 0 and 8640000 seconds")
+        
+        # Cluster validation
+        if self.cluster.enabled and not os.path.isabs(self.cluster.shared_dir):
+            raise ValueError(f"Cluster shared directory must be an absolute path: {self.cluster.shared_dir}")
+        
+        # SRS validation
+        if self.srs.rotation_grace_days < 0:
+            raise ValueError("SRS rotation grace period cannot be negative")
+        
+        if self.srs.backend not in ("postsrsd", "native"):
+            raise ValueError(f"Invalid SRS backend: {self.srs.backend}")
+        
+        # Logging validation
+        if self.security.fail2ban_enabled and self.security.backend == "fail2ban" and not self.logging.file:
+            raise ValueError("Fail2ban is enabled but the mail log file is disabled")
+        
+        if self.logging.file and not os.path.isabs(self.logging.file):
+            raise ValueError(f"Mail log file must be an absolute path: {self.logging.file}")
+        
+        if self.logging.max_size_mb < 1:
+            raise ValueError("Mail log size limit must be at least 1 MB")
+        
+        if self.logging.backups < 0 or self.logging.flush_interval < 0:
+            raise ValueError("Mail log backups and flush interval cannot be negative")
+        
+        # Security validation
+        if self.security.backend not in ("fail2ban", "native"):
+            raise ValueError(f"Invalid brute-force protection backend: {self.security.backend}")
+        
+        if self.security.ban_action not in BAN_ACTIONS:
+            raise ValueError(f"Invalid fail2ban ban action: {self.security.ban_action}")
+        
+        # Bans purged from the database before they expire can't be restored after a restart
+        longest_ban = self.security.ban_time_max if self.security.ban_time_increment else self.security.ban_time
+        if self.security.db_purge_age is None:
+            self.security.db_purge_age = max(86400, longest_ban)
+        elif self.security.db_purge_age < longest_ban:
+            logger.warning("The fail2ban database purge age is shorter than a ban can last; "
+                           "longer bans won't be restored after a restart")
+        
+        if self.security.ban_time_max < self.security.ban_time:
+            raise ValueError("Maximum ban time cannot be shorter than the ban time")
+        
+        # Postscreen validation
+        if self.postscreen.dnsbl_action not in POSTSCREEN_ACTIONS:
+            raise ValueError(f"Invalid postscreen DNSBL action: {self.postscreen.dnsbl_action}")
+        
+        if self.postscreen.greet_action not in POSTSCREEN_ACTIONS:
+            raise ValueError(f"Invalid postscreen greet action: {self.postscreen.greet_action}")
+        
+        if self.postscreen.dnsbl_threshold < 1:
+            raise ValueError("Postscreen DNSBL threshold must be at least 1")
+        
+        if self.postscreen.greet_wait < 1:
+            raise ValueError("Postscreen greet wait must be at least 1 second")
+        
         # Relay validation
-        if self.smtp.relay_host:
-            if self.smtp.relay_username and not self.smtp.relay_password:
-                raise ValueError("Relay username provided but no password")
+        if self.smtp.relay_host and self.smtp.relays:
+            raise ValueError("Set either a relay host or a relay pool, not both")
+        
+        for relay in self.smtp.relay_pool:
+            if not relay.host:
+                raise ValueError("Relay host cannot be empty")
+            if not 1 <= relay.port <= 65535:
+                raise ValueError(f"Invalid port for relay {relay.host}: {relay.port}")
+            if not 1 <= relay.weight <= 100:
+                raise ValueError(f"Weight for relay {relay.host} must be between 1 and 100")
+            if relay.username and not relay.password:
+                raise ValueError(f"Relay username provided but no password for {relay.host}")
+        
+        if self.smtp.relay_timeout < 1:
+            raise ValueError("Relay timeout must be at least 1 second")
+        
+        for domain, relay in self.smtp.sender_relays.items():
+            if not re.match(r'^[^@\s]+\.[^@\s]+$', domain):
+                raise ValueError(f"Invalid sender relay domain: {domain}")
+            if not relay.host or not 1 <= relay.port <= 65535:
+                raise ValueError(f"Invalid relay for sender domain {domain}: {relay.nexthop}")
+            if relay.username and not relay.password:
+                raise ValueError(f"Relay username provided but no password for sender domain {domain}")
 
 def parse_forwarding_rules(env_vars: Dict[str, str]) -> List[ForwardingRule]:
     """Parse forwarding rules from environment variables."""
@@ -223,9 +554,282 @@ def parse_int(value: str, default: int) -> int:
     except (ValueError, TypeError):
         return default
 
-def from_environment() -> Configuration:
+def load_env_file(path: str) -> Dict[str, str]:
+    """Read KEY=VALUE settings from a dotenv-style configuration file."""
+    from dotenv import dotenv_values
+    return {key: value for key, value in dotenv_values(path).items() if value is not None}
+
+def get_config_file() -> str:
+    """Return the path of the mounted configuration file."""
+    return os.environ.get("CONFIG_FILE", DEFAULT_CONFIG_FILE)
+
+def get_settings() -> Dict[str, str]:
+    """Return the environment merged with the mounted configuration file, if any."""
+    settings = dict(os.environ)
+    config_file = get_config_file()
+    if os.path.exists(config_file):
+        settings.update(load_env_file(config_file))
+    return settings
+
+def to_dict(config: Configuration) -> Dict[str, Any]:
+    """Convert a Configuration into JSON-serializable data."""
+    def convert(value):
+        if isinstance(value, (set, frozenset)):
+            return sorted(value)
+        if isinstance(value, dict):
+            return {key: convert(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [convert(item) for item in value]
+        return value
+    return convert(asdict(config))
+
+def _from_dict(cls, data: Mapping[str, Any]):
+    """Build a (nested) configuration dataclass from data produced by to_dict."""
+    kwargs = {}
+    for f in fields(cls):
+        if f.name not in data:
+            continue
+        value = data[f.name]
+        if is_dataclass(f.type):
+            value = _from_dict(f.type, value)
+        elif getattr(f.type, '__origin__', None) is set:
+            value = set(value)
+        elif f.type == List[ForwardingRule]:
+            value = [ForwardingRule(**rule) for rule in value]
+        elif f.type == List[RelayHost]:
+            value = [RelayHost(**relay) for relay in value]
+        elif f.type == Dict[str, RelayHost]:
+            value = {domain: RelayHost(**relay) for domain, relay in value.items()}
+        kwargs[f.name] = value
+    return cls(**kwargs)
+
+def from_dict(data: Mapping[str, Any]) -> Configuration:
+    """Create a Configuration object from data produced by to_dict."""
+    return _from_dict(Configuration, data)
+
+# Generated artifacts: path -> (configure step that writes it, service that reads it)
+ARTIFACTS = {
+    "/etc/postfix/main.cf": ("postfix", "postfix"),
+    "/etc/postfix/master.cf": ("postfix", "postfix"),
+    "/etc/postfix/virtual": ("postfix", "postfix"),
+    "/etc/postfix/virtual_domains": ("postfix", "postfix"),
+    "/etc/postfix/transport": ("postfix", "postfix"),
+    "/etc/postfix/sasl_passwd": ("postfix", "postfix"),
+    "/etc/postfix/sender_relay": ("postfix", "postfix"),
+    "/etc/postfix/sender_transport": ("postfix", "postfix"),
+    "/etc/postfix/sasl_users": ("postfix", "saslauthd"),
+    "/etc/default/postsrsd": ("postfix", "postsrsd"),
+    "/etc/postfix/tls_sni": ("tls", "postfix"),
+    "/etc/postfix/certs": ("tls", "postfix"),
+    "/etc/letsencrypt/renewal.conf": ("tls", None),
+    "/etc/opendkim/opendkim.conf": ("opendkim", "opendkim"),
+    "/etc/opendkim/opendkim-ed25519.conf": ("opendkim", "opendkim"),
+    "/etc/opendkim/key_table": ("opendkim", "opendkim"),
+    "/etc/opendkim/key_table-ed25519": ("opendkim", "opendkim"),
+    "/etc/opendkim/signing_table": ("opendkim", "opendkim"),
+    "/etc/opendkim/signing_table-ed25519": ("opendkim", "opendkim"),
+    "/etc/opendkim/trusted_hosts": ("opendkim", "opendkim"),
+    "/etc/opendkim/keys": ("opendkim", "opendkim"),
+    "/etc/fail2ban/fail2ban.local": ("fail2ban", "fail2ban"),
+    "/etc/fail2ban/jail.local": ("fail2ban", "fail2ban"),
+    "/etc/fail2ban/jail.d/postfix.conf": ("fail2ban", "fail2ban"),
+    "/etc/supervisor/conf.d/mail-forwarder.conf": ("supervisor", "supervisor"),
+}
+
+# Configuration fields (fnmatch patterns on dotted paths) -> artifacts they end up in
+FIELD_ARTIFACTS = [
+    ("debug", ()),
+    ("smtp.hostname", ("/etc/postfix/main.cf", "/etc/postfix/virtual_domains", "/etc/opendkim/trusted_hosts",
+                       "/etc/supervisor/conf.d/mail-forwarder.conf")),
+    ("smtp.helo_name", ("/etc/postfix/main.cf",)),
+    ("smtp.relay_host", ("/etc/postfix/main.cf", "/etc/postfix/transport", "/etc/postfix/sasl_passwd")),
+    ("smtp.relay_port", ("/etc/postfix/main.cf", "/etc/postfix/transport", "/etc/postfix/sasl_passwd")),
+    ("smtp.relay_username", ("/etc/postfix/main.cf", "/etc/postfix/sasl_passwd")),
+    ("smtp.relay_password", ("/etc/postfix/main.cf", "/etc/postfix/sasl_passwd")),
+    ("smtp.relay_timeout", ("/etc/postfix/master.cf",)),
+    ("smtp.use_tls", ("/etc/postfix/main.cf",)),
+    ("smtp.relays", ("/etc/postfix/main.cf", "/etc/postfix/master.cf", "/etc/postfix/transport",
+                     "/etc/postfix/sasl_passwd", "/etc/postfix/sender_transport")),
+    ("smtp.sender_relays", ("/etc/postfix/main.cf", "/etc/postfix/sasl_passwd", "/etc/postfix/sender_relay",
+                            "/etc/postfix/sender_transport")),
+    ("smtp.fallback_relay_*", ("/etc/postfix/main.cf",)),
+    ("smtp.delivery_pools", ("/etc/postfix/main.cf", "/etc/postfix/master.cf", "/etc/postfix/transport")),
+    ("smtp.delivery_pool_domains", ("/etc/postfix/main.cf", "/etc/postfix/transport")),
+    ("smtp.enable_*", ("/etc/postfix/master.cf",)),
+    ("smtp.smtp_auth_enabled", ("/etc/postfix/main.cf", "/etc/postfix/master.cf",
+                                "/etc/supervisor/conf.d/mail-forwarder.conf")),
+    ("smtp.smtp_users", ("/etc/postfix/sasl_users",)),
+    ("smtp.default_process_limit", ("/etc/postfix/main.cf",)),
+    ("smtp.smtp_process_limit", ("/etc/postfix/master.cf",)),
+    ("smtp.submission_process_limit", ("/etc/postfix/master.cf",)),
+    ("smtp.smtps_process_limit", ("/etc/postfix/master.cf",)),
+    ("smtp.listen_backlog", ()),  # Applied to the kernel when Postfix is configured at startup
+    ("smtp.client_*", ("/etc/postfix/main.cf",)),
+    ("smtp.anvil_rate_time_unit", ("/etc/postfix/main.cf",)),
+    ("smtp.message_size_limit_mb", ("/etc/postfix/main.cf",)),
+    ("smtp.*queue_*", ("/etc/postfix/main.cf",)),
+    ("smtp.spool_budget_mb", ()),  # Only read by the healthcheck
+    ("dkim.enabled", ("/etc/opendkim/opendkim.conf", "/etc/opendkim/opendkim-ed25519.conf",
+                      "/etc/opendkim/key_table", "/etc/opendkim/key_table-ed25519", "/etc/opendkim/signing_table",
+                      "/etc/opendkim/signing_table-ed25519", "/etc/opendkim/trusted_hosts", "/etc/opendkim/keys",
+                      "/etc/postfix/main.cf", "/etc/supervisor/conf.d/mail-forwarder.conf")),
+    ("dkim.domains", ("/etc/opendkim/key_table", "/etc/opendkim/key_table-ed25519", "/etc/opendkim/signing_table",
+                      "/etc/opendkim/signing_table-ed25519", "/etc/opendkim/trusted_hosts", "/etc/opendkim/keys")),
+    ("dkim.*selector", ("/etc/opendkim/opendkim.conf", "/etc/opendkim/key_table", "/etc/opendkim/key_table-ed25519",
+                        "/etc/opendkim/signing_table", "/etc/opendkim/signing_table-ed25519", "/etc/opendkim/keys")),
+    # Dual-signing adds a second OpenDKIM program, and its socket to every milter list
+    ("dkim.key_algorithm", ("/etc/opendkim/opendkim.conf", "/etc/opendkim/opendkim-ed25519.conf",
+                            "/etc/opendkim/key_table", "/etc/opendkim/key_table-ed25519", "/etc/opendkim/signing_table",
+                            "/etc/opendkim/signing_table-ed25519", "/etc/opendkim/keys", "/etc/postfix/main.cf",
+                            "/etc/postfix/master.cf", "/etc/supervisor/conf.d/mail-forwarder.conf")),
+    ("dkim.key_size", ("/etc/opendkim/opendkim.conf", "/etc/opendkim/opendkim-ed25519.conf", "/etc/opendkim/keys")),
+    ("dkim.isolate_listeners", ("/etc/postfix/main.cf", "/etc/postfix/master.cf",
+                                "/etc/supervisor/conf.d/mail-forwarder.conf")),
+    ("dkim.milter_*", ("/etc/postfix/main.cf",)),
+    ("tls.enabled", ("/etc/postfix/main.cf", "/etc/postfix/tls_sni", "/etc/postfix/certs",
+                     "/etc/letsencrypt/renewal.conf", "/etc/supervisor/conf.d/mail-forwarder.conf")),
+    ("tls.renewal_days", ("/etc/letsencrypt/renewal.conf",)),
+    ("tls.renewal_*", ("/etc/supervisor/conf.d/mail-forwarder.conf",)),
+    ("tls.session_*", ("/etc/postfix/main.cf",)),
+    ("tls.security_level", ("/etc/postfix/main.cf",)),
+    ("tls.protocols", ("/etc/postfix/main.cf",)),
+    ("tls.ciphers", ("/etc/postfix/main.cf",)),
+    ("tls.params_bits", ()),  # Only used when tls_params.pem is first generated
+    ("tls.key_algorithm", ("/etc/postfix/main.cf", "/etc/postfix/certs", "/etc/postfix/tls_sni")),
+    ("tls.domains", ("/etc/postfix/main.cf", "/etc/postfix/certs", "/etc/postfix/tls_sni")),
+    ("tls.use_letsencrypt", ("/etc/postfix/certs", "/etc/supervisor/conf.d/mail-forwarder.conf")),
+    ("tls.challenge_type", ("/etc/postfix/certs", "/etc/supervisor/conf.d/mail-forwarder.conf")),
+    ("tls.*", ("/etc/postfix/certs",)),  # email, staging, key_size
+    # The native backend gets its thresholds on the log fan-out's command line
+    ("security.db_purge_age", ("/etc/fail2ban/fail2ban.local",)),
+    ("security.*", ("/etc/fail2ban/jail.local", "/etc/fail2ban/jail.d/postfix.conf",
+                    "/etc/supervisor/conf.d/mail-forwarder.conf")),
+    ("srs.*", ("/etc/default/postsrsd", "/etc/supervisor/conf.d/mail-forwarder.conf")),
+    ("srs.enabled", ("/etc/postfix/main.cf",)),
+    ("postscreen.enabled", ("/etc/postfix/main.cf", "/etc/postfix/master.cf")),
+    ("postscreen.*", ("/etc/postfix/main.cf",)),
+    ("logging.file", ("/etc/supervisor/conf.d/mail-forwarder.conf", "/etc/fail2ban/jail.d/postfix.conf")),
+    ("logging.*", ("/etc/supervisor/conf.d/mail-forwarder.conf",)),
+    ("forwarding_rules", ("/etc/postfix/virtual", "/etc/postfix/virtual_domains")),
+    ("cluster.enabled", ("/etc/supervisor/conf.d/mail-forwarder.conf",)),
+    ("cluster.shared_dir", ("/etc/supervisor/conf.d/mail-forwarder.conf",)),
+    ("cluster.lock_timeout", ()),
+]
+
+@dataclass(frozen=True)
+class FieldChange:
+    """A changed configuration field, identified by its dotted path (e.g. "dkim.selector")."""
+    path: str
+    old: Any
+    new: Any
+
+    @property
+    def section(self) -> str:
+        """The top-level configuration section the field belongs to."""
+        return self.path.split('.', 1)[0]
+
+    @property
+    def artifacts(self) -> Set[str]:
+        """The generated artifacts affected by this change."""
+        artifacts = set()
+        matched = False
+        for pattern, paths in FIELD_ARTIFACTS:
+            if fnmatchcase(self.path, pattern):
+                # Section wildcards only apply to fields no earlier pattern matched
+                if matched and pattern.endswith('.*'):
+                    continue
+                artifacts.update(paths)
+                matched = True
+        if not matched:
+            # Unknown field: be conservative and regenerate everything
+            logger.warning(f"No artifact mapping for configuration field {self.path}")
+            return set(ARTIFACTS)
+        return artifacts
+
+@dataclass
+class ConfigDiff:
+    """The differences between two configurations and what they affect."""
+    changes: List[FieldChange] = field(default_factory=list)
+    added_rules: List[ForwardingRule] = field(default_factory=list)
+    removed_rules: List[ForwardingRule] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.changes or self.added_rules or self.removed_rules)
+
+    @property
+    def sections(self) -> Set[str]:
+        """The top-level configuration sections that changed."""
+        sections = {change.section for change in self.changes}
+        if self.added_rules or self.removed_rules:
+            sections.add("forwarding_rules")
+        return sections
+
+    @property
+    def artifacts(self) -> Set[str]:
+        """The generated artifacts that have to be regenerated."""
+        artifacts = set()
+        for change in self.changes:
+            artifacts.update(change.artifacts)
+        if self.added_rules or self.removed_rules:
+            artifacts.update(FieldChange("forwarding_rules", None, None).artifacts)
+        return artifacts
+
+    @property
+    def steps(self) -> Set[str]:
+        """The configure steps that have to run."""
+        return {ARTIFACTS[artifact][0] for artifact in self.artifacts}
+
+    @property
+    def services(self) -> Set[str]:
+        """The services whose configuration changes."""
+        return {ARTIFACTS[artifact][1] for artifact in self.artifacts if ARTIFACTS[artifact][1]}
+
+    def changed(self, *patterns: str) -> bool:
+        """Return True if a field matching any of the fnmatch patterns changed."""
+        paths = [change.path for change in self.changes]
+        if self.added_rules or self.removed_rules:
+            paths.append("forwarding_rules")
+        return any(fnmatchcase(path, pattern) for path in paths for pattern in patterns)
+
+    def affects(self, step: str) -> bool:
+        """Return True if the given configure step has work to do."""
+        return step in self.steps
+
+    def regenerates(self, artifact: str) -> bool:
+        """Return True if the given artifact (see ARTIFACTS) has to be regenerated."""
+        return artifact in self.artifacts
+
+def _rule_key(rule: ForwardingRule) -> Tuple[str, str, bool]:
+    return (rule.source, rule.destination, rule.is_wildcard)
+
+def diff_configs(old: Configuration, new: Configuration) -> ConfigDiff:
+    """Compare two configurations field by field."""
+    diff = ConfigDiff()
+    old_data, new_data = to_dict(old), to_dict(new)
+
+    for f in fields(Configuration):
+        if f.name == "forwarding_rules":
+            continue
+        old_value, new_value = old_data[f.name], new_data[f.name]
+        if is_dataclass(f.type):
+            for key in old_value:
+                if old_value[key] != new_value[key]:
+                    diff.changes.append(FieldChange(f"{f.name}.{key}", old_value[key], new_value[key]))
+        elif old_value != new_value:
+            diff.changes.append(FieldChange(f.name, old_value, new_value))
+
+    # Forwarding rules are compared as sets; their order doesn't matter to Postfix
+    old_rules = {_rule_key(rule): rule for rule in old.forwarding_rules}
+    new_rules = {_rule_key(rule): rule for rule in new.forwarding_rules}
+    diff.added_rules = [rule for key, rule in new_rules.items() if key not in old_rules]
+    diff.removed_rules = [rule for key, rule in old_rules.items() if key not in new_rules]
+
+    return diff
+
+def from_environment(env_vars: Optional[Mapping[str, str]] = None) -> Configuration:
     """Create a Configuration object from environment variables."""
-    env_vars = os.environ
+    if env_vars is None:
+        env_vars = os.environ
     config = Configuration()
     
     # Debug mode
@@ -241,6 +845,9 @@ def from_environment() -> Configuration:
     config.smtp.relay_username = env_vars.get("SMTP_RELAY_USERNAME")
     config.smtp.relay_password = env_vars.get("SMTP_RELAY_PASSWORD")
     config.smtp.use_tls = parse_bool(env_vars.get("SMTP_RELAY_USE_TLS", "true"))
+    config.smtp.relay_timeout = parse_int(env_vars.get("SMTP_RELAY_TIMEOUT", "10"), 10)
+    config.smtp.fallback_relay_host = env_vars.get("SMTP_FALLBACK_RELAY_HOST")
+    config.smtp.fallback_relay_port = parse_int(env_vars.get("SMTP_FALLBACK_RELAY_PORT", "25"), 25)
     
     # SMTP auth users
     smtp_users_str = env_vars.get("SMTP_USERS", "")
@@ -253,11 +860,77 @@ def from_environment() -> Configuration:
                     config.smtp.smtp_users[username.strip()] = password.strip()
                     logger.info(f"Added SMTP authentication user: {username}")
     
+    # Relay pool with the format (the password may contain colons):
+    # SMTP_RELAYS="smtp1.example.com:587:3:user:password;smtp2.example.com:587:1"
+    for part in env_vars.get("SMTP_RELAYS", "").split(";"):
+        if not part.strip():
+            continue
+        host, port, weight, username, password = (part.strip().split(":", 4) + [None] * 4)[:5]
+        config.smtp.relays.append(RelayHost(
+            host=host.strip(),
+            port=parse_int(port, 587),
+            weight=parse_int(weight, 1),
+            username=username or None,
+            password=password or None,
+        ))
+    
+    # Relays by sender domain with the format (the password may contain colons):
+    # SMTP_SENDER_RELAYS="example.com,example.org=smtp.provider1.com:587:user:password;example.net=smtp.provider2.com:587"
+    for part in env_vars.get("SMTP_SENDER_RELAYS", "").split(";"):
+        if not part.strip():
+            continue
+        if "=" not in part:
+            logger.warning(f"Skipping invalid sender relay (expected domains=host:port:username:password): {part}")
+            continue
+        domains, relay = part.split("=", 1)
+        host, port, username, password = (relay.strip().split(":", 3) + [None] * 3)[:4]
+        for domain in domains.split(","):
+            if domain.strip():
+                config.smtp.sender_relays[domain.strip().lower()] = RelayHost(
+                    host=host.strip(),
+                    port=parse_int(port, 587),
+                    username=username or None,
+                    password=password or None,
+                )
+    
+    # Delivery pools with the format:
+    # SMTP_DELIVERY_POOLS="slow:2:yahoo.com,aol.com;bulk:40:gmail.com"
+    for part in env_vars.get("SMTP_DELIVERY_POOLS", "").split(";"):
+        if not part.strip():
+            continue
+        pool_parts = [p.strip() for p in part.split(":")]
+        if len(pool_parts) != 3 or not pool_parts[2]:
+            logger.warning(f"Skipping invalid delivery pool (expected name:concurrency:domains): {part}")
+            continue
+        pool, concurrency, domains = pool_parts
+        config.smtp.delivery_pools[pool] = parse_int(concurrency, 0)
+        for domain in domains.split(","):
+            if domain.strip():
+                config.smtp.delivery_pool_domains[domain.strip().lower()] = pool
+    
     # Port configuration
     config.smtp.enable_smtp = parse_bool(env_vars.get("SMTP_ENABLE_PORT_25", "true"))
     config.smtp.enable_submission = parse_bool(env_vars.get("SMTP_ENABLE_PORT_587", "true"))
     config.smtp.enable_smtps = parse_bool(env_vars.get("SMTP_ENABLE_PORT_465", "true"))
     
+    # Process and connection limits (unset limits scale with the CPU count)
+    config.smtp.default_process_limit = parse_int(env_vars.get("SMTP_DEFAULT_PROCESS_LIMIT"), None)
+    config.smtp.smtp_process_limit = parse_int(env_vars.get("SMTP_PROCESS_LIMIT"), None)
+    config.smtp.submission_process_limit = parse_int(env_vars.get("SMTP_SUBMISSION_PROCESS_LIMIT"), None)
+    config.smtp.smtps_process_limit = parse_int(env_vars.get("SMTP_SMTPS_PROCESS_LIMIT"), None)
+    config.smtp.listen_backlog = parse_int(env_vars.get("SMTP_LISTEN_BACKLOG"), None)
+    config.smtp.client_connection_count_limit = parse_int(env_vars.get("SMTP_CLIENT_CONNECTION_COUNT_LIMIT"), None)
+    config.smtp.client_connection_rate_limit = parse_int(env_vars.get("SMTP_CLIENT_CONNECTION_RATE_LIMIT", "0"), 0)
+    config.smtp.client_message_rate_limit = parse_int(env_vars.get("SMTP_CLIENT_MESSAGE_RATE_LIMIT", "0"), 0)
+    config.smtp.anvil_rate_time_unit = parse_int(env_vars.get("SMTP_ANVIL_RATE_TIME_UNIT", "60"), 60)
+    
+    # Queue management
+    config.smtp.message_size_limit_mb = parse_int(env_vars.get("SMTP_MESSAGE_SIZE_LIMIT_MB", "25"), 25)
+    config.smtp.queue_lifetime = parse_int(env_vars.get("SMTP_QUEUE_LIFETIME", "86400"), 86400)
+    config.smtp.bounce_queue_lifetime = parse_int(env_vars.get("SMTP_BOUNCE_QUEUE_LIFETIME", "14400"), 14400)
+    config.smtp.queue_run_delay = parse_int(env_vars.get("SMTP_QUEUE_RUN_DELAY", "300"), 300)
+    config.smtp.spool_budget_mb = parse_int(env_vars.get("SMTP_SPOOL_BUDGET_MB", "2048"), 2048)
+    
     # Parse forwarding rules first so we can derive domains
     config.forwarding_rules = parse_forwarding_rules(env_vars)
     
@@ -273,11 +946,22 @@ def from_environment() -> Configuration:
     if env_vars.get('DKIM_DOMAINS'):
         dkim_domains = {domain.strip() for domain in env_vars.get('DKIM_DOMAINS', '').split(',')}
     
+    # DKIM_INSTANCES used to size a "pool" that in fact only ever gave each listener its own process
+    if parse_int(env_vars.get('DKIM_INSTANCES', '1'), 1) > 1 and 'DKIM_ISOLATE_LISTENERS' not in env_vars:
+        logger.warning("DKIM_INSTANCES is deprecated, use DKIM_ISOLATE_LISTENERS=true instead")
+        env_vars = {**env_vars, 'DKIM_ISOLATE_LISTENERS': 'true'}
+    
     config.dkim = DKIMConfig(
         enabled=parse_bool(env_vars.get('DKIM_ENABLED', 'true')),
         selector=env_vars.get('DKIM_SELECTOR', 'mail'),
         key_size=parse_int(env_vars.get('DKIM_KEY_SIZE', '2048'), 2048),
         domains=dkim_domains,
+        key_algorithm=env_vars.get('DKIM_KEY_ALGORITHM', 'rsa').lower(),
+        ed25519_selector=env_vars.get('DKIM_ED25519_SELECTOR'),
+        isolate_listeners=parse_bool(env_vars.get('DKIM_ISOLATE_LISTENERS', 'false')),
+        milter_connect_timeout=parse_int(env_vars.get('DKIM_MILTER_CONNECT_TIMEOUT', '10'), 10),
+        milter_command_timeout=parse_int(env_vars.get('DKIM_MILTER_COMMAND_TIMEOUT', '30'), 30),
+        milter_content_timeout=parse_int(env_vars.get('DKIM_MILTER_CONTENT_TIMEOUT', '60'), 60),
     )
     
     # TLS Configuration
@@ -292,12 +976,19 @@ def from_environment() -> Configuration:
         challenge_type=env_vars.get('TLS_CHALLENGE_TYPE', 'tls-alpn').lower(),
         staging=parse_bool(env_vars.get('TLS_STAGING', 'false')),
         renewal_days=parse_int(env_vars.get('TLS_RENEWAL_DAYS', '30'), 30),
+        renewal_stagger_days=parse_int(env_vars.get('TLS_RENEWAL_STAGGER_DAYS', '3'), 3),
+        renewal_max_per_run=parse_int(env_vars.get('TLS_RENEWAL_MAX_PER_RUN', '2'), 2),
         use_letsencrypt=parse_bool(env_vars.get('TLS_USE_LETSENCRYPT', 'true')),
         key_size=parse_int(env_vars.get('TLS_KEY_SIZE', '2048'), 2048),
+        key_algorithm=env_vars.get('TLS_KEY_ALGORITHM', 'rsa').lower(),
         params_bits=parse_int(env_vars.get('TLS_PARAMS_BITS', '2048'), 2048),
         security_level=env_vars.get('TLS_SECURITY_LEVEL', 'may'),
-        protocols=env_vars.get('TLS_PROTOCOLS', '!SSLv2, !SSLv3'),
+        protocols=env_vars.get('TLS_PROTOCOLS', '!SSLv2, !SSLv3, !TLSv1, !TLSv1.1'),
         ciphers=env_vars.get('TLS_CIPHERS', 'high'),
+        session_cache_type=env_vars.get('TLS_SESSION_CACHE_TYPE', 'lmdb').lower(),
+        session_cache_timeout=parse_int(env_vars.get('TLS_SESSION_CACHE_TIMEOUT', '3600'), 3600),
+        session_tickets=parse_bool(env_vars.get('TLS_SESSION_TICKETS', 'true')),
+        session_ticket_cipher=env_vars.get('TLS_SESSION_TICKET_CIPHER', 'aes-256-cbc'),
     )
     
     # SRS Configuration
@@ -310,14 +1001,51 @@ def from_environment() -> Configuration:
         secret=env_vars.get('SRS_SECRET', ''),
         domain=env_vars.get('SRS_DOMAIN'),  # Will default to SMTP hostname if None
         exclude_domains=srs_exclude_domains,
+        rotation_grace_days=parse_int(env_vars.get('SRS_ROTATION_GRACE_DAYS', '21'), 21),
+        backend=env_vars.get('SRS_BACKEND', 'postsrsd').lower(),
+    )
+    
+    # Cluster Configuration
+    config.cluster = ClusterConfig(
+        enabled=parse_bool(env_vars.get('CLUSTER_ENABLED', 'false')),
+        shared_dir=env_vars.get('CLUSTER_SHARED_DIR', '/var/lib/mail-forwarder-shared'),
+        lock_timeout=parse_int(env_vars.get('CLUSTER_LOCK_TIMEOUT', '600'), 600),
+    )
+    
+    # Postscreen Configuration
+    postscreen_dnsbl_sites = PostscreenConfig().dnsbl_sites
+    if 'POSTSCREEN_DNSBL_SITES' in env_vars:
+        postscreen_dnsbl_sites = [site.strip() for site in env_vars['POSTSCREEN_DNSBL_SITES'].split(',') if site.strip()]
+    
+    config.postscreen = PostscreenConfig(
+        enabled=parse_bool(env_vars.get('POSTSCREEN_ENABLED', 'false')),
+        dnsbl_sites=postscreen_dnsbl_sites,
+        dnsbl_threshold=parse_int(env_vars.get('POSTSCREEN_DNSBL_THRESHOLD', '2'), 2),
+        dnsbl_action=env_vars.get('POSTSCREEN_DNSBL_ACTION', 'enforce').lower(),
+        greet_action=env_vars.get('POSTSCREEN_GREET_ACTION', 'enforce').lower(),
+        greet_wait=parse_int(env_vars.get('POSTSCREEN_GREET_WAIT', '6'), 6),
+    )
+    
+    # Logging Configuration
+    config.logging = LoggingConfig(
+        file=env_vars.get('MAIL_LOG_FILE', '/var/log/mail.log'),
+        max_size_mb=parse_int(env_vars.get('MAIL_LOG_MAX_SIZE_MB', '10'), 10),
+        backups=parse_int(env_vars.get('MAIL_LOG_BACKUPS', '1'), 1),
+        stdout=parse_bool(env_vars.get('MAIL_LOG_STDOUT', 'true')),
+        flush_interval=parse_int(env_vars.get('MAIL_LOG_FLUSH_INTERVAL', '1'), 1),
     )
     
     # Security Configuration
     config.security = SecurityConfig(
         fail2ban_enabled=parse_bool(env_vars.get('FAIL2BAN_ENABLED', 'true')),
+        backend=env_vars.get('FAIL2BAN_BACKEND', 'fail2ban').lower(),
+        ban_action=env_vars.get('FAIL2BAN_BAN_ACTION', 'auto').lower(),
         max_attempts=parse_int(env_vars.get('FAIL2BAN_MAX_ATTEMPTS', '5'), 5),
         ban_time=parse_int(env_vars.get('FAIL2BAN_BAN_TIME', '3600'), 3600),
         find_time=parse_int(env_vars.get('FAIL2BAN_FIND_TIME', '600'), 600),
+        db_purge_age=parse_int(env_vars.get('FAIL2BAN_DB_PURGE_AGE'), None),
+        ban_time_increment=parse_bool(env_vars.get('FAIL2BAN_BAN_TIME_INCREMENT', 'false')),
+        ban_time_max=parse_int(env_vars.get('FAIL2BAN_BAN_TIME_MAX', '604800'), 604800),
     )
     
     # Validate the configuration and set smart defaults
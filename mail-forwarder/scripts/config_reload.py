@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Hot configuration reload for the mail forwarder.
+Compares a freshly loaded configuration with the last applied one and
+re-runs only the configure steps affected by the change.
+"""
+
+import os
+import json
+import time
+import logging
+import importlib
+from typing import List, Optional
+
+from config import (Configuration, ConfigDiff, STATE_DIR, diff_configs, from_environment, get_config_file,
+                    get_settings, to_dict, from_dict)
+from snapshot import save_snapshot, invalidate_snapshot
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('config_reload')
+
+# Constants
+APPLIED_CONFIG_FILE = os.path.join(STATE_DIR, "applied-config.json")
+WATCH_INTERVAL = 5  # Seconds between checks of the configuration file
+
+# Configure steps in dependency order, the same order initialize uses.
+# Modules are imported on first use so loading the configuration stays cheap.
+STEPS = [
+    ("opendkim", "dkim_config", "configure_opendkim"),
+    ("tls", "tls_config", "configure_tls"),
+    ("postfix", "postfix_config", "configure_postfix"),
+    ("fail2ban", "security_config", "configure_fail2ban"),
+    ("supervisor", "supervisor_config", "configure_supervisor"),
+]
+
+def load_configuration() -> Configuration:
+    """Load the configuration from the environment and the mounted configuration file."""
+    return from_environment(get_settings())
+
+def load_applied_config() -> Optional[Configuration]:
+    """Load the last applied configuration, or None if there is none."""
+    if not os.path.exists(APPLIED_CONFIG_FILE):
+        return None
+
+    try:
+        with open(APPLIED_CONFIG_FILE, 'r') as f:
+            return from_dict(json.load(f))
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable applied configuration: {e}")
+        return None
+
+def save_applied_config(config: Configuration) -> None:
+    """Persist the applied configuration. It contains secrets, so only root can read it."""
+    os.makedirs(STATE_DIR, exist_ok=True)
+    tmp_path = f"{APPLIED_CONFIG_FILE}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(to_dict(config), f, indent=2, sort_keys=True)
+    os.replace(tmp_path, APPLIED_CONFIG_FILE)
+
+def describe_diff(diff: Optional[ConfigDiff]) -> str:
+    """Summarize a diff for the log."""
+    if diff is None:
+        return "all"
+    changed = sorted(change.path for change in diff.changes)
+    if diff.added_rules or diff.removed_rules:
+        changed.append(f"forwarding rules (+{len(diff.added_rules)}/-{len(diff.removed_rules)})")
+    return ", ".join(changed)
+
+def apply_configuration(config: Configuration, diff: Optional[ConfigDiff] = None) -> List[str]:
+    """
+    Run the configure steps affected by the diff (all if None).
+
+    Steps get the diff too, so they only regenerate the affected artifacts,
+    and only the services owning files whose content changed are reloaded.
+    Returns the names of the steps that were run.
+    """
+    ran = []
+    for name, module, function in STEPS:
+        if diff is None or diff.affects(name):
+            logger.info(f"Running configure step: {name}")
+            configure = getattr(importlib.import_module(module), function)
+            configure(config, diff)
+            ran.append(name)
+    return ran
+
+def reload_configuration() -> bool:
+    """Reload the configuration and apply what changed. Returns True on success."""
+    try:
+        config = load_configuration()
+        previous = load_applied_config()
+
+        diff = diff_configs(previous, config) if previous else None
+        if diff is not None and not diff:
+            logger.warning("Configuration unchanged, nothing to reload")
+            return True
+
+        # The snapshot no longer matches what is on disk until the reload is done
+        invalidate_snapshot()
+        ran = apply_configuration(config, diff)
+        save_applied_config(config)
+        save_snapshot(config)
+        logger.warning(f"Configuration reloaded (changed: {describe_diff(diff)}; "
+                       f"steps: {', '.join(ran) or 'none'})")
+        return True
+    except Exception as e:
+        logger.error(f"Configuration reload failed, keeping the running configuration: {e}")
+        return False
+
+def _file_signature(path: str):
+    """Return a cheap signature of a file that changes when it is modified or replaced."""
+    try:
+        st = os.stat(path)
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+    except FileNotFoundError:
+        return None
+
+def watch(interval: float = WATCH_INTERVAL) -> None:
+    """Watch the configuration file and reload whenever it changes."""
+    config_file = get_config_file()
+    logger.warning(f"Watching {config_file} for configuration changes")
+
+    signature = _file_signature(config_file)
+    while True:
+        time.sleep(interval)
+        current = _file_signature(config_file)
+        if current != signature:
+            signature = current
+            if current is not None:
+                logger.warning(f"{config_file} changed, reloading configuration")
+                reload_configuration()
@@ -4,13 +4,16 @@ OpenDKIM configuration management for the mail forwarder.
 """
 
 import os
+import base64
 import logging
 import subprocess
 import shutil
 from pathlib import Path
+from typing import List, Optional
 
-from config import Configuration
+from config import Configuration, ConfigDiff
 from utils import render_template, ensure_template_exists, register_service_callback, reload_opendkim
+from cluster import lock_for
 import utils
 
 # Configure logging
@@ -33,10 +36,48 @@ def is_dkim_enabled():
     global _config
     return _config is not None and _config.dkim.enabled
 
+def reload_signers():
+    """Reload every OpenDKIM program of the current configuration."""
+    reload_opendkim([program for program, _ in _config.dkim.signers])
+
 # Register the callback with the check function
-register_service_callback("opendkim", reload_opendkim, is_dkim_enabled)
+register_service_callback("opendkim", reload_signers, is_dkim_enabled)
+
+def get_signer_path(program: str, name: str) -> str:
+    """Return the path of a signer's key or signing table; the first signer's files keep the plain names."""
+    return os.path.join(OPENDKIM_CONF_DIR, f"{name}{program[len('opendkim'):]}")
+
+def get_signer_selectors(config: Configuration, algorithm: str) -> List[str]:
+    """Return the selectors a signer signs with."""
+    return [selector for selector, key_algorithm in config.dkim.keys if key_algorithm == algorithm]
+
+def generate_ed25519_key(domain, selector, key_file, txt_file):
+    """
+    Generate an Ed25519 DKIM key (RFC 8463) with openssl.
+    
+    opendkim-genkey only produces RSA keys, so the TXT record file is written
+    in the same format it uses.
+    """
+    subprocess.run([
+        "openssl", "genpkey",
+        "-algorithm", "ed25519",
+        "-out", key_file
+    ], check=True)
+    
+    # The DNS record carries the raw 32-byte public key, which is the tail of the DER encoding
+    public_der = subprocess.check_output([
+        "openssl", "pkey",
+        "-in", key_file,
+        "-pubout",
+        "-outform", "DER"
+    ])
+    public_key = base64.b64encode(public_der[-32:]).decode('ascii')
+    
+    with open(txt_file, 'w') as f:
+        f.write(f'{selector}._domainkey\tIN\tTXT\t( "v=DKIM1; k=ed25519; p={public_key}" )'
+                f'  ; ----- DKIM key {selector} for {domain}\n')
 
-def ensure_dkim_key(domain, selector, key_size):
+def ensure_dkim_key(domain, selector, key_size, key_algorithm="rsa"):
     """Ensure DKIM key exists for the domain and selector."""
     domain_dir = os.path.join(OPENDKIM_KEYS_DIR, domain)
     key_file = os.path.join(domain_dir, f"{selector}.private")
@@ -51,14 +92,17 @@ def ensure_dkim_key(domain, selector, key_size):
     Path(domain_dir).mkdir(parents=True, exist_ok=True)
     
     # Generate new key
-    logger.info(f"Generating new DKIM key for {domain} with selector {selector}")
-    subprocess.run([
-        "opendkim-genkey",
-        "-b", str(key_size),
-        "-d", domain,
-        "-s", selector,
-        "-D", domain_dir
-    ], check=True)
+    logger.info(f"Generating new {key_algorithm} DKIM key for {domain} with selector {selector}")
+    if key_algorithm == "ed25519":
+        generate_ed25519_key(domain, selector, key_file, txt_file)
+    else:
+        subprocess.run([
+            "opendkim-genkey",
+            "-b", str(key_size),
+            "-d", domain,
+            "-s", selector,
+            "-D", domain_dir
+        ], check=True)
     
     # Set permissions
     os.chmod(key_file, 0o640)
@@ -84,24 +128,25 @@ def generate_dkim_dns_records(config: Configuration):
     dns_records = {}
     
     # The domains are now automatically derived from forwarding rules if not explicitly set
-    for domain in config.dkim.domains:
-        key_file, txt_file = ensure_dkim_key(domain, config.dkim.selector, config.dkim.key_size)
-        
-        # Get the DKIM record
-        record = get_dkim_record(txt_file)
-        
-        # Store the DNS record
-        dns_name = f"{config.dkim.selector}._domainkey.{domain}"
-        dns_records[dns_name] = record
-        
-        logger.info(f"Generated DKIM DNS record for {domain}")
+    for domain in sorted(config.dkim.domains):
+        for selector, key_algorithm in config.dkim.keys:
+            key_file, txt_file = ensure_dkim_key(domain, selector, config.dkim.key_size, key_algorithm)
+            
+            # Get the DKIM record
+            record = get_dkim_record(txt_file)
+            
+            # Store the DNS record
+            dns_name = f"{selector}._domainkey.{domain}"
+            dns_records[dns_name] = record
+            
+            logger.info(f"Generated {key_algorithm} DKIM DNS record for {domain}")
     
     return dns_records
 
-def create_key_table(config: Configuration) -> None:
-    """Create the OpenDKIM key table file using Jinja2 template."""
+def create_key_table(config: Configuration, program: str = "opendkim", algorithm: str = "rsa") -> None:
+    """Create a signer's OpenDKIM key table file using Jinja2 template."""
     template_path = os.path.join(TEMPLATES_DIR, "key_table.j2")
-    output_path = os.path.join(OPENDKIM_CONF_DIR, "key_table")
+    output_path = get_signer_path(program, "key_table")
     
     # Render the template
     render_template(
@@ -109,18 +154,18 @@ def create_key_table(config: Configuration) -> None:
         output_path,
         {
             "domains": sorted(config.dkim.domains),
-            "selector": config.dkim.selector,
+            "selectors": get_signer_selectors(config, algorithm),
             "keys_dir": OPENDKIM_KEYS_DIR
         },
         "opendkim"
     )
     
-    logger.info(f"Created OpenDKIM key table with {len(config.dkim.domains)} domains")
+    logger.info(f"Created OpenDKIM key table for {program} with {len(config.dkim.domains)} domains")
 
-def create_signing_table(config: Configuration) -> None:
-    """Create the OpenDKIM signing table file using Jinja2 template."""
+def create_signing_table(config: Configuration, program: str = "opendkim", algorithm: str = "rsa") -> None:
+    """Create a signer's OpenDKIM signing table file using Jinja2 template."""
     template_path = os.path.join(TEMPLATES_DIR, "signing_table.j2")
-    output_path = os.path.join(OPENDKIM_CONF_DIR, "signing_table")
+    output_path = get_signer_path(program, "signing_table")
     
     # Render the template
     render_template(
@@ -128,12 +173,47 @@ def create_signing_table(config: Configuration) -> None:
         output_path,
         {
             "domains": sorted(config.dkim.domains),
-            "selector": config.dkim.selector
+            "selectors": get_signer_selectors(config, algorithm)
         },
         "opendkim"
     )
     
-    logger.info(f"Created OpenDKIM signing table with {len(config.dkim.domains)} domains")
+    logger.info(f"Created OpenDKIM signing table for {program} with {len(config.dkim.domains)} domains")
+
+def create_opendkim_configs(config: Configuration) -> None:
+    """
+    Create the configuration and the key and signing tables of every signer
+    (see DKIMConfig.signers). Only the first signer also verifies, so inbound
+    mail gets a single verification result.
+    """
+    signers = config.dkim.signers
+    for index, (program, algorithm) in enumerate(signers):
+        create_key_table(config, program, algorithm)
+        create_signing_table(config, program, algorithm)
+        render_template(
+            os.path.join(TEMPLATES_DIR, "opendkim.conf.j2"),
+            os.path.join(OPENDKIM_CONF_DIR, f"{program}.conf"),
+            {
+                "config": config,
+                "program": program,
+                "mode": "sv" if index == 0 else "s",
+                "key_table": get_signer_path(program, "key_table"),
+                "signing_table": get_signer_path(program, "signing_table"),
+                "trusted_hosts": os.path.join(OPENDKIM_CONF_DIR, "trusted_hosts"),
+                "signature_algorithm": f"{algorithm}-sha256",
+            },
+            "opendkim"
+        )
+    
+    # Drop the files of a signer that is no longer used, e.g. after leaving dual mode
+    used = {program for program, _ in signers}
+    for program in ("opendkim-ed25519",):
+        if program in used:
+            continue
+        for path in (os.path.join(OPENDKIM_CONF_DIR, f"{program}.conf"),
+                     get_signer_path(program, "key_table"), get_signer_path(program, "signing_table")):
+            if os.path.exists(path):
+                os.remove(path)
 
 def create_trusted_hosts(config: Configuration) -> None:
     """Create the OpenDKIM trusted hosts file using Jinja2 template."""
@@ -183,8 +263,8 @@ def create_spf_dmarc_instructions(config: Configuration) -> None:
     
     logger.info(f"Generated SPF and DMARC instructions at {output_path}")
 
-def configure_opendkim(config: Configuration) -> None:
-    """Configure OpenDKIM using the provided configuration."""
+def configure_opendkim(config: Configuration, diff: Optional[ConfigDiff] = None) -> None:
+    """Configure OpenDKIM using the provided configuration, skipping it if the diff doesn't affect it."""
     global _config
     _config = config
     
@@ -192,20 +272,22 @@ def configure_opendkim(config: Configuration) -> None:
         logger.info("DKIM is disabled, skipping OpenDKIM configuration")
         return
     
+    if diff is not None and not diff.affects("opendkim"):
+        logger.info("OpenDKIM configuration unchanged, skipping")
+        return
+    
     logger.info("Configuring OpenDKIM")
     
     # Ensure directories exist
     Path(OPENDKIM_CONF_DIR).mkdir(exist_ok=True)
     Path(OPENDKIM_KEYS_DIR).mkdir(exist_ok=True)
     
-    # Generate DKIM keys and DNS records
-    dns_records = generate_dkim_dns_records(config)
+    # Generate DKIM keys and DNS records; in a cluster one replica generates missing keys
+    with lock_for(config, "dkim-keys"):
+        dns_records = generate_dkim_dns_records(config)
     
-    # Create key table
-    create_key_table(config)
-    
-    # Create signing table
-    create_signing_table(config)
+    # Create the configuration, key table and signing table of every signer
+    create_opendkim_configs(config)
     
     # Create trusted hosts
     create_trusted_hosts(config)
@@ -216,19 +298,6 @@ def configure_opendkim(config: Configuration) -> None:
     # Create SPF and DMARC instructions
     create_spf_dmarc_instructions(config)
     
-    # Render opendkim.conf template
-    render_template(
-        os.path.join(TEMPLATES_DIR, "opendkim.conf.j2"),
-        os.path.join(OPENDKIM_CONF_DIR, "opendkim.conf"),
-        {
-            "config": config,
-            "key_table": os.path.join(OPENDKIM_CONF_DIR, "key_table"),
-            "signing_table": os.path.join(OPENDKIM_CONF_DIR, "signing_table"),
-            "trusted_hosts": os.path.join(OPENDKIM_CONF_DIR, "trusted_hosts"),
-        },
-        "opendkim"
-    )
-    
     logger.info("OpenDKIM configuration complete")
 
 def print_dns_setup_instructions(config: Configuration) -> None:
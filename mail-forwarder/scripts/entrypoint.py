@@ -8,21 +8,16 @@ import os
 import sys
 import logging
 import subprocess
-import time
+import signal
 import argparse
 import socket
-import dns.resolver
-from tabulate import tabulate
 from pathlib import Path
 import io
 
-# Import configuration modules
-from config import Configuration, from_environment
-from postfix_config import configure_postfix
-from dkim_config import configure_opendkim, print_dns_setup_instructions as print_dkim_dns
-from tls_config import configure_tls, setup_cron_job as setup_auto_renewal, print_tls_info
-from security_config import configure_fail2ban
-from utils import render_template, ensure_template_exists
+# Import configuration modules; the configure modules (and jinja2, dnspython
+# and tabulate) are imported by the commands that need them
+from config import Configuration
+from config_reload import load_configuration
 
 # Configure logging to only show warnings and errors
 logging.basicConfig(
@@ -34,42 +29,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger('entrypoint')
 
-def setup_supervisor(config: Configuration):
-    """Set up the supervisor configuration."""
-    # Set up main supervisord.conf directly
-    supervisord_conf = "/etc/supervisor/supervisord.conf"
-    
-    # Create the supervisord.conf file directly
-    with open(supervisord_conf, 'w') as f:
-        f.write("[unix_http_server]\n")
-        f.write("file=/var/run/supervisor.sock\n")
-        f.write("chmod=0700\n\n")
-        f.write("[supervisord]\n")
-        f.write("nodaemon=true\n")
-        f.write("user=root\n\n")
-        f.write("[supervisorctl]\n")
-        f.write("serverurl=unix:///var/run/supervisor.sock\n\n")
-        f.write("[include]\n")
-        f.write("files=/etc/supervisor/conf.d/*.conf\n")
-    
-    logger.debug("Generated supervisord configuration")
-    
-    # Set up program configuration
-    supervisor_conf = "/etc/supervisor/conf.d/mail-forwarder.conf"
-    template_path = "/templates/supervisor/mail-forwarder.conf.j2"
-    
-    # Render the template
-    render_template(
-        template_path,
-        supervisor_conf,
-        {"config": config},
-        None  # No service to reload for this file
-    )
-    # Only log at debug level instead of info
-    logger.debug("Generated supervisor program configuration from template")
+# Constants
+SUPERVISOR_START_TIMEOUT = 30
 
 def check_dns_records(config: Configuration):
     """Check current DNS records for the configured domains."""
+    import dns.resolver
+    
     dns_results = []
     resolver = dns.resolver.Resolver()
     resolver.timeout = 5
@@ -112,35 +78,35 @@ def check_dns_records(config: Configuration):
         
         dns_results.append(["SPF (TXT)", domain, spf_valid, spf_current, spf_wanted])
         
-        # Check DKIM record
-        dkim_selector = config.dkim.selector
-        dkim_name = f"{dkim_selector}._domainkey.{domain}"
-        dkim_current = "Not found"
-        dkim_valid = False
-        
-        # Get expected DKIM record from file
-        dkim_wanted = "DKIM record not generated yet"
-        dkim_records_file = f"/etc/opendkim/dns_records.txt"
-        if os.path.exists(dkim_records_file):
-            with open(dkim_records_file, 'r') as f:
-                for line in f:
-                    if dkim_name in line and "IN TXT" in line:
-                        dkim_wanted = line.split("IN TXT")[1].strip()
+        # Check DKIM records, one per signing key
+        for dkim_selector, _ in config.dkim.keys:
+            dkim_name = f"{dkim_selector}._domainkey.{domain}"
+            dkim_current = "Not found"
+            dkim_valid = False
+            
+            # Get expected DKIM record from file
+            dkim_wanted = "DKIM record not generated yet"
+            dkim_records_file = f"/etc/opendkim/dns_records.txt"
+            if os.path.exists(dkim_records_file):
+                with open(dkim_records_file, 'r') as f:
+                    for line in f:
+                        if dkim_name in line and "IN TXT" in line:
+                            dkim_wanted = line.split("IN TXT")[1].strip()
+                            break
+            
+            try:
+                answers = resolver.resolve(dkim_name, 'TXT')
+                for rdata in answers:
+                    txt_data = "".join(str(txt) for txt in rdata.strings)
+                    dkim_current = txt_data
+                    if "v=DKIM1" in txt_data:
+                        # Simplified validation - just check if it contains the basics
+                        dkim_valid = True
                         break
-        
-        try:
-            answers = resolver.resolve(dkim_name, 'TXT')
-            for rdata in answers:
-                txt_data = "".join(str(txt) for txt in rdata.strings)
-                dkim_current = txt_data
-                if "v=DKIM1" in txt_data:
-                    # Simplified validation - just check if it contains the basics
-                    dkim_valid = True
-                    break
-        except Exception as e:
-            dkim_current = f"Error: {str(e)}"
-        
-        dns_results.append(["DKIM (TXT)", dkim_name, dkim_valid, dkim_current, dkim_wanted])
+            except Exception as e:
+                dkim_current = f"Error: {str(e)}"
+            
+            dns_results.append(["DKIM (TXT)", dkim_name, dkim_valid, dkim_current, dkim_wanted])
         
         # Check DMARC record
         dmarc_name = f"_dmarc.{domain}"
@@ -164,25 +130,18 @@ def check_dns_records(config: Configuration):
     
     return dns_results
 
-def is_supervisor_ready():
-    """Check if supervisor is ready by checking for the existence of the socket file."""
-    supervisor_sock = "/var/run/supervisor.sock"
-    return os.path.exists(supervisor_sock)
-
-def wait_for_supervisor(timeout=30):
-    """Wait for supervisor to be ready by checking the socket file."""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        if is_supervisor_ready():
-            logger.info("Supervisor is ready")
-            return True
-        logger.info("Waiting for supervisor to be ready...")
-        time.sleep(1)
-    logger.error(f"Supervisor did not become ready within {timeout} seconds")
-    return False
+def start_supervisor():
+    """Start supervisord, passing stop signals on to it so it can shut the services down cleanly."""
+    process = subprocess.Popen(["supervisord", "-c", "/etc/supervisor/supervisord.conf"])
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: process.send_signal(signum))
+    return process
 
 def initialize(config: Configuration):
-    """Initialize the mail forwarder container."""
+    """Initialize the mail forwarder container; returns the supervisord process, or None on failure."""
+    from snapshot import save_snapshot, restore_snapshot, invalidate_snapshot
+    import supervisor_client
+    
     try:
         # Create required directories
         Path("/templates").mkdir(exist_ok=True)
@@ -192,45 +151,73 @@ def initialize(config: Configuration):
         Path("/templates/fail2ban").mkdir(exist_ok=True)
         Path("/templates/supervisor").mkdir(exist_ok=True)
         
-        # First, generate supervisor configuration
-        setup_supervisor(config)
-        
-        # Configure all services before starting supervisord
-        
-        # 1. OpenDKIM first (needed by Postfix)
-        configure_opendkim(config)
-        
-        # 2. TLS certificates
-        configure_tls(config)
-        
-        # 3. Postfix (depends on OpenDKIM and TLS)
-        configure_postfix(config)
-        
-        # 4. Security (fail2ban)
-        if config.security.fail2ban_enabled:
-            configure_fail2ban(config)
+        # With unchanged inputs, the files generated on the last start can be reused as-is
+        if restore_snapshot(config):
+            logger.warning("Configuration unchanged, restored generated files from snapshot")
+        else:
+            from postfix_config import configure_postfix
+            from dkim_config import configure_opendkim, print_dns_setup_instructions as print_dkim_dns
+            from tls_config import configure_tls, print_tls_info
+            from security_config import configure_fail2ban
+            from supervisor_config import configure_supervisor
+            from config_reload import save_applied_config
+            
+            invalidate_snapshot()
+            
+            # First, generate supervisor configuration
+            configure_supervisor(config)
+            
+            # Configure all services before starting supervisord
+            
+            # 1. OpenDKIM first (needed by Postfix)
+            configure_opendkim(config)
+            
+            # 2. TLS certificates
+            configure_tls(config)
+            
+            # 3. Postfix (depends on OpenDKIM and TLS)
+            configure_postfix(config)
+            
+            # 4. Security (fail2ban)
+            if config.security.fail2ban_enabled:
+                configure_fail2ban(config)
+            
+            # Print DNS setup instructions
+            print_dkim_dns(config)
+            print_tls_info(config)
+            
+            # Remember what was applied so later reloads only redo what changed,
+            # and snapshot the generated files for the next start
+            save_applied_config(config)
+            save_snapshot(config)
         
-        # Print DNS setup instructions
-        print_dkim_dns(config)
-        print_tls_info(config)
+        # The kernel accept queue limit belongs to the container's network namespace,
+        # so it is applied on every start, including restores from the snapshot
+        from postfix_config import tune_listen_backlog
+        tune_listen_backlog(config)
         
         # Finally, start supervisord which will start all services
         logger.info("Starting supervisord to manage all services...")
-        subprocess.run(["supervisord", "-c", "/etc/supervisor/supervisord.conf"], check=True)
+        supervisord = start_supervisor()
         
-        # Wait for supervisor to be ready
-        if not wait_for_supervisor():
-            raise RuntimeError("Supervisor failed to initialize within the timeout period")
-            
-        logger.info("Supervisord started successfully, all services should now be running")
+        # Wait for the services to actually be running rather than for a fixed time
+        if not supervisor_client.wait_for_running(SUPERVISOR_START_TIMEOUT):
+            if supervisord.poll() is not None or not supervisor_client.is_available():
+                supervisord.terminate()
+                raise RuntimeError("Supervisor failed to initialize within the timeout period")
+            logger.error("Not all services are running, see the supervisord log")
+        else:
+            logger.info("Supervisord started successfully, all services are running")
         
-        return True
+        return supervisord
     except Exception as e:
         logger.error(f"Initialization failed: {e}")
-        return False
+        return None
 
 def show_config_table(config: Configuration):
     """Display the configuration in a formatted table."""
+    from tabulate import tabulate
+    
     # Capture stdout to a string buffer
     old_stdout = sys.stdout
     sys.stdout = buffer = io.StringIO()
@@ -241,6 +228,9 @@ def show_config_table(config: Configuration):
         ["SMTP Hostname", config.smtp.hostname],
         ["HELO Name", config.smtp.helo_name],
         ["Debug Mode", "Enabled" if config.debug else "Disabled"],
+        ["Cluster Mode", f"Enabled ({config.cluster.shared_dir})" if config.cluster.enabled else "Disabled"],
+        ["Mail Log", f"{config.logging.file} ({config.logging.max_size_mb} MB, {config.logging.backups} rotated)"
+                     if config.logging.file else "Container output only"],
     ]
     print(tabulate(basic_table, tablefmt="plain"))
     
@@ -250,6 +240,11 @@ def show_config_table(config: Configuration):
         ["Port 25 (SMTP)", "Enabled" if config.smtp.enable_smtp else "Disabled"],
         ["Port 587 (Submission)", "Enabled" if config.smtp.enable_submission else "Disabled"],
         ["Port 465 (SMTPS)", "Enabled" if config.smtp.enable_smtps else "Disabled"],
+        ["Process Limits", f"25: {config.smtp.smtp_process_limit}, 587: {config.smtp.submission_process_limit}, "
+                           f"465: {config.smtp.smtps_process_limit}, other: {config.smtp.default_process_limit}"],
+        ["Connections per Client", config.smtp.client_connection_count_limit],
+        ["Message Size Limit", f"{config.smtp.message_size_limit_mb} MB"],
+        ["Queue Lifetime", f"{config.smtp.queue_lifetime} seconds (bounces: {config.smtp.bounce_queue_lifetime})"],
     ]
     print(tabulate(ports_table, tablefmt="plain"))
     
@@ -267,7 +262,7 @@ def show_config_table(config: Configuration):
     ]
     if config.dkim.enabled:
         dkim_table.extend([
-            ["Selector", config.dkim.selector],
+            ["Selectors", ", ".join(f"{selector} ({algorithm})" for selector, algorithm in config.dkim.keys)],
             ["Key Size", f"{config.dkim.key_size} bits"],
             ["Domains", ", ".join(sorted(config.dkim.domains)) if config.dkim.domains else "None"],
         ])
@@ -282,6 +277,7 @@ def show_config_table(config: Configuration):
         tls_table.extend([
             ["Email", config.tls.email],
             ["Challenge Type", config.tls.challenge_type],
+            ["Key Algorithm", config.tls.key_algorithm],
             ["Staging", "Yes" if config.tls.staging else "No"],
             ["Domains", ", ".join(sorted(config.tls.domains)) if config.tls.domains else "None"],
         ])
@@ -295,35 +291,53 @@ def show_config_table(config: Configuration):
     if config.srs.enabled:
         srs_table.extend([
             ["Domain", config.srs.domain],
-            ["Secret", "Set" if config.srs.secret else "Not Set"],
+            ["Secret", "Set" if config.srs.secret else "Persisted (generated)"],
+            ["Rotation Grace Period", f"{config.srs.rotation_grace_days} days"],
             ["Excluded Domains", ", ".join(sorted(config.srs.exclude_domains)) if config.srs.exclude_domains else "None"],
         ])
     print(tabulate(srs_table, tablefmt="plain"))
     
     # SMTP relay configuration
     print("\n🔀 SMTP Relay Configuration:")
+    relays = config.smtp.relay_pool
     relay_table = [
-        ["Relay Host", config.smtp.relay_host if config.smtp.relay_host else "None"],
+        ["Relay Host", ", ".join(f"{relay.host}:{relay.port}" + (f" (weight {relay.weight})" if len(relays) > 1 else "")
+                                 for relay in relays) or "None"],
     ]
-    if config.smtp.relay_host:
+    if relays:
         relay_table.extend([
-            ["Relay Port", config.smtp.relay_port],
             ["Use TLS", "Yes" if config.smtp.use_tls else "No"],
-            ["Authentication", "Yes" if config.smtp.relay_username and config.smtp.relay_password else "No"],
+            ["Authentication", ", ".join("Yes" if relay.username and relay.password else "No" for relay in relays)],
         ])
+    relay_table.extend([
+        ["Fallback Relay", f"{config.smtp.fallback_relay_host}:{config.smtp.fallback_relay_port}"
+                           if config.smtp.fallback_relay_host else "None"],
+        ["Sender Relays", ", ".join(f"{domain}: {relay.host}:{relay.port}" for domain, relay
+                                    in sorted(config.smtp.sender_relays.items())) or "None"],
+        ["Delivery Pools", ", ".join(f"{pool} ({concurrency})" for pool, concurrency
+                                     in sorted(config.smtp.delivery_pools.items())) or "None"],
+    ])
     print(tabulate(relay_table, tablefmt="plain"))
     
     # Security configuration
     print("\n🛡️ Security Configuration:")
     security_table = [
-        ["Fail2Ban", "Enabled" if config.security.fail2ban_enabled else "Disabled"],
+        ["Brute-force Protection", f"Enabled ({config.security.backend})" if config.security.fail2ban_enabled else "Disabled"],
     ]
     if config.security.fail2ban_enabled:
         security_table.extend([
             ["Max Attempts", config.security.max_attempts],
+            ["Ban Action", config.security.ban_action if config.security.backend == "fail2ban" else "ipset (native)"],
             ["Ban Time", f"{config.security.ban_time} seconds"],
             ["Find Time", f"{config.security.find_time} seconds"],
         ])
+    security_table.append(["Postscreen", "Enabled" if config.postscreen.enabled else "Disabled"])
+    if config.postscreen.enabled:
+        security_table.extend([
+            ["DNSBL Sites", ", ".join(config.postscreen.dnsbl_sites) if config.postscreen.dnsbl_sites else "None"],
+            ["DNSBL Threshold", f"{config.postscreen.dnsbl_threshold} ({config.postscreen.dnsbl_action})"],
+            ["Pregreet Wait", f"{config.postscreen.greet_wait} seconds ({config.postscreen.greet_action})"],
+        ])
     print(tabulate(security_table, tablefmt="plain"))
     
     # Get the output and restore stdout
@@ -337,6 +351,8 @@ def show_dns_table(dns_results):
     if not dns_results:
         return
     
+    from tabulate import tabulate
+    
     print("\n==== DNS RECORDS CONFIGURATION ====\n")
     
     # Group DNS results by type for better organization
@@ -383,17 +399,17 @@ def run():
     """
     try:
         # Load configuration
-        config = from_environment()
+        config = load_configuration()
         
         # Initialize the container
-        if initialize(config):
+        supervisord = initialize(config)
+        if supervisord is not None:
             print("Initialization complete")
             
             # Show configuration
             show_config_table(config)
             
             # Check DNS records
-            time.sleep(2)  # Brief delay to allow services to start
             dns_results = check_dns_records(config)
             show_dns_table(dns_results)
             
@@ -401,9 +417,9 @@ def run():
             print("\nMail forwarder initialized successfully")
             print("Services will be managed by supervisord")
             
-            # We don't need to keep the entrypoint script running indefinitely
-            # since supervisord is managing the services
-            return 0
+            # supervisord runs in the foreground as our child, so the container
+            # lives as long as it does
+            return supervisord.wait()
         else:
             logger.error("Initialization failed, exiting")
             return 1
@@ -414,7 +430,7 @@ def run():
 def show_config():
     """Show the current configuration in a tabular format."""
     try:
-        config = from_environment()
+        config = load_configuration()
         show_config_table(config)  # Reuse the table format for consistency
         return 0
     except Exception as e:
@@ -424,7 +440,7 @@ def show_config():
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(description="Mail Forwarder Container")
-    parser.add_argument("command", choices=["run", "config", "initialize"], 
+    parser.add_argument("command", choices=["run", "config", "initialize", "reload", "watch"], 
                         help="Command to execute")
     
     args = parser.parse_args()
@@ -435,6 +451,13 @@ def main():
         return_code = show_config()
     elif args.command == "initialize":
         return_code = run()  # Same as run
+    elif args.command == "reload":
+        from config_reload import reload_configuration
+        return_code = 0 if reload_configuration() else 1
+    elif args.command == "watch":
+        from config_reload import watch
+        watch()
+        return_code = 0
     else:
         logger.error(f"Unknown command: {args.command}")
         return_code = 1
@@ -6,6 +6,8 @@ Checks the status of all required services.
 
 import os
 import sys
+import glob
+import json
 import logging
 import subprocess
 import socket
@@ -17,6 +19,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger('healthcheck')
 
+# Constants
+PROGRAMS_CONF = "/etc/supervisor/conf.d/mail-forwarder.conf"
+APPLIED_CONFIG_FILE = "/var/lib/mail-forwarder/applied-config.json"
+SPOOL_DIR = "/var/spool/postfix"
+QUEUE_DIRS = ["maildrop", "incoming", "active", "deferred", "defer", "bounce", "hold", "corrupt"]
+DEFAULT_SPOOL_BUDGET_MB = 2048
+
 def check_process_running(process_name):
     """Check if a process is running."""
     try:
@@ -63,15 +72,28 @@ def check_opendkim():
         logger.error("OpenDKIM process is not running")
         return False
     
-    # Check if OpenDKIM socket exists
-    if not os.path.exists("/var/run/opendkim/opendkim.sock"):
+    # Check if an OpenDKIM socket exists (one per instance when running a pool)
+    if not glob.glob("/var/run/opendkim/opendkim*.sock"):
         logger.error("OpenDKIM socket does not exist")
         return False
     
     return True
 
+def is_program_configured(program):
+    """Check if a program is part of the generated supervisor configuration."""
+    try:
+        with open(PROGRAMS_CONF, 'r') as f:
+            return f"[program:{program}]" in f.read()
+    except OSError:
+        return True  # Assume the default setup
+
 def check_fail2ban():
     """Check if Fail2ban is running properly."""
+    # Fail2ban doesn't run when it is disabled or the native detector is used
+    if not is_program_configured("fail2ban"):
+        logger.info("Fail2ban is not configured, skipping")
+        return True
+    
     # Check if process is running
     if not check_process_running("fail2ban-server"):
         logger.error("Fail2ban server is not running")
@@ -90,6 +112,49 @@ def check_fail2ban():
         logger.error(f"Failed to check Fail2ban status: {e}")
         return False
 
+def get_spool_budget_mb():
+    """Read the spool budget from the applied configuration; the healthcheck doesn't load the full config."""
+    try:
+        with open(APPLIED_CONFIG_FILE, 'r') as f:
+            return int(json.load(f)["smtp"]["spool_budget_mb"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return DEFAULT_SPOOL_BUDGET_MB
+
+def get_spool_usage():
+    """Return the disk space used by the Postfix queues in bytes, and the number of queue files."""
+    used = files = 0
+    pending = [os.path.join(SPOOL_DIR, name) for name in QUEUE_DIRS]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        used += entry.stat(follow_symlinks=False).st_blocks * 512
+                        files += 1
+                except OSError:
+                    pass  # Queue files come and go while we walk
+    return used, files
+
+def check_spool():
+    """Check the spool disk usage against the configured budget."""
+    budget_mb = get_spool_budget_mb()
+    used, files = get_spool_usage()
+    used_mb = used / (1024 * 1024)
+    
+    if budget_mb and used_mb > budget_mb:
+        logger.error(f"Mail spool uses {used_mb:.0f} MB in {files} queue files, over the budget of {budget_mb} MB")
+        return False
+    
+    logger.info(f"Mail spool uses {used_mb:.1f} MB in {files} queue files"
+                + (f" ({used_mb / budget_mb:.0%} of the {budget_mb} MB budget)" if budget_mb else ""))
+    return True
+
 def check_smtp_ports():
     """Check if SMTP ports are listening."""
     ports_to_check = [25, 465, 587]
@@ -110,6 +175,7 @@ def run_healthcheck():
         ("Postfix", check_postfix),
         ("OpenDKIM", check_opendkim),
         ("Fail2ban", check_fail2ban),
+        ("Mail spool", check_spool),
         ("SMTP ports", check_smtp_ports),
     ]
     
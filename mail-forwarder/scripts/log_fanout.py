@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Syslog fan-out for the mail forwarder.
+Receives the syslog messages of Postfix, OpenDKIM and the other services on
+/dev/log (and its copy inside the Postfix chroot), writes all of them to
+stdout for "docker logs" and the mail messages to a size-bounded, rotated
+log file that fail2ban follows. Output is batched and flushed every flush
+interval, so logging costs a few writes per interval rather than per message.
+With --ban-max-attempts, the mail messages are also fed to the native
+brute-force detector (see brute_force.py).
+"""
+
+import os
+import re
+import sys
+import time
+import socket
+import signal
+import asyncio
+import logging
+import argparse
+import subprocess
+from typing import List, Optional, Tuple
+
+from brute_force import BruteForceDetector, IPSetBanner, SlidingWindowCounter
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('log_fanout')
+
+# Constants
+LOG_SOCKETS = ["/dev/log", "/var/spool/postfix/dev/log"]  # The second one is used by chrooted Postfix daemons
+MAIL_FACILITY = 2
+FLUSH_BYTES = 65536  # Flush early once this much output is buffered
+SOCKET_BUFFER_SIZE = 4 * 1024 * 1024  # Absorbs bursts so senders don't block on a full socket
+SYSLOG_HEADER = re.compile(rb"^<(\d{1,3})>(?:([A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d) )?")
+
+class RotatingLog:
+    """An append-only log file that is rotated once it reaches max_bytes."""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._open()
+
+    def _open(self) -> None:
+        self.file = open(self.path, 'ab')
+        os.chmod(self.path, 0o640)
+        self.size = self.file.tell()
+
+    def rotate(self) -> None:
+        """Shift mail.log to mail.log.1 and so on; without backups the file starts over."""
+        self.file.close()
+        if self.backups:
+            for index in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{index}"):
+                    os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.truncate(self.path, 0)
+        self._open()
+
+    def write(self, data: bytes) -> None:
+        if self.size and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.file.write(data)
+        self.size += len(data)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+def format_message(data: bytes, hostname: bytes) -> Tuple[int, bytes]:
+    """Turn a syslog datagram into (facility, "Mmm dd HH:MM:SS host tag[pid]: msg\\n")."""
+    match = SYSLOG_HEADER.match(data)
+    if not match:
+        return -1, b"%s %s %s\n" % (_timestamp(), hostname, data.rstrip(b"\n\x00"))
+    facility = int(match.group(1)) >> 3
+    stamp = match.group(2) or _timestamp()
+    return facility, b"%s %s %s\n" % (stamp, hostname, data[match.end():].rstrip(b"\n\x00"))
+
+def _timestamp() -> bytes:
+    now = time.localtime()
+    return f"{time.strftime('%b', now)} {now.tm_mday:2d} {time.strftime('%H:%M:%S', now)}".encode()
+
+class LogFanout(asyncio.DatagramProtocol):
+    """Buffers incoming syslog messages and writes them out in batches."""
+
+    def __init__(self, log: Optional[RotatingLog], stdout: bool, flush_interval: float,
+                 detector: Optional[BruteForceDetector] = None):
+        self.log = log
+        self.stdout = stdout
+        self.flush_interval = flush_interval
+        self.detector = detector
+        self.hostname = socket.gethostname().encode()
+        self._stdout_buffer: List[bytes] = []
+        self._log_buffer: List[bytes] = []
+        self._buffered = 0
+        self.messages = 0
+
+    def datagram_received(self, data, addr):
+        facility, line = format_message(data, self.hostname)
+        self.messages += 1
+        if self.stdout:
+            self._stdout_buffer.append(line)
+        if facility == MAIL_FACILITY:
+            if self.log is not None:
+                self._log_buffer.append(line)
+            if self.detector is not None:
+                client = self.detector.feed(line)
+                if client:
+                    # ipset runs in a worker thread so it never stalls the log stream
+                    asyncio.get_running_loop().run_in_executor(None, self.detector.banner.ban, client)
+        self._buffered += len(line)
+        if not self.flush_interval or self._buffered >= FLUSH_BYTES:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write out everything buffered so far."""
+        if self._stdout_buffer:
+            data = b"".join(self._stdout_buffer)
+            self._stdout_buffer = []
+            try:
+                sys.stdout.buffer.write(data)
+                sys.stdout.buffer.flush()
+            except (BrokenPipeError, BlockingIOError):
+                pass
+        if self._log_buffer:
+            # Rotation is checked per batch, so the file may exceed max_bytes by one batch
+            self.log.write(b"".join(self._log_buffer))
+            self.log.flush()
+            self._log_buffer = []
+        self._buffered = 0
+
+def bind_socket(path: str) -> socket.socket:
+    """Create the syslog datagram socket at path, replacing a stale one."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+    sock.bind(path)
+    os.chmod(path, 0o666)
+    return sock
+
+async def serve(args) -> None:
+    """Receive messages until SIGTERM, flushing every flush interval."""
+    log = RotatingLog(args.file, args.max_bytes, args.backups) if args.file else None
+
+    detector = None
+    if args.ban_max_attempts:
+        banner = IPSetBanner(args.ban_time)
+        try:
+            banner.setup()
+            detector = BruteForceDetector(SlidingWindowCounter(args.ban_max_attempts, args.ban_find_time), banner)
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.error(f"Brute-force protection disabled, could not set up the ipset ban list: {e}")
+
+    fanout = LogFanout(log, not args.no_stdout, args.flush_interval, detector)
+
+    loop = asyncio.get_running_loop()
+    transports = []
+    for path in args.socket or LOG_SOCKETS:
+        transport, _ = await loop.create_datagram_endpoint(lambda: fanout, sock=bind_socket(path))
+        transports.append(transport)
+
+    stop = asyncio.Event()
+    loop.add_signal_handler(signal.SIGTERM, stop.set)
+    loop.add_signal_handler(signal.SIGINT, stop.set)
+
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), args.flush_interval or 1)
+        except asyncio.TimeoutError:
+            pass
+        fanout.flush()
+
+    for transport in transports:
+        transport.close()
+    fanout.flush()
+    if log is not None:
+        log.close()
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Fan syslog messages out to stdout and a rotated mail log")
+    parser.add_argument("--socket", action="append", help=f"Socket to listen on (default: {', '.join(LOG_SOCKETS)})")
+    parser.add_argument("--file", default="/var/log/mail.log", help="Mail log file; empty to only write stdout")
+    parser.add_argument("--max-bytes", type=int, default=10 * 1024 * 1024, help="Rotate the mail log at this size")
+    parser.add_argument("--backups", type=int, default=1, help="Rotated mail logs to keep")
+    parser.add_argument("--flush-interval", type=float, default=1.0,
+                        help="Seconds between flushes; 0 writes every message immediately")
+    parser.add_argument("--no-stdout", action="store_true", help="Don't copy messages to stdout")
+    parser.add_argument("--ban-max-attempts", type=int, default=0,
+                        help="Ban clients after this many SASL failures (0 disables the native detector)")
+    parser.add_argument("--ban-find-time", type=int, default=600, help="Window for counting failures, in seconds")
+    parser.add_argument("--ban-time", type=int, default=3600, help="Ban duration in seconds")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except Exception as e:
+        logger.error(f"Log fan-out failed: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
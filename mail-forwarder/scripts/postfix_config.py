@@ -7,10 +7,14 @@ import os
 import logging
 import subprocess
 from pathlib import Path
+from typing import List, Optional
 
-from config import Configuration, ForwardingRule
+from config import RELAY_POOL_TRANSPORT, Configuration, ConfigDiff, ForwardingRule, RelayHost
 from utils import render_template, ensure_template_exists
-from utils import register_service_callback, reload_postsrsd, reload_saslauthd, reload_postfix
+from utils import register_service_callback, reload_service, reload_postsrsd, reload_saslauthd, reload_postfix
+from utils import reload_srs_server
+from srs_secrets import POSTSRSD_SECRETS_FILE, ensure_secrets, write_secrets_file
+from tls_config import TLS_SNI_MAP, TLS_PARAMS_FILE, get_primary_domain, get_chain_files, uses_sni_map
 
 # Configure logging
 logging.basicConfig(
@@ -22,19 +26,28 @@ logger = logging.getLogger('postfix_config')
 # Constants
 POSTFIX_CONF_DIR = "/etc/postfix"
 VIRTUAL_ALIAS_FILE = os.path.join(POSTFIX_CONF_DIR, "virtual")
+VIRTUAL_DOMAINS_FILE = os.path.join(POSTFIX_CONF_DIR, "virtual_domains")
 TRANSPORT_MAP_FILE = os.path.join(POSTFIX_CONF_DIR, "transport")
 SASL_PASSWD_FILE = os.path.join(POSTFIX_CONF_DIR, "sasl_passwd")
+SENDER_RELAY_FILE = os.path.join(POSTFIX_CONF_DIR, "sender_relay")
+SENDER_TRANSPORT_FILE = os.path.join(POSTFIX_CONF_DIR, "sender_transport")
 SMTP_AUTH_FILE = os.path.join(POSTFIX_CONF_DIR, "sasl_users")
 TEMPLATES_DIR = "/templates/postfix"
 POSTSRSD_CONFIG_FILE = "/etc/default/postsrsd"
+SOMAXCONN_FILE = "/proc/sys/net/core/somaxconn"
 
 # Global variable to store the current configuration
 _config = None
 
 def is_srs_enabled():
-    """Check if SRS is enabled in the current configuration."""
+    """Check if SRS through postsrsd is enabled in the current configuration."""
     global _config
-    return _config is not None and _config.srs.enabled
+    return _config is not None and _config.srs.enabled and _config.srs.backend == "postsrsd"
+
+def is_native_srs_enabled():
+    """Check if SRS through the native socketmap server is enabled in the current configuration."""
+    global _config
+    return _config is not None and _config.srs.enabled and _config.srs.backend == "native"
 
 def is_sasl_auth_enabled():
     """Check if SASL auth is enabled in the current configuration."""
@@ -44,6 +57,7 @@ def is_sasl_auth_enabled():
 # Register the callbacks with the check functions
 register_service_callback("postfix", reload_postfix)  # Postfix is always required
 register_service_callback("postsrsd", reload_postsrsd, is_srs_enabled)
+register_service_callback("srs-server", reload_srs_server, is_native_srs_enabled)
 register_service_callback("saslauthd", reload_saslauthd, is_sasl_auth_enabled)
 
 def create_virtual_alias_map(config: Configuration) -> None:
@@ -62,49 +76,116 @@ def create_virtual_alias_map(config: Configuration) -> None:
     subprocess.run(["postmap", VIRTUAL_ALIAS_FILE], check=True)
     logger.info(f"Created virtual alias map with {len(config.forwarding_rules)} rules")
 
+def create_virtual_domains_map(config: Configuration) -> None:
+    """
+    Create the virtual alias domain map from the forwarding rules.
+    Postfix rejects recipients in these domains at RCPT time unless the virtual alias map has them.
+    """
+    template_path = os.path.join(TEMPLATES_DIR, "virtual_domains.j2")
+    
+    # The hostname is in mydestination, and Postfix doesn't allow a domain to be listed in both
+    domains = {rule.domain for rule in config.forwarding_rules if rule.domain != config.smtp.hostname}
+    
+    # Render the template
+    render_template(
+        template_path,
+        VIRTUAL_DOMAINS_FILE,
+        {"domains": sorted(domains)},
+        "postfix"
+    )
+    
+    # Generate the database
+    subprocess.run(["postmap", VIRTUAL_DOMAINS_FILE], check=True)
+    logger.info(f"Created virtual alias domain map with {len(domains)} domains")
+
+def relay_nexthops(relays: List[RelayHost], first: Optional[RelayHost] = None) -> str:
+    """The relays as a next-hop list Postfix tries in order: first, then the rest by weight."""
+    ordered = sorted(relays, key=lambda relay: -relay.weight)
+    if first is not None:
+        ordered = [first] + [relay for relay in ordered if relay is not first]
+    return ", ".join(relay.nexthop for relay in ordered)
+
+def relay_randmap(relays: List[RelayHost]) -> str:
+    """
+    A randmap table that spreads mail over the relays by weight.
+    Each result starts with one relay and fails over to the others, and
+    appears once per unit of that relay's weight. The results use the relay
+    pool transport, so only these deliveries get the short relay timeouts.
+    """
+    results = [f"{{{RELAY_POOL_TRANSPORT}:{relay_nexthops(relays, relay)}}}"
+               for relay in relays for _ in range(relay.weight)]
+    return f"randmap:{{{', '.join(results)}}}"
+
 def create_transport_map(config: Configuration) -> None:
-    """Create the transport map for SMTP relay using Jinja2 template."""
-    if not config.smtp.relay_host:
+    """Create the transport map that routes pooled destination domains using Jinja2 template."""
+    if not config.smtp.delivery_pools:
         return
     
     template_path = os.path.join(TEMPLATES_DIR, "transport.j2")
     
-    # Get unique domains from forwarding rules
-    domains = {rule.domain for rule in config.forwarding_rules if rule.domain != config.smtp.hostname}
-    
-    # Render the template
+    # Render the template; pooled mail still goes through the relays if there are any, in failover order
     render_template(
         template_path,
         TRANSPORT_MAP_FILE,
         {
-            "domains": sorted(domains),
-            "relay_host": config.smtp.relay_host,
-            "relay_port": config.smtp.relay_port
+            "pool_domains": sorted(config.smtp.delivery_pool_domains.items()),
+            "relay_nexthops": relay_nexthops(config.smtp.relay_pool),
         },
         "postfix"
     )
     
     # Generate the database
     subprocess.run(["postmap", TRANSPORT_MAP_FILE], check=True)
-    logger.info(f"Created transport map for relay through {config.smtp.relay_host}")
+    logger.info(f"Created transport map for {len(config.smtp.delivery_pool_domains)} pooled domains")
+
+def uses_relay_randmap(config: Configuration) -> bool:
+    """Whether mail is spread over a relay pool through sender_dependent_default_transport_maps."""
+    return len(config.smtp.relay_pool) > 1
+
+def create_sender_relay_maps(config: Configuration) -> None:
+    """Create the maps that route mail from some sender domains through their own relay using Jinja2 template."""
+    if not config.smtp.sender_relays:
+        return
+    
+    template_path = os.path.join(TEMPLATES_DIR, "sender_relay.j2")
+    sender_relays = sorted(config.smtp.sender_relays.items())
+    
+    # Render the template for sender_dependent_relayhost_maps
+    maps = [(SENDER_RELAY_FILE, "")]
+    
+    # The relay pool's randmap in sender_dependent_default_transport_maps overrules
+    # sender_dependent_relayhost_maps, so the sender relays are also listed in front of it
+    if uses_relay_randmap(config):
+        maps.append((SENDER_TRANSPORT_FILE, "smtp:"))
+    
+    for path, transport in maps:
+        render_template(
+            template_path,
+            path,
+            {"sender_relays": sender_relays, "transport": transport},
+            "postfix"
+        )
+        
+        # Generate the database
+        subprocess.run(["postmap", path], check=True)
+    
+    logger.info(f"Created sender relay map for {len(sender_relays)} sender domains")
 
 def create_sasl_passwd(config: Configuration) -> None:
     """Create the SASL password file for SMTP authentication using Jinja2 template."""
-    if not (config.smtp.relay_host and config.smtp.relay_username and config.smtp.relay_password):
+    relays = [relay for relay in config.smtp.relay_pool if relay.username and relay.password]
+    sender_relays = sorted((domain, relay) for domain, relay in config.smtp.sender_relays.items()
+                           if relay.username and relay.password)
+    if not (relays or sender_relays):
         return
     
     template_path = os.path.join(TEMPLATES_DIR, "sasl_passwd.j2")
     
-    # Render the template
+    # Render the template; Postfix looks credentials up by sender domain first, then by relay
     render_template(
         template_path,
         SASL_PASSWD_FILE,
-        {
-            "relay_host": config.smtp.relay_host,
-            "relay_port": config.smtp.relay_port,
-            "username": config.smtp.relay_username,
-            "password": config.smtp.relay_password
-        },
+        {"relays": relays, "sender_relays": sender_relays},
         "postfix"
     )
     
@@ -112,7 +193,7 @@ def create_sasl_passwd(config: Configuration) -> None:
     subprocess.run(["postmap", SASL_PASSWD_FILE], check=True)
     os.chmod(SASL_PASSWD_FILE, 0o600)
     os.chmod(f"{SASL_PASSWD_FILE}.db", 0o600)
-    logger.info(f"Created SASL password file for relay through {config.smtp.relay_host}")
+    logger.info(f"Created SASL password file for {len(relays) + len(sender_relays)} relays")
 
 def create_sasl_auth_users(config: Configuration) -> None:
     """Create the SASL auth users file for SMTP authentication."""
@@ -155,9 +236,8 @@ def configure_srs(config: Configuration) -> None:
         srs_domain = config.smtp.hostname
         logger.info(f"SRS domain not set, using SMTP hostname: {srs_domain}")
     
-    # If SRS secret is not set, warn about it - it should be set for security
-    if not config.srs.secret:
-        logger.warning("SRS secret not set - a random one will be generated on each restart")
+    # Persist (and if SRS_SECRET changed, rotate) the secrets postsrsd signs and verifies with
+    secrets_changed = write_secrets_file(ensure_secrets(config))
     
     # Create postsrsd config file
     with open(POSTSRSD_CONFIG_FILE, "w") as f:
@@ -166,9 +246,7 @@ def configure_srs(config: Configuration) -> None:
         f.write(f'RUN=yes\n')
         f.write(f'SRS_DOMAIN={srs_domain}\n')
         
-        # Only write the secret if it's available
-        if config.srs.secret:
-            f.write(f'SRS_SECRET={config.srs.secret}\n')
+        f.write(f'SRS_SECRET={POSTSRSD_SECRETS_FILE}\n')
         
         # Add excluded domains if any
         if config.srs.exclude_domains:
@@ -180,6 +258,12 @@ def configure_srs(config: Configuration) -> None:
         f.write(f'SRS_FORWARD_PORT=10001\n')
         f.write(f'SRS_REVERSE_PORT=10002\n')
     
+    # postsrsd only reads its secrets on startup; the native server reloads
+    # secrets, domain and exclusions on SIGHUP, so once running it is signalled on every change
+    if secrets_changed:
+        reload_service("postsrsd")
+    reload_service("srs-server")
+    
     # Informational message - we're now using supervisor to start the service
     logger.info(f"SRS configured with domain {srs_domain}")
     
@@ -187,18 +271,46 @@ def configure_srs(config: Configuration) -> None:
     if not config.srs.domain:
         config.srs.domain = srs_domain
 
-def configure_postfix(config: Configuration) -> None:
-    """Configure Postfix using the provided configuration."""
+def tune_listen_backlog(config: Configuration) -> None:
+    """Raise the kernel's accept queue limit to the configured listen backlog if possible."""
+    backlog = config.smtp.listen_backlog
+    try:
+        with open(SOMAXCONN_FILE, 'r') as f:
+            current = int(f.read())
+    except (OSError, ValueError):
+        return
+    
+    if current >= backlog:
+        return
+    
+    try:
+        with open(SOMAXCONN_FILE, 'w') as f:
+            f.write(f"{backlog}\n")
+        logger.info(f"Raised net.core.somaxconn from {current} to {backlog}")
+    except OSError:
+        logger.warning(f"net.core.somaxconn is {current}, below the listen backlog of {backlog}; "
+                       f"set it with the container's sysctls option")
+
+def configure_postfix(config: Configuration, diff: Optional[ConfigDiff] = None) -> None:
+    """
+    Configure Postfix using the provided configuration.
+    With a diff against the applied configuration, only the affected files are regenerated.
+    """
     global _config
     _config = config
     
+    if diff is not None and not diff.affects("postfix"):
+        logger.info("Postfix configuration unchanged, skipping")
+        return
+    
     logger.info("Configuring Postfix")
     
     # Ensure directories exist
     Path(POSTFIX_CONF_DIR).mkdir(exist_ok=True)
     
     # Configure SRS if enabled
-    configure_srs(config)
+    if diff is None or diff.regenerates(POSTSRSD_CONFIG_FILE):
+        configure_srs(config)
     
     # Render main.cf template
     render_template(
@@ -208,12 +320,20 @@ def configure_postfix(config: Configuration) -> None:
             "config": config,
             "hostname": config.smtp.hostname,
             "helo_name": config.smtp.helo_name,  # Now this is always set (defaults to hostname)
-            "relay_host": config.smtp.relay_host,
-            "relay_port": config.smtp.relay_port,
-            "relay_username": config.smtp.relay_username,
-            "relay_password": config.smtp.relay_password,
+            "relays": config.smtp.relay_pool,
+            "relay_randmap": relay_randmap(config.smtp.relay_pool),
+            "relay_auth": any(relay.username and relay.password
+                              for relay in config.smtp.relay_pool + list(config.smtp.sender_relays.values())),
+            "sender_relay_map": SENDER_RELAY_FILE,
+            "sender_transport_map": SENDER_TRANSPORT_FILE,
             "use_tls": config.smtp.use_tls,
+            "tls_chain_files": (get_chain_files(config, get_primary_domain(config))
+                                if config.tls.enabled and config.tls.domains else []),
+            "tls_sni_map": TLS_SNI_MAP if uses_sni_map(config) else None,
+            "tls_params_file": TLS_PARAMS_FILE,
             "virtual_alias_map": VIRTUAL_ALIAS_FILE,
+            "virtual_domains_map": VIRTUAL_DOMAINS_FILE,
+            "transport_map": TRANSPORT_MAP_FILE,
             "srs_enabled": config.srs.enabled,
         },
         "postfix"
@@ -229,23 +349,26 @@ def configure_postfix(config: Configuration) -> None:
             "enable_submission": config.smtp.enable_submission,
             "enable_smtps": config.smtp.enable_smtps,
             "smtp_auth_enabled": config.smtp.smtp_auth_enabled,
+            "relay_pool_transport": RELAY_POOL_TRANSPORT if uses_relay_randmap(config) else None,
         },
         "postfix"
     )
     
-    # Create virtual alias map
+    # Create virtual alias map and the domains it answers for
     create_virtual_alias_map(config)
+    create_virtual_domains_map(config)
     
-    # Configure transport map if using SMTP relay
-    if config.smtp.relay_host:
-        create_transport_map(config)
-        
-        # Configure SASL authentication if credentials are provided
-        if config.smtp.relay_username and config.smtp.relay_password:
-            create_sasl_passwd(config)
+    # Configure transport map if using delivery pools
+    create_transport_map(config)
+    
+    # Configure relays by sender domain
+    create_sender_relay_maps(config)
+    
+    # Configure SASL authentication if credentials are provided
+    create_sasl_passwd(config)
     
     # Configure SMTP auth users if enabled
-    if config.smtp.smtp_auth_enabled:
+    if config.smtp.smtp_auth_enabled and (diff is None or diff.regenerates(SMTP_AUTH_FILE)):
         create_sasl_auth_users(config)
 
 if __name__ == "__main__":
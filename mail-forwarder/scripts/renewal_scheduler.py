@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Certificate renewal scheduler for the mail forwarder.
+Renews only the certificates that are due, staggered with jitter and with
+per-domain retry backoff. Scheduling state is persisted between runs.
+"""
+
+import os
+import sys
+import json
+import random
+import logging
+import argparse
+import subprocess
+import time
+import datetime
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+from tls_config import CERTS_DIR, get_certificate_expiry, get_letsencrypt_certificate, deploy_certificates
+from cluster import cluster_lock
+import supervisor_client
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('renewal_scheduler')
+
+# Constants
+STATE_FILE = "/etc/letsencrypt/renewal-scheduler.json"
+DAY_SECONDS = 86400
+RETRY_BASE_SECONDS = 3600  # First retry after an hour
+RETRY_MAX_SECONDS = DAY_SECONDS  # Never wait more than a day between attempts
+RUN_INTERVAL = 3600  # Seconds between scheduling passes when running as a service
+
+# Challenge methods by TLS_CHALLENGE_TYPE, each with the variants tried in turn
+CHALLENGES = {
+    "tls-alpn": [
+        ["--preferred-challenges", "tls-alpn-01", "--tls-alpn-port", "587"],
+        ["--preferred-challenges", "tls-alpn-01", "--tls-alpn-port", "465"],
+    ],
+    "http": [
+        ["--preferred-challenges", "http-01"],
+    ],
+}
+
+# TLS-ALPN validation listens on the submission ports, so Postfix has to be stopped for it
+POSTFIX_PORT_CHALLENGES = {"tls-alpn"}
+
+@dataclass
+class CertificateState:
+    """Persisted scheduling state for a single certificate."""
+    domain: str
+    expires_at: float = 0.0
+    scheduled_at: Optional[float] = None
+    next_attempt_at: float = 0.0
+    failures: int = 0
+    last_renewed_at: Optional[float] = None
+    last_error: Optional[str] = None
+
+def load_state(path: str = STATE_FILE) -> Dict[str, CertificateState]:
+    """Load the scheduler state, returning an empty state if none is stored."""
+    if not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return {domain: CertificateState(**entry) for domain, entry in data.items()}
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable renewal state at {path}: {e}")
+        return {}
+
+def save_state(state: Dict[str, CertificateState], path: str = STATE_FILE) -> None:
+    """Persist the scheduler state atomically."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({domain: asdict(entry) for domain, entry in sorted(state.items())}, f, indent=2)
+    os.replace(tmp_path, path)
+
+def get_certificate_inventory(certs_dir: str = CERTS_DIR) -> Dict[str, float]:
+    """Return a mapping of certificate name to expiry timestamp for all managed certificates."""
+    inventory = {}
+    if not os.path.isdir(certs_dir):
+        return inventory
+
+    for name in sorted(os.listdir(certs_dir)):
+        cert_path = os.path.join(certs_dir, name, "fullchain.pem")
+        if not os.path.exists(cert_path):
+            continue
+        try:
+            expiry = get_certificate_expiry(cert_path)
+            # openssl reports expiry dates in GMT
+            inventory[name] = expiry.replace(tzinfo=datetime.timezone.utc).timestamp()
+        except Exception as e:
+            logger.error(f"Error reading expiry for {cert_path}: {e}")
+
+    return inventory
+
+def schedule_renewals(inventory: Dict[str, float], state: Dict[str, CertificateState],
+                      now: float, renewal_days: int, stagger_days: int) -> List[str]:
+    """
+    Update the schedule for every certificate and return the domains due now.
+
+    A certificate enters its renewal window stagger_days before the renewal
+    deadline (renewal_days before expiry) and gets a random slot inside that
+    window, so certificates issued together are not all renewed together.
+    """
+    # Forget certificates that are no longer managed
+    for domain in list(state):
+        if domain not in inventory:
+            del state[domain]
+
+    due = []
+    for domain, expires_at in inventory.items():
+        entry = state.get(domain)
+        if entry is None or entry.expires_at != expires_at:
+            # New certificate, or renewed since we last looked: start over
+            entry = CertificateState(domain=domain, expires_at=expires_at)
+            state[domain] = entry
+
+        deadline = expires_at - renewal_days * DAY_SECONDS
+        window_start = deadline - stagger_days * DAY_SECONDS
+
+        if now < window_start:
+            continue
+
+        if entry.scheduled_at is None:
+            slot_end = max(deadline, now)
+            slot_start = min(max(window_start, now), slot_end)
+            entry.scheduled_at = random.uniform(slot_start, slot_end)
+            logger.info(f"Scheduled renewal of {domain} for {time.ctime(entry.scheduled_at)}")
+
+        if now >= entry.scheduled_at and now >= entry.next_attempt_at:
+            due.append(domain)
+
+    # Most urgent certificates first
+    due.sort(key=lambda domain: state[domain].expires_at)
+    return due
+
+def record_failure(entry: CertificateState, now: float, error: str) -> None:
+    """Record a failed renewal and back off exponentially with jitter."""
+    entry.failures += 1
+    entry.last_error = error
+    delay = min(RETRY_BASE_SECONDS * 2 ** (entry.failures - 1), RETRY_MAX_SECONDS)
+    entry.next_attempt_at = now + delay * random.uniform(0.8, 1.2)
+    logger.warning(f"Renewal of {entry.domain} failed ({entry.failures} attempts), "
+                   f"next attempt at {time.ctime(entry.next_attempt_at)}")
+
+def record_success(entry: CertificateState, now: float) -> None:
+    """Record a successful renewal."""
+    entry.failures = 0
+    entry.last_error = None
+    entry.last_renewed_at = now
+    entry.next_attempt_at = 0.0
+
+def challenge_order(preferred: str) -> List[str]:
+    """Return the challenge methods to try, the configured one first."""
+    return [preferred] + [method for method in CHALLENGES if method != preferred]
+
+@contextmanager
+def postfix_stopped():
+    """Stop the supervised Postfix for the duration of the block, starting it again afterwards."""
+    try:
+        supervisor_client.stop("postfix")
+        logger.info("Stopped Postfix for TLS-ALPN validation")
+    except supervisor_client.SupervisorError as e:
+        # Validation will most likely fail on the busy port, but the other methods may still work
+        logger.warning(f"Could not stop Postfix for TLS-ALPN validation: {e}")
+        yield
+        return
+
+    try:
+        yield
+    finally:
+        try:
+            supervisor_client.start("postfix", wait=True)
+            logger.info("Started Postfix after TLS-ALPN validation")
+        except supervisor_client.SupervisorError as e:
+            logger.error(f"Failed to start Postfix after TLS-ALPN validation: {e}")
+
+def renew_certificate(domain: str, challenges: List[List[str]]) -> None:
+    """Renew a single certificate, trying each challenge variant in turn."""
+    base_cmd = [
+        "certbot", "renew",
+        "--non-interactive",
+        "--cert-name", domain,
+        "--force-renewal",
+        # The hooks stored at issuance restart Postfix behind supervisord's back;
+        # postfix_stopped() takes care of the ports once per batch instead
+        "--pre-hook", "",
+        "--post-hook", "",
+    ]
+
+    last_error = None
+    for challenge_args in challenges:
+        try:
+            subprocess.run(base_cmd + challenge_args, check=True)
+            logger.info(f"Renewed certificate for {domain} using {' '.join(challenge_args[1:])}")
+            return
+        except subprocess.CalledProcessError as e:
+            logger.warning(f"Failed to renew {domain} using {' '.join(challenge_args[1:])}: {e}")
+            last_error = e
+
+    raise last_error
+
+def renew_certificates(domains: List[str], challenge_type: str) -> Dict[str, Optional[str]]:
+    """
+    Renew a batch of certificates. Each challenge method is tried for the
+    certificates still pending, and Postfix is stopped at most once, around
+    the TLS-ALPN attempts. Returns the error per domain, None if renewed.
+    """
+    results = {domain: "not attempted" for domain in domains}
+    for method in challenge_order(challenge_type):
+        pending = [domain for domain in domains if results[domain] is not None]
+        if not pending:
+            break
+        with postfix_stopped() if method in POSTFIX_PORT_CHALLENGES else nullcontext():
+            for domain in pending:
+                try:
+                    renew_certificate(domain, CHALLENGES[method])
+                    results[domain] = None
+                except subprocess.CalledProcessError as e:
+                    results[domain] = str(e)
+    return results
+
+def sync_certificates(inventory: Dict[str, float]) -> None:
+    """Deploy every certificate in the store; unchanged ones are skipped without a reload."""
+    pairs = {}
+    for domain in inventory:
+        pair = get_letsencrypt_certificate(domain)
+        if pair:
+            pairs[domain] = pair
+    deploy_certificates(pairs)
+
+def run_clustered(renewal_days: int, stagger_days: int, max_per_run: int,
+                  state_file: str, shared_dir: str, challenge_type: str = "tls-alpn") -> bool:
+    """
+    Run a scheduling pass as one replica of a cluster. Only the replica that
+    gets the ACME lock renews; every replica then deploys what is in the
+    shared store, picking up certificates renewed by another replica.
+    """
+    ok = True
+    with cluster_lock(shared_dir, "acme", blocking=False) as leader:
+        if leader:
+            ok = run_scheduler(renewal_days, stagger_days, max_per_run, state_file, challenge_type)
+
+    sync_certificates(get_certificate_inventory())
+    return ok
+
+def run_scheduler(renewal_days: int, stagger_days: int, max_per_run: int,
+                  state_file: str = STATE_FILE, challenge_type: str = "tls-alpn") -> bool:
+    """Run a single scheduling pass. Returns False if any renewal failed."""
+    now = time.time()
+    state = load_state(state_file)
+    inventory = get_certificate_inventory()
+
+    due = schedule_renewals(inventory, state, now, renewal_days, stagger_days)
+    if not due:
+        logger.info(f"No certificates due for renewal ({len(inventory)} managed)")
+        save_state(state, state_file)
+        return True
+
+    if len(due) > max_per_run:
+        logger.info(f"{len(due)} certificates due, renewing {max_per_run} this run")
+        due = due[:max_per_run]
+
+    renewed = []
+    for domain, error in renew_certificates(due, challenge_type).items():
+        if error is None:
+            record_success(state[domain], now)
+            renewed.append(domain)
+        else:
+            record_failure(state[domain], now, error)
+    save_state(state, state_file)
+
+    # Deploy renewed certificates and reload Postfix once for the whole batch
+    if renewed:
+        pairs = {}
+        for domain in renewed:
+            pair = get_letsencrypt_certificate(domain)
+            if pair:
+                pairs[domain] = pair
+        deploy_certificates(pairs)
+
+    return len(renewed) == len(due)
+
+def run_once(args) -> bool:
+    """Run one scheduling pass with the command line settings. Returns False if it failed."""
+    try:
+        if args.cluster_shared_dir:
+            return run_clustered(args.renewal_days, args.stagger_days, args.max_per_run,
+                                 args.state_file, args.cluster_shared_dir, args.challenge_type)
+        return run_scheduler(args.renewal_days, args.stagger_days, args.max_per_run, args.state_file,
+                             args.challenge_type)
+    except Exception as e:
+        logger.error(f"Renewal scheduler failed: {e}")
+        return False
+
+def run_forever(args) -> None:
+    """Run a scheduling pass every interval, at the given offset into it."""
+    while True:
+        now = time.time()
+        next_run = now - now % args.interval + args.offset
+        if next_run <= now:
+            next_run += args.interval
+        logger.info(f"Next renewal check at {time.ctime(next_run)}")
+        time.sleep(next_run - now)
+        run_once(args)
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Mail forwarder certificate renewal scheduler")
+    parser.add_argument("--renewal-days", type=int, default=7,
+                        help="Renew certificates at the latest this many days before expiry")
+    parser.add_argument("--stagger-days", type=int, default=3,
+                        help="Spread renewals over this many days before the deadline")
+    parser.add_argument("--max-per-run", type=int, default=2,
+                        help="Maximum number of certificates to renew per run")
+    parser.add_argument("--challenge-type", choices=sorted(CHALLENGES), default="tls-alpn",
+                        help="Challenge method to try first; the others are fallbacks")
+    parser.add_argument("--state-file", default=STATE_FILE,
+                        help="Path of the persisted scheduler state")
+    parser.add_argument("--cluster-shared-dir",
+                        help="Run as a cluster replica, coordinating through this shared directory")
+    parser.add_argument("--loop", action="store_true",
+                        help="Keep running and check every --interval seconds, as a supervisor program")
+    parser.add_argument("--interval", type=int, default=RUN_INTERVAL,
+                        help="Seconds between checks with --loop")
+    parser.add_argument("--offset", type=int, default=0,
+                        help="Seconds into each interval at which checks run with --loop")
+
+    args = parser.parse_args()
+
+    if args.loop:
+        run_forever(args)
+
+    sys.exit(0 if run_once(args) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,14 @@ Configures Fail2ban for protection against brute-force attacks.
 """
 
 import os
+import shutil
 import logging
 import subprocess
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict, Optional
 
-from config import Configuration
+from config import Configuration, ConfigDiff, STATE_DIR
 from utils import render_template, ensure_template_exists
 from utils import register_service_callback, reload_fail2ban
 
@@ -23,6 +26,14 @@ logger = logging.getLogger('security_config')
 # Constants
 FAIL2BAN_CONF_DIR = "/etc/fail2ban"
 TEMPLATES_DIR = "/templates/fail2ban"
+FAIL2BAN_DB_FILE = os.path.join(STATE_DIR, "fail2ban", "fail2ban.sqlite3")  # On the state volume, so bans survive restarts
+
+# Ban actions tried by "auto", most efficient first, with the command that shows whether the kernel supports them
+BAN_ACTION_PROBES = [
+    ("nftables-multiport", ["nft", "list", "tables"]),
+    ("iptables-ipset-proto6", ["ipset", "list", "-n"]),
+]
+FALLBACK_BAN_ACTION = "iptables-multiport"
 
 # Global variable to store the current configuration
 _config = None
@@ -30,13 +41,33 @@ _config = None
 def is_fail2ban_enabled():
     """Check if fail2ban is enabled in the current configuration."""
     global _config
-    return _config is not None and _config.security.fail2ban_enabled
+    return _config is not None and _config.security.fail2ban_enabled and _config.security.backend == "fail2ban"
 
 # Register the callback with the check function
 register_service_callback("fail2ban", reload_fail2ban, is_fail2ban_enabled)
 
-def configure_fail2ban(config: Configuration) -> None:
-    """Configure Fail2ban using the provided configuration."""
+@lru_cache(maxsize=None)
+def detect_ban_action() -> str:
+    """Return the most efficient ban action the kernel and the container's capabilities support."""
+    for action, probe in BAN_ACTION_PROBES:
+        if not shutil.which(probe[0]):
+            continue
+        try:
+            if subprocess.run(probe, capture_output=True, timeout=10).returncode == 0:
+                return action
+        except (subprocess.SubprocessError, OSError):
+            pass
+        logger.info(f"{action} is not supported here")
+    return FALLBACK_BAN_ACTION
+
+def get_ban_action(config: Configuration) -> str:
+    """Return the configured ban action, resolving "auto" by probing the host."""
+    if config.security.ban_action == "auto":
+        return detect_ban_action()
+    return config.security.ban_action
+
+def configure_fail2ban(config: Configuration, diff: Optional[ConfigDiff] = None) -> None:
+    """Configure Fail2ban using the provided configuration, skipping it if the diff doesn't affect it."""
     global _config
     _config = config
     
@@ -44,6 +75,14 @@ def configure_fail2ban(config: Configuration) -> None:
         logger.info("Fail2ban is disabled, skipping configuration")
         return
     
+    if config.security.backend != "fail2ban":
+        logger.info("Brute-force protection is handled by the native detector, skipping Fail2ban")
+        return
+    
+    if diff is not None and not diff.affects("fail2ban"):
+        logger.info("Fail2ban configuration unchanged, skipping")
+        return
+    
     logger.info("Configuring Fail2ban")
     
     # Ensure directories exist
@@ -51,13 +90,26 @@ def configure_fail2ban(config: Configuration) -> None:
     Path(os.path.join(FAIL2BAN_CONF_DIR, "jail.d")).mkdir(exist_ok=True)
     Path(os.path.join(FAIL2BAN_CONF_DIR, "filter.d")).mkdir(exist_ok=True)
     
-    # Create mail.log if it doesn't exist
-    mail_log = "/var/log/mail.log"
+    # The log fan-out writes the mail log, but fail2ban refuses to start a jail whose log doesn't exist yet
+    mail_log = config.logging.file
     if not os.path.exists(mail_log):
         logger.info(f"Creating {mail_log} for Fail2ban")
+        Path(mail_log).parent.mkdir(parents=True, exist_ok=True)
         Path(mail_log).touch()
-        # Set appropriate permissions
-        os.chmod(mail_log, 0o644)
+        os.chmod(mail_log, 0o640)
+    
+    # Keep the ban database on the state volume; fail2ban restores the bans in it when it starts
+    Path(FAIL2BAN_DB_FILE).parent.mkdir(parents=True, exist_ok=True)
+    render_template(
+        os.path.join(TEMPLATES_DIR, "fail2ban.local.j2"),
+        os.path.join(FAIL2BAN_CONF_DIR, "fail2ban.local"),
+        {
+            "config": config,
+            "db_file": FAIL2BAN_DB_FILE,
+            "purge_age": config.security.db_purge_age,
+        },
+        "fail2ban"
+    )
     
     # Render jail.local template
     template_path = os.path.join(TEMPLATES_DIR, "jail.local.j2")
@@ -70,11 +122,12 @@ def configure_fail2ban(config: Configuration) -> None:
             "max_attempts": config.security.max_attempts,
             "ban_time": config.security.ban_time,
             "find_time": config.security.find_time,
+            "ban_action": get_ban_action(config),
         },
         "fail2ban"
     )
     
-    logger.info("Configured Fail2ban with SSH monitoring disabled")
+    logger.info(f"Configured Fail2ban with ban action {get_ban_action(config)}, SSH monitoring disabled")
     
     # Render postfix-sasl filter
     template_path = os.path.join(TEMPLATES_DIR, "postfix-sasl.conf.j2")
@@ -105,26 +158,35 @@ def configure_fail2ban(config: Configuration) -> None:
     
     # No need to restart Fail2ban, supervisord will start it after all configs are ready
 
-def get_ban_status():
-    """Get the current ban status from Fail2ban."""
+def _status_value(output: str, label: str) -> Optional[str]:
+    """Return the value after "label:" in fail2ban-client status output."""
+    for line in output.splitlines():
+        name, separator, value = line.partition(label + ":")
+        if separator:
+            return value.strip()
+    return None
+
+def get_ban_status() -> Optional[Dict[str, int]]:
+    """Get the number of currently banned clients per jail, or None if Fail2ban can't be queried."""
     try:
         output = subprocess.check_output(
             ["fail2ban-client", "status"],
             universal_newlines=True
         )
-        logger.info(f"Fail2ban status: {output.strip()}")
+        jail_list = _status_value(output, "Jail list") or ""
         
-        # Get details for postfix jails
-        output = subprocess.check_output(
-            ["fail2ban-client", "status", "postfix-sasl"],
-            universal_newlines=True
-        )
-        logger.info(f"Postfix SASL jail status: {output.strip()}")
+        status = {}
+        for jail in filter(None, (name.strip() for name in jail_list.split(","))):
+            output = subprocess.check_output(
+                ["fail2ban-client", "status", jail],
+                universal_newlines=True
+            )
+            status[jail] = int(_status_value(output, "Currently banned") or 0)
         
-        return True
-    except subprocess.CalledProcessError as e:
+        return status
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
         logger.error(f"Failed to get Fail2ban status: {e}")
-        return False
+        return None
 
 if __name__ == "__main__":
     # Test configuration
@@ -133,6 +195,9 @@ if __name__ == "__main__":
     try:
         config = from_environment()
         configure_fail2ban(config)
-        get_ban_status()
+        status = get_ban_status()
+        if status is not None:
+            for jail, banned in status.items():
+                print(f"{jail}: {banned} banned")
     except Exception as e:
         logger.error(f"Error configuring Fail2ban: {e}") 
\ No newline at end of file
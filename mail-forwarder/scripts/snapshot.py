@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Configuration snapshot cache for the mail forwarder.
+Stores the generated configuration files together with a fingerprint of
+everything they were generated from, so a restart with identical inputs can
+restore them instead of regenerating them.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tarfile
+from typing import List, Optional
+
+from config import Configuration, STATE_DIR, to_dict
+from srs_secrets import get_store_path
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('snapshot')
+
+# Constants
+SNAPSHOT_FILE = os.path.join(STATE_DIR, "snapshot.tar")
+SNAPSHOT_META_FILE = os.path.join(STATE_DIR, "snapshot.json")
+SNAPSHOT_VERSION = 1
+
+# Inputs besides the configuration that change what gets generated
+CODE_DIRS = ["/scripts", "/templates"]
+DKIM_KEYS_DIR = "/etc/opendkim/keys"
+LETSENCRYPT_LIVE_DIR = "/etc/letsencrypt/live"
+
+# Generated files and directories captured in the snapshot
+SNAPSHOT_PATHS = [
+    "/etc/postfix",
+    "/etc/opendkim",
+    "/etc/default/postsrsd",
+    "/etc/postsrsd.secret",
+    "/etc/sasl2/smtpd.conf",
+    "/etc/fail2ban/fail2ban.local",
+    "/etc/fail2ban/jail.local",
+    "/etc/fail2ban/jail.d",
+    "/etc/fail2ban/filter.d/postfix-sasl.conf",
+    "/etc/letsencrypt/renewal.conf",
+    "/etc/letsencrypt/renewal-hooks/custom",
+    "/etc/supervisor/supervisord.conf",
+    "/etc/supervisor/conf.d",
+]
+
+# Persistent volumes: never captured, they survive restarts on their own
+EXCLUDED_PATHS = [DKIM_KEYS_DIR]
+
+def _hash_tree(digest, root: str) -> None:
+    """Feed the names and contents of all files below root into digest."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            if name.endswith(".pyc"):
+                continue
+            digest.update(path.encode() + b"\0")
+            with open(path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+
+def compute_fingerprint(config: Configuration) -> str:
+    """
+    Fingerprint everything the generated files depend on: the configuration,
+    the scripts and templates, the DKIM keys present, the SRS secrets, the
+    detected ban action and the current Let's Encrypt certificate versions.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{SNAPSHOT_VERSION}\0".encode())
+    digest.update(json.dumps(to_dict(config), sort_keys=True).encode())
+
+    for code_dir in CODE_DIRS:
+        _hash_tree(digest, code_dir)
+
+    # Keys are generated once per selector; only their presence matters
+    if os.path.isdir(DKIM_KEYS_DIR):
+        for dirpath, dirnames, filenames in os.walk(DKIM_KEYS_DIR):
+            dirnames.sort()
+            for name in sorted(filenames):
+                digest.update(os.path.join(dirpath, name).encode() + b"\0")
+
+    # A rotation changes the persisted SRS secrets
+    if os.path.exists(get_store_path(config)):
+        with open(get_store_path(config), 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+
+    # The ban action picked automatically depends on what the host supports
+    if config.security.fail2ban_enabled and config.security.backend == "fail2ban" and config.security.ban_action == "auto":
+        from security_config import detect_ban_action
+        digest.update(f"banaction={detect_ban_action()}\0".encode())
+
+    # A renewal moves the live symlinks to a new archive version
+    if os.path.isdir(LETSENCRYPT_LIVE_DIR):
+        for name in sorted(os.listdir(LETSENCRYPT_LIVE_DIR)):
+            for pem in ("fullchain.pem", "privkey.pem"):
+                path = os.path.join(LETSENCRYPT_LIVE_DIR, name, pem)
+                if os.path.islink(path):
+                    digest.update(f"{path}->{os.readlink(path)}\0".encode())
+
+    return digest.hexdigest()
+
+def missing_letsencrypt_certificates(config: Configuration) -> List[str]:
+    """
+    Return the Let's Encrypt certificates the configuration asks for that are
+    not issued yet. Until they are, the generated files use the self-signed
+    fallback and every start has to retry issuance.
+    """
+    if not (config.tls.enabled and config.tls.use_letsencrypt):
+        return []
+
+    from tls_config import get_certificate_names
+
+    return sorted(cert_name for domain in config.tls.domains
+                  for cert_name, _ in get_certificate_names(config, domain)
+                  if not os.path.exists(os.path.join(LETSENCRYPT_LIVE_DIR, cert_name, "fullchain.pem")))
+
+def _load_meta() -> Optional[dict]:
+    try:
+        with open(SNAPSHOT_META_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _exclude(tarinfo: tarfile.TarInfo) -> Optional[tarfile.TarInfo]:
+    path = "/" + tarinfo.name
+    if any(path == excluded or path.startswith(excluded + "/") for excluded in EXCLUDED_PATHS):
+        return None
+    return tarinfo
+
+def save_snapshot(config: Configuration) -> None:
+    """Capture the generated files and the fingerprint they correspond to."""
+    missing = missing_letsencrypt_certificates(config)
+    if missing:
+        # Nothing under the live directory changes while issuance keeps failing, so a
+        # snapshot of the fallback would be restored on every start and never retried
+        logger.warning(f"Not saving a configuration snapshot, Let's Encrypt certificates not issued yet: "
+                       f"{', '.join(missing)}")
+        invalidate_snapshot()
+        return
+
+    os.makedirs(STATE_DIR, exist_ok=True)
+    fingerprint = compute_fingerprint(config)
+
+    # The snapshot contains secrets (SASL maps, relay credentials), so only root can read it
+    tmp_path = f"{SNAPSHOT_FILE}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f, tarfile.open(fileobj=f, mode='w') as tar:
+        for path in SNAPSHOT_PATHS:
+            if os.path.lexists(path):
+                tar.add(path, arcname=path.lstrip("/"), filter=_exclude)
+    os.replace(tmp_path, SNAPSHOT_FILE)
+
+    # Write the metadata last; a snapshot without matching metadata is never used
+    tmp_path = f"{SNAPSHOT_META_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"fingerprint": fingerprint, "created": int(time.time())}, f)
+    os.replace(tmp_path, SNAPSHOT_META_FILE)
+    logger.info(f"Saved configuration snapshot {fingerprint[:12]}")
+
+def restore_snapshot(config: Configuration) -> bool:
+    """
+    Restore the generated files if the snapshot matches the current inputs.
+    Returns True if restored, False if the configuration has to be generated.
+    """
+    meta = _load_meta()
+    if not meta or not os.path.exists(SNAPSHOT_FILE):
+        return False
+
+    fingerprint = compute_fingerprint(config)
+    if meta.get("fingerprint") != fingerprint:
+        logger.info("Configuration snapshot is stale, regenerating")
+        return False
+
+    # Snapshots saved before a certificate went missing, e.g. a removed live directory
+    if missing_letsencrypt_certificates(config):
+        logger.info("Let's Encrypt certificates missing, regenerating to retry issuance")
+        return False
+
+    try:
+        with tarfile.open(SNAPSHOT_FILE, 'r') as tar:
+            tar.extractall("/")
+    except (OSError, tarfile.TarError) as e:
+        logger.warning(f"Failed to restore configuration snapshot: {e}")
+        return False
+
+    logger.info(f"Restored configuration snapshot {fingerprint[:12]}")
+    return True
+
+def invalidate_snapshot() -> None:
+    """Discard the snapshot so the next start regenerates everything."""
+    for path in (SNAPSHOT_META_FILE, SNAPSHOT_FILE):
+        if os.path.exists(path):
+            os.remove(path)
+
+if __name__ == "__main__":
+    # Print the fingerprint of the current configuration
+    from config_reload import load_configuration
+
+    try:
+        config = load_configuration()
+        fingerprint = compute_fingerprint(config)
+        meta = _load_meta() or {}
+        print(f"Current fingerprint:  {fingerprint}")
+        print(f"Snapshot fingerprint: {meta.get('fingerprint', 'none')}")
+    except Exception as e:
+        logger.error(f"Error computing configuration fingerprint: {e}")
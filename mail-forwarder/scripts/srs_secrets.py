@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+SRS secret management for the mail forwarder.
+Persists the SRS secrets on a volume and rotates them: the newest secret
+signs new addresses, retired secrets stay valid for reversing addresses
+during a grace period.
+"""
+
+import os
+import sys
+import json
+import time
+import secrets
+import logging
+import argparse
+from dataclasses import dataclass, asdict
+from typing import List, Optional
+
+from config import Configuration, STATE_DIR
+from cluster import lock_for
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('srs_secrets')
+
+# Constants
+STORE_FILE_NAME = "srs-secrets.json"
+POSTSRSD_SECRETS_FILE = "/etc/postsrsd.secret"  # Read by postsrsd -s: first line signs, all lines verify
+DAY_SECONDS = 86400
+
+@dataclass
+class SRSSecret:
+    """A stored SRS secret."""
+    secret: str
+    created_at: float
+    retired_at: Optional[float] = None
+
+def get_store_path(config: Configuration) -> str:
+    """Return the path of the secret store; replicas in a cluster share one."""
+    store_dir = config.cluster.shared_dir if config.cluster.enabled else STATE_DIR
+    return os.path.join(store_dir, STORE_FILE_NAME)
+
+def load_secrets(path: str) -> List[SRSSecret]:
+    """Load the stored secrets, newest (signing) first."""
+    if not os.path.exists(path):
+        return []
+
+    with open(path, 'r') as f:
+        return [SRSSecret(**entry) for entry in json.load(f)]
+
+def save_secrets(entries: List[SRSSecret], path: str) -> None:
+    """Persist the secrets atomically, readable only by root."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump([asdict(entry) for entry in entries], f, indent=2)
+    os.replace(tmp_path, path)
+
+def prune_secrets(entries: List[SRSSecret], grace_days: int, now: float) -> List[SRSSecret]:
+    """Drop retired secrets whose grace period has passed."""
+    return [entry for entry in entries
+            if entry.retired_at is None or now - entry.retired_at < grace_days * DAY_SECONDS]
+
+def rotate(entries: List[SRSSecret], new_secret: Optional[str], now: float) -> List[SRSSecret]:
+    """Make new_secret (or a generated one) the signing secret and retire the current one."""
+    for entry in entries:
+        if entry.retired_at is None:
+            entry.retired_at = now
+    secret = new_secret or secrets.token_urlsafe(24)
+    return [SRSSecret(secret, now)] + [entry for entry in entries if entry.secret != secret]
+
+def ensure_secrets(config: Configuration, rotate_now: bool = False) -> List[SRSSecret]:
+    """
+    Return the current secrets, creating or rotating them as needed.
+
+    An explicit SRS_SECRET becomes the signing secret; if it replaces another
+    one, that one is retired rather than dropped.
+    """
+    path = get_store_path(config)
+    now = time.time()
+
+    with lock_for(config, "srs-secret"):
+        entries = load_secrets(path)
+        current = entries[0].secret if entries else None
+        original = [asdict(entry) for entry in entries]
+
+        if rotate_now:
+            entries = rotate(entries, None, now)
+            logger.warning("Rotated SRS secret")
+        elif config.srs.secret and config.srs.secret != current:
+            entries = rotate(entries, config.srs.secret, now)
+            if current:
+                logger.warning("SRS_SECRET changed, previous secret kept for reverse lookups")
+        elif not entries:
+            entries = rotate(entries, None, now)
+            logger.warning(f"Generated SRS secret in {path}")
+
+        entries = prune_secrets(entries, config.srs.rotation_grace_days, now)
+        if [asdict(entry) for entry in entries] != original:
+            save_secrets(entries, path)
+
+    return entries
+
+def write_secrets_file(entries: List[SRSSecret], path: str = POSTSRSD_SECRETS_FILE) -> bool:
+    """Write the secrets in postsrsd's format. Returns True if the file changed."""
+    content = "".join(f"{entry.secret}\n" for entry in entries)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            if f.read() == content:
+                return False
+
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+    return True
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Manage the SRS secrets")
+    parser.add_argument("command", choices=["list", "rotate", "sync"],
+                        help="list the secrets, rotate to a new one, or sync the SRS service with the store")
+    args = parser.parse_args()
+
+    from config_reload import load_configuration
+    from utils import reload_postsrsd, reload_srs_server
+
+    try:
+        config = load_configuration()
+        if not config.srs.enabled:
+            print("SRS is disabled")
+            return 0
+
+        if args.command == "rotate" and config.srs.secret:
+            logger.error("SRS_SECRET is set explicitly; change it instead to rotate")
+            return 1
+
+        entries = ensure_secrets(config, rotate_now=args.command == "rotate")
+        if args.command == "list":
+            for index, entry in enumerate(entries):
+                status = "signing" if index == 0 else \
+                    f"retired {time.strftime('%Y-%m-%d', time.gmtime(entry.retired_at))}"
+                print(f"#{index} created {time.strftime('%Y-%m-%d', time.gmtime(entry.created_at))}, {status}")
+            return 0
+
+        if write_secrets_file(entries):
+            if config.srs.backend == "native":
+                reload_srs_server()
+            else:
+                reload_postsrsd()
+        return 0
+    except Exception as e:
+        logger.error(f"Error managing SRS secrets: {e}")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
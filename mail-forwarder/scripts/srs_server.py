@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Native SRS rewrite service for the mail forwarder.
+An asyncio server speaking Postfix's socketmap protocol, used in place of
+postsrsd when SRS_BACKEND=native. The "forward" map rewrites envelope
+senders, the "reverse" map restores SRS recipients. Addresses use the
+SRS0/SRS1 layout and hash construction of libsrs2, which postsrsd is based on.
+Send SIGHUP to reload the secrets, the SRS domain and the exclusions.
+"""
+
+import sys
+import hmac
+import time
+import base64
+import signal
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Set, Tuple
+
+from srs_secrets import POSTSRSD_SECRETS_FILE
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('srs_server')
+
+# Constants
+LISTEN_HOST = "127.0.0.1"
+LISTEN_PORT = 10003
+SRS_SEPARATOR = "="
+SRS_HASH_LENGTH = 4
+SRS_MAX_AGE_DAYS = 21  # Same as postsrsd: older bounce addresses are rejected
+SRS_TIMESTAMP_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+SRS_TIMESTAMP_SLOTS = len(SRS_TIMESTAMP_CHARS) ** 2  # Two base32 characters, days modulo 1024
+CACHE_SIZE = 10000
+MAX_REQUEST_LENGTH = 100000  # Postfix's own socketmap limit
+DAY_SECONDS = 86400
+
+class LRUCache:
+    """A small least-recently-used cache."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._data[key]
+
+    def put(self, key, value) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+class SRSRewriter:
+    """Forward and reverse SRS rewriting for a single SRS domain."""
+
+    def __init__(self, domain: str, secrets: List[str], exclude_domains: Iterable[str] = (),
+                 max_age_days: int = SRS_MAX_AGE_DAYS):
+        if not secrets:
+            raise ValueError("At least one SRS secret is required")
+        self.domain = domain.lower()
+        self.secrets = [secret.encode() for secret in secrets]
+        self.max_age_days = max_age_days
+
+        # Exact domains, and ".example.com" entries that also match subdomains
+        self.exclude_domains: Set[str] = set()
+        self.exclude_suffixes: Set[str] = set()
+        for excluded in exclude_domains:
+            excluded = excluded.strip().lower()
+            if excluded.startswith("."):
+                self.exclude_suffixes.add(excluded[1:])
+            elif excluded:
+                self.exclude_domains.add(excluded)
+
+    def is_excluded(self, domain: str) -> bool:
+        """Return True if senders from this domain must not be rewritten."""
+        if domain in self.exclude_domains:
+            return True
+        if self.exclude_suffixes:
+            labels = domain.split(".")
+            return any(".".join(labels[i:]) in self.exclude_suffixes for i in range(1, len(labels)))
+        return False
+
+    def _hash(self, secret: bytes, *parts: str) -> str:
+        digest = hmac.new(secret, "".join(parts).lower().encode(), hashlib.sha1).digest()
+        return base64.b64encode(digest).decode()[:SRS_HASH_LENGTH]
+
+    def _check_hash(self, value: str, *parts: str) -> bool:
+        value = value.lower()
+        return any(hmac.compare_digest(self._hash(secret, *parts).lower(), value) for secret in self.secrets)
+
+    @staticmethod
+    def timestamp(now: float) -> str:
+        """Encode the current day as two base32 characters."""
+        day = int(now // DAY_SECONDS) % SRS_TIMESTAMP_SLOTS
+        return SRS_TIMESTAMP_CHARS[day >> 5] + SRS_TIMESTAMP_CHARS[day & 31]
+
+    def _check_timestamp(self, stamp: str, now: float) -> bool:
+        try:
+            then = (SRS_TIMESTAMP_CHARS.index(stamp[0].upper()) << 5) | SRS_TIMESTAMP_CHARS.index(stamp[1].upper())
+        except (ValueError, IndexError):
+            return False
+        today = int(now // DAY_SECONDS) % SRS_TIMESTAMP_SLOTS
+        if today < then:
+            today += SRS_TIMESTAMP_SLOTS
+        return today - then <= self.max_age_days
+
+    def forward(self, address: str, now: float) -> Optional[str]:
+        """Return the SRS address for a sender, or None if it isn't rewritten."""
+        local, at, domain = address.rpartition("@")
+        if not at or not local or not domain:
+            return None
+        if domain.lower() == self.domain or self.is_excluded(domain.lower()):
+            return None
+
+        prefix = local[:5].upper()
+        if prefix in ("SRS0=", "SRS0+", "SRS0-"):
+            # Already rewritten once: wrap it, pointing back at the host that did it
+            user = local[4:]
+            return f"SRS1{SRS_SEPARATOR}{self._hash(self.secrets[0], domain, user)}={domain}={user}@{self.domain}"
+        if prefix in ("SRS1=", "SRS1+", "SRS1-"):
+            # Keep pointing at the original SRS0 host, signed with our secret
+            parts = local[5:].split("=", 2)
+            if len(parts) == 3:
+                _, host, user = parts
+                return f"SRS1{SRS_SEPARATOR}{self._hash(self.secrets[0], host, user)}={host}={user}@{self.domain}"
+
+        stamp = self.timestamp(now)
+        signature = self._hash(self.secrets[0], stamp, domain, local)
+        return f"SRS0{SRS_SEPARATOR}{signature}={stamp}={domain}={local}@{self.domain}"
+
+    def reverse(self, address: str, now: float) -> Optional[str]:
+        """Return the original address for an SRS recipient, or None if it isn't valid."""
+        local, at, domain = address.rpartition("@")
+        if not at or domain.lower() != self.domain:
+            return None
+
+        prefix = local[:5].upper()
+        if prefix in ("SRS0=", "SRS0+", "SRS0-"):
+            parts = local[5:].split("=", 3)
+            if len(parts) != 4:
+                return None
+            signature, stamp, orig_domain, orig_local = parts
+            if not self._check_hash(signature, stamp, orig_domain, orig_local):
+                logger.info(f"Rejected SRS0 address with invalid hash: {address}")
+                return None
+            if not self._check_timestamp(stamp, now):
+                logger.info(f"Rejected expired SRS0 address: {address}")
+                return None
+            return f"{orig_local}@{orig_domain}"
+
+        if prefix in ("SRS1=", "SRS1+", "SRS1-"):
+            parts = local[5:].split("=", 2)
+            if len(parts) != 3:
+                return None
+            signature, host, user = parts
+            if not self._check_hash(signature, host, user):
+                logger.info(f"Rejected SRS1 address with invalid hash: {address}")
+                return None
+            return f"SRS0{user}@{host}"
+
+        return None
+
+def load_secrets(path: str = POSTSRSD_SECRETS_FILE) -> List[str]:
+    """Read the secrets file shared with postsrsd: first line signs, all lines verify."""
+    with open(path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def load_rewriter() -> SRSRewriter:
+    """Build a rewriter from the current configuration and secrets."""
+    from config_reload import load_configuration
+
+    config = load_configuration()
+    return SRSRewriter(config.srs.domain or config.smtp.hostname, load_secrets(), config.srs.exclude_domains)
+
+class SocketmapServer:
+    """Serves the "forward" and "reverse" maps over Postfix's socketmap protocol."""
+
+    def __init__(self, rewriter: SRSRewriter, cache_size: int = CACHE_SIZE):
+        self.rewriter = rewriter
+        self.cache = LRUCache(cache_size)
+        self.requests = 0
+
+    def reload(self, rewriter: SRSRewriter) -> None:
+        """Swap in a new rewriter; cached rewrites may be stale, so drop them."""
+        self.rewriter = rewriter
+        self.cache.clear()
+
+    def lookup(self, name: str, key: str) -> Tuple[str, str]:
+        """Answer one socketmap query with a (status, data) pair."""
+        now = time.time()
+        if name == "forward":
+            # The SRS0 timestamp changes daily, so the day is part of the key
+            cache_key = (key, int(now // DAY_SECONDS))
+            result = self.cache.get(cache_key)
+            if result is None:
+                result = self.rewriter.forward(key, now) or ""
+                self.cache.put(cache_key, result)
+        elif name == "reverse":
+            result = self.rewriter.reverse(key, now)
+        else:
+            return "PERM", f"unknown map {name}"
+        return ("OK", result) if result else ("NOTFOUND", "")
+
+    async def _read_netstring(self, reader) -> Optional[bytes]:
+        try:
+            length = await reader.readuntil(b":")
+        except asyncio.IncompleteReadError:
+            return None
+        size = int(length[:-1])
+        if size > MAX_REQUEST_LENGTH:
+            raise ValueError(f"Request too long: {size} bytes")
+        data = await reader.readexactly(size + 1)
+        if data[-1:] != b",":
+            raise ValueError("Malformed netstring")
+        return data[:-1]
+
+    async def handle(self, reader, writer):
+        """Serve queries on one connection; Postfix keeps connections open."""
+        try:
+            while True:
+                request = await self._read_netstring(reader)
+                if request is None:
+                    break
+                self.requests += 1
+                name, _, key = request.decode("utf-8", "surrogateescape").partition(" ")
+                status, data = self.lookup(name, key)
+                reply = f"{status} {data}".encode("utf-8", "surrogateescape")
+                writer.write(b"%d:%s," % (len(reply), reply))
+                await writer.drain()
+        except (ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError) as e:
+            # LimitOverrunError: no ":" within the stream buffer limit, i.e. a garbage length prefix
+            logger.warning(f"Closing socketmap connection: {e}")
+        finally:
+            writer.close()
+
+async def serve(host: str = LISTEN_HOST, port: int = LISTEN_PORT) -> None:
+    """Run the server until cancelled, reloading on SIGHUP."""
+    server = SocketmapServer(load_rewriter())
+
+    def reload():
+        try:
+            server.reload(load_rewriter())
+            logger.warning("Reloaded SRS configuration")
+        except Exception as e:
+            logger.error(f"Failed to reload SRS configuration, keeping the current one: {e}")
+
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGHUP, reload)
+
+    listener = await asyncio.start_server(server.handle, host, port)
+    logger.warning(f"SRS socketmap server listening on {host}:{port} for {server.rewriter.domain}")
+    async with listener:
+        await listener.serve_forever()
+
+def main():
+    """Main entry point."""
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.error(f"SRS server failed: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Supervisor XML-RPC client for the mail forwarder.
+Talks to supervisord directly over its UNIX socket, so querying, starting,
+restarting and signalling programs doesn't cost a supervisorctl process.
+"""
+
+import os
+import time
+import socket
+import logging
+import http.client
+import xmlrpc.client
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('supervisor_client')
+
+# Constants
+SUPERVISOR_SOCKET = "/var/run/supervisor.sock"
+RPC_TIMEOUT = 10
+POLL_INTERVAL = 0.1
+
+# Fault and status codes from supervisor.xmlrpc.Faults
+FAULT_BAD_NAME = 10
+STATUS_SUCCESS = 80
+
+# A program in this state has given up starting and won't reach RUNNING by itself
+FAILED_STATES = {"FATAL"}
+
+class SupervisorError(Exception):
+    """A supervisord request failed, or supervisord could not be reached (code is None)."""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+class UnixStreamHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a UNIX socket instead of TCP."""
+
+    def __init__(self, path: str, timeout: float = RPC_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+class UnixStreamTransport(xmlrpc.client.Transport):
+    """XML-RPC transport to the supervisord socket, connecting anew for every request."""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    def make_connection(self, host):
+        # Connecting to a local socket is cheap, and this doesn't depend on supervisord keeping connections open
+        self.close()
+        self._connection = host, UnixStreamHTTPConnection(self.path)
+        return self._connection[1]
+
+_proxy = None
+
+def _call(method: str, *args):
+    """Call a supervisord XML-RPC method, raising SupervisorError on any failure."""
+    global _proxy
+    if _proxy is None:
+        _proxy = xmlrpc.client.ServerProxy("http://localhost", transport=UnixStreamTransport(SUPERVISOR_SOCKET))
+    try:
+        return getattr(_proxy, method)(*args)
+    except xmlrpc.client.Fault as e:
+        raise SupervisorError(e.faultString, e.faultCode)
+    except (OSError, http.client.HTTPException, xmlrpc.client.ProtocolError) as e:
+        # Start over with a fresh connection on the next call
+        _proxy = None
+        raise SupervisorError(f"cannot reach supervisord at {SUPERVISOR_SOCKET}: {e}")
+
+def _check_results(results: List[Dict], action: str) -> None:
+    """Raise for the first process a group call didn't succeed for."""
+    for result in results:
+        if result["status"] != STATUS_SUCCESS:
+            raise SupervisorError(f"{action} {result['group']}:{result['name']} failed: {result['description']}",
+                                  result["status"])
+
+def is_available() -> bool:
+    """Check whether supervisord is up and accepting requests."""
+    if not os.path.exists(SUPERVISOR_SOCKET):
+        return False
+    try:
+        return get_state() == "RUNNING"
+    except SupervisorError:
+        return False
+
+def get_state() -> str:
+    """Return the state of supervisord itself, e.g. RUNNING or SHUTDOWN."""
+    return _call("supervisor.getState")["statename"]
+
+def get_process_states() -> Dict[str, str]:
+    """Return the state of every process, by name ("group:name" for numbered processes)."""
+    states = {}
+    for info in _call("supervisor.getAllProcessInfo"):
+        name = info["name"] if info["name"] == info["group"] else f"{info['group']}:{info['name']}"
+        states[name] = info["statename"]
+    return states
+
+def is_running(program: str) -> bool:
+    """Check whether any process of a program is RUNNING."""
+    return any(info["group"] == program and info["statename"] == "RUNNING"
+               for info in _call("supervisor.getAllProcessInfo"))
+
+def start(program: str, wait: bool = False) -> None:
+    """Start all processes of a program; with wait, until they are RUNNING."""
+    _check_results(_call("supervisor.startProcessGroup", program, wait), "starting")
+
+def stop(program: str) -> None:
+    """Stop all processes of a program and wait for them to exit."""
+    _check_results(_call("supervisor.stopProcessGroup", program, True), "stopping")
+
+def restart(program: str, wait: bool = False) -> None:
+    """Stop and start a program, like "supervisorctl restart"."""
+    stop(program)
+    start(program, wait)
+
+def signal(program: str, signame: str = "HUP") -> None:
+    """Send a signal to the running processes of a program."""
+    _check_results(_call("supervisor.signalProcessGroup", program, signame), "signalling")
+
+def update() -> Tuple[List[str], List[str], List[str]]:
+    """
+    Reread the program configuration and apply it like "supervisorctl update":
+    removed programs are stopped, changed ones are restarted with their new
+    definition and added ones are started. Returns (added, changed, removed).
+    """
+    added, changed, removed = _call("supervisor.reloadConfig")[0]
+    for program in removed + changed:
+        stop(program)
+        _call("supervisor.removeProcessGroup", program)
+    for program in changed + added:
+        _call("supervisor.addProcessGroup", program)
+    return added, changed, removed
+
+def watch(timeout: Optional[float] = None) -> Iterator[Tuple[str, Optional[str], str]]:
+    """
+    Yield (process, old state, new state) for every process state change until
+    the timeout, starting with (process, None, state) for the current states.
+    supervisord only sends its events to listeners it runs itself, so the
+    changes are read from its process table every POLL_INTERVAL seconds.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    states = {}
+    while True:
+        for process, state in get_process_states().items():
+            if states.get(process) != state:
+                yield process, states.get(process), state
+                states[process] = state
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        time.sleep(POLL_INTERVAL)
+
+def wait_for_running(timeout: float = 30, programs: Optional[Iterable[str]] = None) -> bool:
+    """
+    Wait for supervisord to come up and for the processes of the given programs
+    (by default all of them) to be RUNNING. Returns False on timeout or when a
+    process gives up starting.
+    """
+    deadline = time.monotonic() + timeout
+    while not is_available():
+        if time.monotonic() >= deadline:
+            logger.error(f"Supervisord did not come up within {timeout} seconds")
+            return False
+        time.sleep(POLL_INTERVAL)
+
+    programs = set(programs) if programs is not None else None
+
+    def watched(process):
+        return programs is None or process.split(":")[0] in programs
+
+    states = {process: state for process, state in get_process_states().items() if watched(process)}
+    if not states:
+        # Nothing to wait for, e.g. every program is disabled in the configuration
+        return True
+    for process, old, new in watch(deadline - time.monotonic()):
+        if not watched(process):
+            continue
+        if old is not None:
+            logger.info(f"{process}: {old} -> {new}")
+        states[process] = new
+        if new in FAILED_STATES:
+            logger.error(f"{process} failed to start ({new})")
+            return False
+        if all(state == "RUNNING" for state in states.values()):
+            return True
+    pending = sorted(process for process, state in states.items() if state != "RUNNING")
+    logger.error(f"Not running after {timeout} seconds: {', '.join(pending)}")
+    return False
+
+if __name__ == "__main__":
+    # Show the process states
+    try:
+        for process, state in sorted(get_process_states().items()):
+            print(f"{process:<24} {state}")
+    except SupervisorError as e:
+        logger.error(f"Error querying supervisord: {e}")
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Supervisor configuration management for the mail forwarder.
+"""
+
+import os
+import logging
+from typing import Optional
+
+from config import Configuration, ConfigDiff, get_config_file
+from utils import render_template, register_service_callback, reload_supervisor
+from tls_config import get_renewal_offset
+
+# Configure logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger('supervisor_config')
+
+# Constants
+SUPERVISORD_CONF = "/etc/supervisor/supervisord.conf"
+PROGRAMS_CONF = "/etc/supervisor/conf.d/mail-forwarder.conf"
+TEMPLATES_DIR = "/templates/supervisor"
+
+# Register the callback; changed program definitions are applied like "supervisorctl update"
+register_service_callback("supervisor", reload_supervisor)
+
+def configure_supervisor(config: Configuration, diff: Optional[ConfigDiff] = None) -> None:
+    """Set up the supervisor configuration, skipping it if the diff doesn't affect it."""
+    if diff is not None and not diff.affects("supervisor"):
+        logger.info("Supervisor configuration unchanged, skipping")
+        return
+    
+    # Create the supervisord.conf file directly
+    with open(SUPERVISORD_CONF, 'w') as f:
+        f.write("[unix_http_server]\n")
+        f.write("file=/var/run/supervisor.sock\n")
+        f.write("chmod=0700\n\n")
+        f.write("[rpcinterface:supervisor]\n")
+        f.write("supervisor.rpcinterface_factory = supervisor.rpcinterface:make_main_rpcinterface\n\n")
+        f.write("[supervisord]\n")
+        f.write("nodaemon=true\n")
+        f.write("user=root\n\n")
+        f.write("[supervisorctl]\n")
+        f.write("serverurl=unix:///var/run/supervisor.sock\n\n")
+        f.write("[include]\n")
+        f.write("files=/etc/supervisor/conf.d/*.conf\n")
+
+    logger.debug("Generated supervisord configuration")
+
+    # Only watch the configuration file if one is mounted
+    config_file = get_config_file()
+
+    # Render the program configuration
+    render_template(
+        os.path.join(TEMPLATES_DIR, "mail-forwarder.conf.j2"),
+        PROGRAMS_CONF,
+        {
+            "config": config,
+            "config_file": config_file if os.path.exists(config_file) else None,
+            "renewal_offset": get_renewal_offset(config),
+        },
+        "supervisor"
+    )
+    logger.debug("Generated supervisor program configuration from template")
+
+if __name__ == "__main__":
+    # Test configuration
+    from config import from_environment
+
+    try:
+        config = from_environment()
+        configure_supervisor(config)
+    except Exception as e:
+        logger.error(f"Error configuring supervisor: {e}")
@@ -13,9 +13,13 @@ import time
 import datetime
 import threading
 import stat
+import tempfile
+from typing import List, Optional
 
-from config import Configuration
+from config import Configuration, ConfigDiff
 from utils import render_template, ensure_template_exists
+from utils import register_service_callback, reload_service, reload_postfix
+from cluster import lock_for
 
 # Configure logging
 logging.basicConfig(
@@ -30,10 +34,17 @@ ARCHIVE_DIR = "/etc/letsencrypt/archive"
 RENEWAL_DIR = "/etc/letsencrypt/renewal"
 CERTBOT_CONFIG_DIR = "/etc/letsencrypt"
 POSTFIX_CERT_DIR = "/etc/postfix/certs"
+POSTFIX_CERT_VERSIONS_DIR = os.path.join(POSTFIX_CERT_DIR, ".versions")
+CERT_VERSIONS_TO_KEEP = 2  # The deployed version and the one before it
+CERT_VERSION_GRACE = 60  # Seconds a superseded version is kept at least, for readers that resolved the old link
 TEMPLATES_DIR = "/templates/tls"
 RENEWAL_THRESHOLD_DAYS = 7  # Renew certificates if they expire within 7 days
 HOOK_SCRIPTS_DIR = "/etc/letsencrypt/renewal-hooks/custom"
-CRON_FILE = "/etc/cron.d/certbot-renewal"
+TLS_SNI_MAP = "/etc/postfix/tls_sni"
+TLS_PARAMS_FILE = "/etc/postfix/tls_params.pem"
+
+# Certificate deployments reload Postfix through the same callback path as templates
+register_service_callback("postfix", reload_postfix)
 
 def create_hook_scripts(config: Configuration = None):
     """Create script files for certbot and certificate renewal using Jinja2 templates."""
@@ -41,29 +52,21 @@ def create_hook_scripts(config: Configuration = None):
     os.makedirs(HOOK_SCRIPTS_DIR, exist_ok=True)
     
     # Define the hooks and scripts
+    # Renewals themselves are driven by renewal_scheduler.py, run by supervisord
     scripts = {
         "pre-hook.sh": os.path.join(TEMPLATES_DIR, "pre-hook.sh.j2"),
         "post-hook.sh": os.path.join(TEMPLATES_DIR, "post-hook.sh.j2"),
-        "renew-certificates.sh": os.path.join(TEMPLATES_DIR, "renew-certificates.sh.j2")
     }
     
     # Render each script
     for script_name, template_path in scripts.items():
         script_path = os.path.join(HOOK_SCRIPTS_DIR, script_name)
         
-        # Set template variables
-        template_vars = {}
-        if script_name == "renew-certificates.sh":
-            if config is None:
-                logger.error("Config is required for rendering renew-certificates.sh")
-                raise ValueError("Config parameter must be provided for renew-certificates.sh template")
-            template_vars = {"config": config}
-        
         # Render the template
         render_template(
             template_path,
             script_path,
-            template_vars,
+            {},
             None  # No service to reload
         )
         
@@ -73,46 +76,122 @@ def create_hook_scripts(config: Configuration = None):
     
     return os.path.join(HOOK_SCRIPTS_DIR, "pre-hook.sh"), os.path.join(HOOK_SCRIPTS_DIR, "post-hook.sh")
 
-def create_self_signed_cert(domain, cert_dir, key_size=2048, days_valid=365):
-    """Create a self-signed certificate for the domain."""
-    cert_path = os.path.join(cert_dir, f"{domain}/fullchain.pem")
-    key_path = os.path.join(cert_dir, f"{domain}/privkey.pem")
+def get_certificate_names(config: Configuration, domain):
+    """Return the (certificate name, key algorithm) pairs to issue for a domain."""
+    names = []
+    if config.tls.key_algorithm in ("rsa", "dual"):
+        names.append((domain, "rsa"))
+    if config.tls.key_algorithm in ("ecdsa", "dual"):
+        # Separate lineage, so switching algorithms never clobbers an RSA certificate
+        names.append((f"{domain}-ecdsa", "ecdsa"))
+    return names
+
+def get_primary_domain(config: Configuration):
+    """Return the domain whose certificates Postfix serves: the hostname, if it has certificates."""
+    if config.smtp.hostname in config.tls.domains:
+        return config.smtp.hostname
+    return min(config.tls.domains)
+
+def get_chain_files(config: Configuration, domain) -> List[str]:
+    """Return the deployed chain files (key followed by certificate chain) of a domain, one per key algorithm."""
+    return [os.path.join(POSTFIX_CERT_DIR, cert_name, "chain.pem")
+            for cert_name, _ in get_certificate_names(config, domain)]
+
+def uses_sni_map(config: Configuration):
+    """With more than one TLS domain, each domain's certificates are selected by SNI."""
+    return config.tls.enabled and len(config.tls.domains) > 1
+
+def build_sni_map():
+    """
+    Compile the SNI map. "postmap -F" embeds the contents of the chain files,
+    so this has to run again whenever a certificate is deployed.
+    """
+    if os.path.exists(TLS_SNI_MAP):
+        subprocess.run(["postmap", "-F", f"hash:{TLS_SNI_MAP}"], check=True)
+
+def create_sni_map(config: Configuration):
+    """Write and compile the map from TLS domain to its chain files, or remove it if it isn't used."""
+    if not uses_sni_map(config):
+        for path in (TLS_SNI_MAP, f"{TLS_SNI_MAP}.db"):
+            if os.path.exists(path):
+                os.remove(path)
+        return
+    
+    render_template(
+        os.path.join(TEMPLATES_DIR, "tls_sni.j2"),
+        TLS_SNI_MAP,
+        {"entries": [(domain, get_chain_files(config, domain)) for domain in sorted(config.tls.domains)]},
+        "postfix"
+    )
+    build_sni_map()
+    logger.info(f"Created TLS SNI map for {len(config.tls.domains)} domains")
+
+def generate_private_key(key_path, key_algorithm="rsa", key_size=2048):
+    """Generate a private key with openssl."""
+    if key_algorithm == "ecdsa":
+        cmd = [
+            "openssl", "genpkey",
+            "-algorithm", "EC",
+            "-pkeyopt", "ec_paramgen_curve:P-256",
+            "-out", key_path
+        ]
+    else:
+        cmd = [
+            "openssl", "genrsa",
+            "-out", key_path,
+            str(key_size)
+        ]
+    subprocess.run(cmd, check=True)
+
+def create_self_signed_cert(domain, cert_dir, key_size=2048, days_valid=365, key_algorithm="rsa", cert_name=None):
+    """Create and deploy a self-signed certificate for the domain."""
+    cert_name = cert_name or domain
+    cert_path = os.path.join(cert_dir, f"{cert_name}/fullchain.pem")
+    key_path = os.path.join(cert_dir, f"{cert_name}/privkey.pem")
+    
+    # Older releases kept the pair in a real directory; move it into a versioned deployment
+    migrate_legacy_certificate(cert_name)
     
     # Check if cert already exists
-    if os.path.exists(cert_path) and os.path.exists(key_path):
-        logger.info(f"Self-signed certificate for {domain} already exists")
+    if os.path.exists(os.path.join(cert_dir, cert_name, "chain.pem")):
+        logger.info(f"Self-signed certificate {cert_name} for {domain} already exists")
         return cert_path, key_path
     
-    # Ensure domain directory exists
-    os.makedirs(os.path.join(cert_dir, domain), exist_ok=True)
-    
-    # Generate private key
-    subprocess.run([
-        "openssl", "genrsa",
-        "-out", key_path,
-        str(key_size)
-    ], check=True)
-    
-    # Generate self-signed certificate
-    subprocess.run([
-        "openssl", "req",
-        "-new",
-        "-x509",
-        "-key", key_path,
-        "-out", cert_path,
-        "-days", str(days_valid),
-        "-subj", f"/CN={domain}"
-    ], check=True)
-    
-    logger.info(f"Created self-signed certificate for {domain}")
+    # Generate into a staging directory, the deployment step swaps it in
+    staging_dir = tempfile.mkdtemp(prefix=".staging-", dir=cert_dir)
+    staged_cert = os.path.join(staging_dir, "fullchain.pem")
+    staged_key = os.path.join(staging_dir, "privkey.pem")
+    
+    try:
+        # Generate private key
+        generate_private_key(staged_key, key_algorithm, key_size)
+        
+        # Generate self-signed certificate
+        subprocess.run([
+            "openssl", "req",
+            "-new",
+            "-x509",
+            "-key", staged_key,
+            "-out", staged_cert,
+            "-days", str(days_valid),
+            "-subj", f"/CN={domain}"
+        ], check=True)
+        
+        deploy_certificate(cert_name, staged_cert, staged_key)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    logger.info(f"Created self-signed {key_algorithm.upper()} certificate for {domain}")
     return cert_path, key_path
 
-def setup_certbot_for_domain(domain, email, staging=False, config=None):
+def setup_certbot_for_domain(domain, email, staging=False, config=None, cert_name=None, key_algorithm="rsa"):
     """Set up Let's Encrypt certificate using certbot."""
+    cert_name = cert_name or domain
+    
     # Check if certificate already exists
-    if os.path.exists(os.path.join(CERTS_DIR, domain, "fullchain.pem")) and \
-       os.path.exists(os.path.join(CERTS_DIR, domain, "privkey.pem")):
-        logger.info(f"Let's Encrypt certificate for {domain} already exists")
+    if os.path.exists(os.path.join(CERTS_DIR, cert_name, "fullchain.pem")) and \
+       os.path.exists(os.path.join(CERTS_DIR, cert_name, "privkey.pem")):
+        logger.info(f"Let's Encrypt certificate {cert_name} for {domain} already exists")
         return
     
     # Create hook scripts
@@ -124,12 +203,18 @@ def setup_certbot_for_domain(domain, email, staging=False, config=None):
         "--non-interactive",
         "--agree-tos",
         "--email", email,
-        "--cert-name", domain,
+        "--cert-name", cert_name,
         "-d", domain,
         "--pre-hook", pre_hook_script,
         "--post-hook", post_hook_script
     ]
     
+    if key_algorithm == "ecdsa":
+        base_cmd += ["--key-type", "ecdsa", "--elliptic-curve", "secp256r1"]
+    else:
+        key_size = config.tls.key_size if config else 2048
+        base_cmd += ["--key-type", "rsa", "--rsa-key-size", str(key_size)]
+    
     if staging:
         base_cmd.append("--test-cert")
     
@@ -175,44 +260,31 @@ def setup_certbot_for_domain(domain, email, staging=False, config=None):
         logger.error(f"Failed to set up Let's Encrypt certificate for {domain} using all methods: {e}")
         raise
 
-def setup_cron_job(config: Configuration):
-    """Set up a cron job for certificate renewal."""
-    # Create a random hour and minute for the cron job to run
-    # This helps distribute the load on Let's Encrypt servers
-    random_hour = random.randint(0, 23)
-    random_minute = random.randint(0, 59)
-    
-    # Render the cron job template
-    cron_template_path = os.path.join(TEMPLATES_DIR, "certbot-cron.j2")
-    
-    render_template(
-        cron_template_path,
-        CRON_FILE,
-        {
-            "random_hour": random_hour,
-            "random_minute": random_minute
-        },
-        None  # No service to reload
-    )
-    
-    # Make sure the cron file has correct permissions
-    os.chmod(CRON_FILE, 0o644)
-    
-    logger.info(f"Created certificate renewal cron job at {CRON_FILE} (runs daily at {random_hour:02d}:{random_minute:02d})")
+def get_renewal_offset(config: Configuration):
+    """
+    Return the offset in seconds into each hour at which the renewal scheduler
+    runs. It is derived from the hostname, so it stays the same across restarts
+    and spreads hosts over the hour; the scheduler adds jitter per certificate.
+    """
+    return random.Random(config.smtp.hostname).randint(0, 59) * 60
+
+def get_certificate_expiry(cert_path):
+    """Return the expiry date of a certificate as a naive UTC datetime."""
+    output = subprocess.check_output([
+        "openssl", "x509", 
+        "-in", cert_path,
+        "-noout",
+        "-enddate"
+    ]).decode('utf-8').strip()
+    
+    # Extract expiry date
+    expiry_date_str = output.split('=')[1]
+    return datetime.datetime.strptime(expiry_date_str, "%b %d %H:%M:%S %Y %Z")
 
-def check_certificate_expiry(cert_path):
-    """Check if a certificate is about to expire."""
+def check_certificate_expiry(cert_path, threshold_days=RENEWAL_THRESHOLD_DAYS):
+    """Check if a certificate expires within threshold_days."""
     try:
-        output = subprocess.check_output([
-            "openssl", "x509", 
-            "-in", cert_path,
-            "-noout",
-            "-enddate"
-        ]).decode('utf-8').strip()
-        
-        # Extract expiry date
-        expiry_date_str = output.split('=')[1]
-        expiry_date = datetime.datetime.strptime(expiry_date_str, "%b %d %H:%M:%S %Y %Z")
+        expiry_date = get_certificate_expiry(cert_path)
         
         # Calculate days until expiry
         now = datetime.datetime.now()
@@ -221,18 +293,144 @@ def check_certificate_expiry(cert_path):
         logger.info(f"Certificate {cert_path} expires in {days_until_expiry} days")
         
         # Return True if certificate needs renewal
-        return days_until_expiry <= RENEWAL_THRESHOLD_DAYS
+        return days_until_expiry <= threshold_days
     except Exception as e:
         logger.error(f"Error checking certificate expiry for {cert_path}: {e}")
         # If we can't check, assume renewal is needed to be safe
         return True
 
-def configure_tls(config: Configuration):
-    """Configure TLS certificates based on the provided configuration."""
+def get_letsencrypt_certificate(domain):
+    """Return the (fullchain, privkey) paths of a Let's Encrypt certificate, or None if missing."""
+    cert_src = os.path.join(CERTS_DIR, domain, "fullchain.pem")
+    key_src = os.path.join(CERTS_DIR, domain, "privkey.pem")
+    
+    if not (os.path.exists(cert_src) and os.path.exists(key_src)):
+        return None
+    
+    return cert_src, key_src
+
+def _write_file(path, data, mode):
+    """Write a file and flush it to disk before it becomes visible through a swap."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, mode)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+def _prune_versions(name, keep=CERT_VERSIONS_TO_KEEP):
+    """
+    Remove old deployed versions of a certificate, keeping the newest ones and
+    any that were superseded less than CERT_VERSION_GRACE seconds ago.
+    """
+    versions_dir = os.path.join(POSTFIX_CERT_VERSIONS_DIR, name)
+    versions = sorted(os.listdir(versions_dir), key=int)
+    # Version names are creation times in nanoseconds, so a version was superseded when the next one was created
+    cutoff = time.time_ns() - CERT_VERSION_GRACE * 1_000_000_000
+    for version, successor in zip(versions[:-keep], versions[1:]):
+        if int(successor) < cutoff:
+            shutil.rmtree(os.path.join(versions_dir, version), ignore_errors=True)
+
+def deploy_certificate(name, cert_src, key_src):
+    """
+    Atomically deploy a certificate and key pair for Postfix.
+    
+    The pair is copied into a new versioned directory and the
+    POSTFIX_CERT_DIR/<name> symlink is swapped to it with rename(), so
+    readers always see either the old or the new pair, never a mix.
+    Returns True if the deployed pair changed.
+    """
+    with open(cert_src, 'rb') as f:
+        cert = f.read()
+    with open(key_src, 'rb') as f:
+        key = f.read()
+    
+    # Combined key + chain file, so Postfix loads the pair from a single open
+    chain = key if key.endswith(b"\n") else key + b"\n"
+    chain += cert
+    
+    link_path = os.path.join(POSTFIX_CERT_DIR, name)
+    current_chain = os.path.join(link_path, "chain.pem")
+    if os.path.islink(link_path) and os.path.exists(current_chain):
+        with open(current_chain, 'rb') as f:
+            if f.read() == chain:
+                logger.debug(f"Certificate for {name} is already deployed")
+                return False
+    
+    # Write the new version
+    version = str(time.time_ns())
+    version_dir = os.path.join(POSTFIX_CERT_VERSIONS_DIR, name, version)
+    os.makedirs(version_dir, mode=0o755)
+    _write_file(os.path.join(version_dir, "fullchain.pem"), cert, 0o644)
+    _write_file(os.path.join(version_dir, "privkey.pem"), key, 0o600)
+    _write_file(os.path.join(version_dir, "chain.pem"), chain, 0o600)
+    
+    # Older releases kept real directories here; they can't be replaced by rename()
+    if os.path.isdir(link_path) and not os.path.islink(link_path):
+        logger.info(f"Migrating {link_path} to a versioned certificate deployment")
+        shutil.rmtree(link_path)
+    
+    # Swap the symlink atomically
+    tmp_link = f"{link_path}.tmp"
+    if os.path.lexists(tmp_link):
+        os.remove(tmp_link)
+    os.symlink(os.path.relpath(version_dir, POSTFIX_CERT_DIR), tmp_link)
+    os.replace(tmp_link, link_path)
+    
+    _prune_versions(name)
+    
+    logger.info(f"Deployed certificate for {name} (version {version})")
+    return True
+
+def migrate_legacy_certificate(name):
+    """
+    Deploy the pair an older release left in a real POSTFIX_CERT_DIR/<name>
+    directory as a versioned deployment. Returns True if one was migrated.
+    """
+    legacy_dir = os.path.join(POSTFIX_CERT_DIR, name)
+    if os.path.islink(legacy_dir) or not os.path.isdir(legacy_dir):
+        return False
+    
+    cert_path = os.path.join(legacy_dir, "fullchain.pem")
+    key_path = os.path.join(legacy_dir, "privkey.pem")
+    if not (os.path.exists(cert_path) and os.path.exists(key_path)):
+        return False
+    
+    # deploy_certificate reads the pair before it replaces the directory
+    deploy_certificate(name, cert_path, key_path)
+    return True
+
+def deploy_certificates(pairs):
+    """
+    Deploy several certificate pairs and reload Postfix once if any changed.
+    
+    Args:
+        pairs: Mapping of certificate name to (fullchain, privkey) paths
+    
+    Returns the names of the certificates that changed.
+    """
+    changed = [name for name, (cert_src, key_src) in sorted(pairs.items())
+               if deploy_certificate(name, cert_src, key_src)]
+    
+    if changed:
+        build_sni_map()
+        reload_service("postfix")
+    
+    return changed
+
+def configure_tls(config: Configuration, diff: Optional[ConfigDiff] = None):
+    """
+    Configure TLS certificates based on the provided configuration.
+    With a diff against the applied configuration, certificates are only
+    requested or generated again when a certificate-related field changed.
+    """
     if not config.tls.enabled:
         logger.info("TLS is disabled, skipping certificate configuration")
         return
     
+    if diff is not None and not diff.affects("tls"):
+        logger.info("TLS configuration unchanged, skipping")
+        return
+    
     logger.info("Configuring TLS certificates")
     
     # Ensure directories exist
@@ -255,76 +453,57 @@ def configure_tls(config: Configuration):
     )
     logger.info(f"Created certbot renewal configuration at {renewal_conf_path}")
     
-    # Set up cron job for certificate renewal
-    setup_cron_job(config)
-    
     # The domains are now automatically derived from forwarding rules if not explicitly set
-    for domain in config.tls.domains:
-        if config.tls.use_letsencrypt:
-            # Configure Let's Encrypt certificate
-            setup_certbot_for_domain(domain, config.tls.email, config.tls.staging, config)
-            
-            # Link certificates to Postfix directory
-            domain_cert_dir = os.path.join(POSTFIX_CERT_DIR, domain)
-            os.makedirs(domain_cert_dir, exist_ok=True)
-            
-            # Copy or link the Let's Encrypt certificates
-            cert_src = os.path.join(CERTS_DIR, domain, "fullchain.pem")
-            key_src = os.path.join(CERTS_DIR, domain, "privkey.pem")
+    issue_certificates = diff is None or diff.regenerates(POSTFIX_CERT_DIR)
+    letsencrypt_pairs = {}
+    cert_names = []
+    for domain in sorted(config.tls.domains):
+        for cert_name, key_algorithm in get_certificate_names(config, domain):
+            cert_names.append(cert_name)
+            if not issue_certificates:
+                continue
             
-            if os.path.exists(cert_src) and os.path.exists(key_src):
-                # Create hardlinks to the certificates
-                cert_dest = os.path.join(domain_cert_dir, "fullchain.pem")
-                key_dest = os.path.join(domain_cert_dir, "privkey.pem")
+            if config.tls.use_letsencrypt:
+                # Configure Let's Encrypt certificate; in a cluster only the lock holder
+                # issues it, the other replicas then find it in the shared store
+                with lock_for(config, "acme"):
+                    setup_certbot_for_domain(domain, config.tls.email, config.tls.staging, config,
+                                             cert_name, key_algorithm)
                 
-                # Remove existing files
-                if os.path.exists(cert_dest):
-                    os.remove(cert_dest)
-                if os.path.exists(key_dest):
-                    os.remove(key_dest)
-                
-                # Create hardlinks
-                os.link(cert_src, cert_dest)
-                os.link(key_src, key_dest)
-                
-                logger.info(f"Linked Let's Encrypt certificates for {domain}")
-            else:
-                logger.warning(f"Let's Encrypt certificates for {domain} not found, falling back to self-signed")
-                create_self_signed_cert(domain, POSTFIX_CERT_DIR, config.tls.key_size)
-        else:
+                # Collect certificates to deploy to the Postfix directory
+                pair = get_letsencrypt_certificate(cert_name)
+                if pair:
+                    letsencrypt_pairs[cert_name] = pair
+                    continue
+                logger.warning(f"Let's Encrypt certificate {cert_name} not found, falling back to self-signed")
+            
             # Create self-signed certificate
-            create_self_signed_cert(domain, POSTFIX_CERT_DIR, config.tls.key_size)
+            create_self_signed_cert(domain, POSTFIX_CERT_DIR, config.tls.key_size,
+                                    key_algorithm=key_algorithm, cert_name=cert_name)
+    
+    # Deploy Let's Encrypt certificates with a single Postfix reload
+    deploy_certificates(letsencrypt_pairs)
+    
+    # Select each domain's certificates by SNI; main.cf serves the primary domain's by default
+    create_sni_map(config)
     
     # Generate TLS parameters file if it doesn't exist
-    params_file = "/etc/postfix/tls_params.pem"
-    if not os.path.exists(params_file):
+    if not os.path.exists(TLS_PARAMS_FILE):
         logger.info("Generating TLS parameters file")
         subprocess.run([
             "openssl", "dhparam",
-            "-out", params_file,
+            "-out", TLS_PARAMS_FILE,
             str(config.tls.params_bits)
         ], check=True)
     
-    # Configure Postfix TLS settings using Jinja2
-    template_path = os.path.join(TEMPLATES_DIR, "tls_config.j2")
-    output_path = "/etc/postfix/tls_config"
-    
-    # Render the template
-    render_template(
-        template_path,
-        output_path,
-        {"config": config},
-        "postfix"
-    )
-    
     # Run an initial certificate check to see if any renewals are needed
     # This will log the status of all certificates
-    for domain in config.tls.domains:
-        cert_path = os.path.join(CERTS_DIR, domain, "fullchain.pem")
+    for cert_name in cert_names:
+        cert_path = os.path.join(CERTS_DIR, cert_name, "fullchain.pem")
         if os.path.exists(cert_path):
-            needs_renewal = check_certificate_expiry(cert_path)
+            needs_renewal = check_certificate_expiry(cert_path, config.tls.renewal_days)
             if needs_renewal:
-                logger.info(f"Certificate for {domain} should be renewed soon. Renewal will be handled by cron job.")
+                logger.info(f"Certificate {cert_name} should be renewed soon. Renewal will be handled by the renewal scheduler.")
     
     logger.info("TLS configuration complete")
 
@@ -343,22 +522,23 @@ def print_tls_info(config: Configuration):
             logger.info("Using TLS-ALPN-01 challenge on ports 465/587 with HTTP fallback")
         
         for domain in config.tls.domains:
-            cert_path = os.path.join(CERTS_DIR, domain, "fullchain.pem")
-            if os.path.exists(cert_path):
-                try:
-                    output = subprocess.check_output([
-                        "openssl", "x509", 
-                        "-in", cert_path,
-                        "-noout",
-                        "-enddate",
-                        "-issuer"
-                    ]).decode('utf-8').strip()
-                    logger.info(f"Certificate for {domain}:")
-                    logger.info(output)
-                except Exception as e:
-                    logger.error(f"Error checking certificate for {domain}: {e}")
-            else:
-                logger.warning(f"Certificate for {domain} not found at {cert_path}")
+            for cert_name, key_algorithm in get_certificate_names(config, domain):
+                cert_path = os.path.join(CERTS_DIR, cert_name, "fullchain.pem")
+                if os.path.exists(cert_path):
+                    try:
+                        output = subprocess.check_output([
+                            "openssl", "x509", 
+                            "-in", cert_path,
+                            "-noout",
+                            "-enddate",
+                            "-issuer"
+                        ]).decode('utf-8').strip()
+                        logger.info(f"{key_algorithm.upper()} certificate for {domain}:")
+                        logger.info(output)
+                    except Exception as e:
+                        logger.error(f"Error checking certificate for {domain}: {e}")
+                else:
+                    logger.warning(f"Certificate for {domain} not found at {cert_path}")
     else:
         logger.info("Using self-signed certificates")
     
@@ -7,8 +7,9 @@ Contains common functions used across multiple modules.
 import os
 import logging
 import subprocess
-import jinja2
-from typing import Dict, Any, Callable, Optional
+from typing import Dict, Any, Callable, Iterable, Optional
+
+import supervisor_client
 
 # Configure logging
 logging.basicConfig(
@@ -35,6 +36,26 @@ def register_service_callback(service_name: str, callback: Callable, check_func:
         service_check_funcs[service_name] = check_func
     logger.debug(f"Registered callback for service: {service_name}")
 
+def reload_service(service_name: str) -> None:
+    """
+    Call the registered reload callback for a service, if it is enabled.
+    
+    Args:
+        service_name: Name of the service to reload
+    """
+    if service_name not in service_callbacks:
+        return
+    
+    # Check if the service should be active if there's a check function
+    if service_name in service_check_funcs:
+        check_func = service_check_funcs[service_name]
+        if not check_func():
+            logger.info(f"Service {service_name} is not enabled in configuration, skipping reload")
+            return
+    
+    logger.info(f"Calling callback for service: {service_name}")
+    service_callbacks[service_name]()
+
 def ensure_template_exists(template_path: str, template_content: str) -> None:
     """
     Ensure that a template file exists.
@@ -71,6 +92,9 @@ def render_template(template_path: str, output_path: str, context: Dict[str, Any
         # Ensure the output directory exists
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
         
+        # Imported here so commands that never render don't pay for jinja2
+        import jinja2
+        
         # Load and render the template
         template_dir = os.path.dirname(template_path)
         template_file = os.path.basename(template_path)
@@ -96,16 +120,8 @@ def render_template(template_path: str, output_path: str, context: Dict[str, Any
             logger.info(f"Generated {output_path}")
             
             # Call service callback if provided and content changed
-            if service_name and service_name in service_callbacks:
-                # Check if the service should be active if there's a check function
-                if service_name in service_check_funcs:
-                    check_func = service_check_funcs[service_name]
-                    if not check_func():
-                        logger.info(f"Service {service_name} is not enabled in configuration, skipping reload")
-                        return
-                
-                logger.info(f"Calling callback for service: {service_name}")
-                service_callbacks[service_name]()
+            if service_name:
+                reload_service(service_name)
         else:
             logger.debug(f"No changes to {output_path}, skipping")
     except Exception as e:
@@ -121,106 +137,128 @@ def reload_postfix() -> None:
         logger.info("Starting Postfix service")
         subprocess.run(["postfix", "start"], check=True)
 
-def reload_opendkim() -> None:
-    """Reload OpenDKIM configuration."""
+def _start_program(program: str, description: str) -> None:
+    """Start a supervisor program that isn't running."""
+    try:
+        supervisor_client.start(program)
+        logger.info(f"Started {description}")
+    except supervisor_client.SupervisorError as e:
+        if e.code == supervisor_client.FAULT_BAD_NAME:
+            logger.error(f"{description} is not a supervisor program yet. Will try again later.")
+        else:
+            logger.error(f"Failed to start {description}: {e}")
+
+def reload_opendkim(programs: Iterable[str] = ("opendkim",)) -> None:
+    """Reload the configuration of the given OpenDKIM programs (one per signing algorithm)."""
     try:
-        # Check if supervisor is properly configured
-        if not os.path.exists("/var/run/supervisor.sock"):
-            logger.warning("Supervisor socket not found, skipping OpenDKIM reload")
+        # Check if supervisor is running
+        if not supervisor_client.is_available():
+            logger.warning("Supervisor not available, skipping OpenDKIM reload")
             return
         
-        # Check if OpenDKIM is running
-        if subprocess.run(["pgrep", "opendkim"], stdout=subprocess.PIPE).returncode == 0:
-            subprocess.run(["kill", "-HUP", "`pgrep opendkim`"], shell=True, check=True)
-            logger.info("Reloaded OpenDKIM configuration")
-        else:
-            # Only try to start OpenDKIM if supervisor is ready
-            try:
-                subprocess.run(["supervisorctl", "start", "opendkim"], check=True)
-                logger.info("Started OpenDKIM service")
-            except subprocess.CalledProcessError as e:
-                if "not include supervisorctl section" in str(e):
-                    logger.error("Supervisor configuration is incomplete. Will try again later.")
-                else:
-                    logger.error(f"Failed to start OpenDKIM: {e}")
-    except subprocess.CalledProcessError as e:
+        states = supervisor_client.get_process_states()
+        for program in programs:
+            program_states = [state for process, state in states.items() if process.split(":")[0] == program]
+            if not program_states:
+                # Added by the supervisor update, which starts it with the current configuration
+                logger.debug(f"{program} is not a supervisor program yet, skipping reload")
+            elif "RUNNING" in program_states:
+                # Every process of the program gets the HUP
+                supervisor_client.signal(program, "HUP")
+                logger.info(f"Reloaded {program} configuration")
+            else:
+                _start_program(program, program)
+    except supervisor_client.SupervisorError as e:
         logger.error(f"Failed to reload OpenDKIM: {e}")
 
 def reload_fail2ban() -> None:
     """Reload Fail2ban configuration."""
     try:
-        # Check if supervisor is properly configured
-        if not os.path.exists("/var/run/supervisor.sock"):
-            logger.warning("Supervisor socket not found, skipping Fail2ban reload")
+        # Check if supervisor is running
+        if not supervisor_client.is_available():
+            logger.warning("Supervisor not available, skipping Fail2ban reload")
             return
-            
+        
+        if not supervisor_client.is_running("fail2ban"):
+            _start_program("fail2ban", "Fail2ban")
+            return
+        
         subprocess.run(["fail2ban-client", "reload"], check=True)
         logger.info("Reloaded Fail2ban configuration")
-    except subprocess.CalledProcessError as e:
+    except (supervisor_client.SupervisorError, subprocess.CalledProcessError) as e:
         logger.error(f"Failed to reload Fail2ban: {e}")
-        # Try to start it via supervisor
-        try:
-            subprocess.run(["supervisorctl", "start", "fail2ban"], check=True)
-            logger.info("Started Fail2ban service")
-        except subprocess.CalledProcessError as e:
-            if "not include supervisorctl section" in str(e):
-                logger.error("Supervisor configuration is incomplete. Will try again later.")
-            else:
-                logger.error(f"Failed to start Fail2ban: {e}")
 
 def reload_postsrsd() -> None:
     """Reload PostSRSd configuration."""
     try:
-        # Check if supervisor is properly configured
-        if not os.path.exists("/var/run/supervisor.sock"):
-            logger.warning("Supervisor socket not found, skipping PostSRSd reload")
+        # Check if supervisor is running
+        if not supervisor_client.is_available():
+            logger.warning("Supervisor not available, skipping PostSRSd reload")
             return
-            
+        
         # Check if PostSRSd is running
-        if subprocess.run(["pgrep", "postsrsd"], stdout=subprocess.PIPE).returncode == 0:
-            subprocess.run(["supervisorctl", "restart", "postsrsd"], check=True)
+        if supervisor_client.is_running("postsrsd"):
+            supervisor_client.restart("postsrsd")
             logger.info("Restarted PostSRSd service")
         else:
-            # Start PostSRSd if it's not running
-            try:
-                subprocess.run(["supervisorctl", "start", "postsrsd"], check=True)
-                logger.info("Started PostSRSd service")
-            except subprocess.CalledProcessError as e:
-                if "not include supervisorctl section" in str(e):
-                    logger.error("Supervisor configuration is incomplete. Will try again later.")
-                else:
-                    logger.error(f"Failed to start PostSRSd: {e}")
-    except subprocess.CalledProcessError as e:
+            _start_program("postsrsd", "PostSRSd")
+    except supervisor_client.SupervisorError as e:
         logger.error(f"Failed to reload PostSRSd: {e}")
 
+def reload_srs_server() -> None:
+    """Make the native SRS server reload its configuration without a restart."""
+    try:
+        # Before supervisord is started there is nothing to reload
+        if not supervisor_client.is_available():
+            logger.debug("Supervisor not available, skipping SRS server reload")
+            return
+        
+        # When switching to the native backend at runtime the program only exists
+        # after the supervisor update, and it reads the current configuration on start
+        if supervisor_client.get_process_states().get("srs-server") != "RUNNING":
+            logger.debug("SRS server is not running, skipping reload")
+            return
+        
+        supervisor_client.signal("srs-server", "HUP")
+        logger.info("Signalled SRS server to reload")
+    except supervisor_client.SupervisorError as e:
+        logger.error(f"Failed to reload SRS server: {e}")
+
 def reload_saslauthd() -> None:
     """Reload SASL authentication daemon configuration."""
     try:
-        # Check if supervisor is properly configured
-        if not os.path.exists("/var/run/supervisor.sock"):
-            logger.warning("Supervisor socket not found, skipping SASL authentication daemon reload")
+        # Check if supervisor is running
+        if not supervisor_client.is_available():
+            logger.warning("Supervisor not available, skipping SASL authentication daemon reload")
             return
-            
+        
         # Check if saslauthd is running
-        if subprocess.run(["pgrep", "saslauthd"], stdout=subprocess.PIPE).returncode == 0:
-            subprocess.run(["supervisorctl", "restart", "saslauthd"], check=True)
+        if supervisor_client.is_running("saslauthd"):
+            supervisor_client.restart("saslauthd")
             logger.info("Restarted SASL authentication daemon")
         else:
-            # Start saslauthd if it's not running
-            try:
-                subprocess.run(["supervisorctl", "start", "saslauthd"], check=True)
-                logger.info("Started SASL authentication daemon")
-            except subprocess.CalledProcessError as e:
-                if "not include supervisorctl section" in str(e):
-                    logger.error("Supervisor configuration is incomplete. Will try again later.")
-                else:
-                    logger.error(f"Failed to start SASL authentication daemon: {e}")
-    except subprocess.CalledProcessError as e:
+            _start_program("saslauthd", "SASL authentication daemon")
+    except supervisor_client.SupervisorError as e:
         logger.error(f"Failed to reload SASL authentication daemon: {e}")
 
+def reload_supervisor() -> None:
+    """Apply changed supervisor program configuration, restarting only changed programs."""
+    try:
+        # Before supervisord is started there is nothing to update
+        if not supervisor_client.is_available():
+            logger.debug("Supervisor not available, skipping supervisor update")
+            return
+        
+        added, changed, removed = supervisor_client.update()
+        logger.info(f"Updated supervisor program configuration "
+                    f"(added: {added}, changed: {changed}, removed: {removed})")
+    except supervisor_client.SupervisorError as e:
+        logger.error(f"Failed to update supervisor configuration: {e}")
+
 # Note: Service callback registrations are now in their respective configuration modules
 # for better service state tracking. See:
 # - dkim_config.py for opendkim
 # - postfix_config.py for postsrsd and saslauthd
 # - security_config.py for fail2ban
-# Postfix is always required so it will be registered when postfix_config is imported 
\ No newline at end of file
+# - supervisor_config.py for supervisor
+# Postfix is always required so it will be registered when postfix_config or tls_config is imported 
\ No newline at end of file
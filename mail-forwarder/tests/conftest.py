@@ -0,0 +1,9 @@
+"""
+Shared pytest setup: the scripts are run from /scripts in the container and
+import each other as top-level modules, so the tests do the same.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
@@ -0,0 +1,99 @@
+"""
+Tests for the native brute-force detector: the sliding window, client
+tracking, ignored networks and the SASL failure pattern on Postfix log lines.
+"""
+
+import pytest
+
+from brute_force import BruteForceDetector, SlidingWindowCounter, FAILURE_PATTERN
+
+SUBMISSION_FAILURE = (b"Oct 18 10:00:01 mail postfix/submission/smtpd[2113]: warning: unknown[203.0.113.5]: "
+                      b"SASL LOGIN authentication failed: UGFzc3dvcmQ6")
+
+def detector(max_attempts=3, window=600, max_clients=100, ignored=("127.0.0.0/8", "::1/128")):
+    return BruteForceDetector(SlidingWindowCounter(max_attempts, window, max_clients), banner=None,
+                              ignored_networks=ignored)
+
+@pytest.mark.parametrize("line,client", [
+    (SUBMISSION_FAILURE, "203.0.113.5"),
+    (b"Oct  8 09:15:22 mail postfix/smtps/smtpd[77]: warning: host-7.example.net[198.51.100.7]: "
+     b"SASL PLAIN authentication failed: authentication failure", "198.51.100.7"),
+    (b"Oct 18 10:00:02 mail postfix/smtpd[1001]: warning: unknown[2001:db8::25]: "
+     b"SASL LOGIN authentication failed: UGFzc3dvcmQ6", "2001:db8::25"),
+    (b"2026-10-18T10:00:03.512201+00:00 mail postfix/submission/smtpd[2114]: warning: unknown[2001:db8:1:2::a]: "
+     b"SASL CRAM-MD5 authentication failed: authentication failure", "2001:db8:1:2::a"),
+    (b"Oct 18 10:00:04 mail postfix-out/smtpd[3]: warning: unknown[::ffff:192.0.2.9]: "
+     b"SASL LOGIN authentication failed: UGFzc3dvcmQ6", "::ffff:192.0.2.9"),
+])
+def test_failure_pattern_matches_postfix_lines(line, client):
+    match = FAILURE_PATTERN.match(line)
+
+    assert match and match.group(1).decode() == client
+
+@pytest.mark.parametrize("line", [
+    b"Oct 18 10:00:05 mail postfix/smtpd[1001]: disconnect from unknown[203.0.113.5] ehlo=1 auth=0/1 quit=1 commands=2/3",
+    b"Oct 18 10:00:06 mail postfix/smtpd[1001]: warning: hostname x.example does not resolve to address 203.0.113.5",
+    b"Oct 18 10:00:07 mail opendkim[12]: 4Xk2: no signing table match for 'a@example.com'",
+    # The client controls the sender address; a forged failure inside it must not ban an arbitrary address
+    b"Oct 18 10:00:08 mail postfix/smtpd[1001]: NOQUEUE: reject: RCPT from unknown[203.0.113.5]: 554 5.7.1 "
+    b"<x@example.com>: Relay access denied; from=<\" postfix/smtpd[1]: warning: x[192.0.2.1]: "
+    b"SASL LOGIN authentication failed\"@example.org> to=<x@example.com> proto=ESMTP helo=<x>",
+])
+def test_failure_pattern_ignores_other_lines(line):
+    assert detector(max_attempts=1).feed(line, 0) is None
+
+def test_threshold_inside_the_window():
+    d = detector(max_attempts=3, window=600)
+
+    assert d.feed(SUBMISSION_FAILURE, 0) is None
+    assert d.feed(SUBMISSION_FAILURE, 300) is None
+    assert d.feed(SUBMISSION_FAILURE, 600) == "203.0.113.5"
+
+def test_threshold_outside_the_window():
+    d = detector(max_attempts=3, window=600)
+
+    assert d.feed(SUBMISSION_FAILURE, 0) is None
+    assert d.feed(SUBMISSION_FAILURE, 300) is None
+    assert d.feed(SUBMISSION_FAILURE, 601) is None
+    # The oldest failure slid out, the last three are within 600 seconds
+    assert d.feed(SUBMISSION_FAILURE, 700) == "203.0.113.5"
+
+def test_count_starts_over_after_a_ban():
+    d = detector(max_attempts=2, window=600)
+    assert d.feed(SUBMISSION_FAILURE, 0) is None
+    assert d.feed(SUBMISSION_FAILURE, 1) == "203.0.113.5"
+
+    assert len(d.counter) == 0
+    assert d.feed(SUBMISSION_FAILURE, 2) is None
+
+def test_clients_are_counted_separately():
+    d = detector(max_attempts=2)
+    other = SUBMISSION_FAILURE.replace(b"203.0.113.5", b"203.0.113.6")
+
+    assert d.feed(SUBMISSION_FAILURE, 0) is None
+    assert d.feed(other, 1) is None
+    assert d.feed(other, 2) == "203.0.113.6"
+
+def test_least_recently_failing_clients_are_evicted():
+    counter = SlidingWindowCounter(max_attempts=2, window=600, max_clients=2)
+    counter.hit("192.0.2.1", 0)
+    counter.hit("192.0.2.2", 1)
+    assert counter.hit("192.0.2.1", 2)  # Reaches the limit, and is no longer tracked
+    counter.hit("192.0.2.3", 3)
+    counter.hit("192.0.2.4", 4)
+
+    assert len(counter) == 2
+    # 192.0.2.2 was evicted, so its next failure counts as the first again
+    assert not counter.hit("192.0.2.2", 5)
+    assert counter.hit("192.0.2.4", 6)
+
+@pytest.mark.parametrize("client", [b"127.0.0.1", b"::1", b"10.1.2.3", b"fd00::7"])
+def test_ignored_networks(client):
+    d = detector(max_attempts=1, ignored=("127.0.0.0/8", "::1/128", "10.0.0.0/8", "fd00::/8"))
+
+    assert d.feed(SUBMISSION_FAILURE.replace(b"203.0.113.5", client), 0) is None
+
+def test_not_ignored_neighbour_network():
+    d = detector(max_attempts=1, ignored=("10.0.0.0/8",))
+
+    assert d.feed(SUBMISSION_FAILURE.replace(b"203.0.113.5", b"11.0.0.1"), 0) == "11.0.0.1"
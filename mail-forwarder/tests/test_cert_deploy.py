@@ -0,0 +1,116 @@
+"""
+Tests for the atomic certificate deployment in tls_config.
+"""
+
+import os
+import subprocess
+import threading
+
+import pytest
+
+import tls_config
+
+SWAPS = 200
+READERS = 4
+
+@pytest.fixture
+def cert_dir(tmp_path, monkeypatch):
+    """Deploy into a temporary directory instead of /etc/postfix/certs."""
+    cert_dir = str(tmp_path / "certs")
+    os.makedirs(cert_dir)
+    monkeypatch.setattr(tls_config, "POSTFIX_CERT_DIR", cert_dir)
+    monkeypatch.setattr(tls_config, "POSTFIX_CERT_VERSIONS_DIR", os.path.join(cert_dir, ".versions"))
+    return cert_dir
+
+def make_pair(directory, name):
+    """Create a self-signed certificate and key; returns (fullchain, privkey) paths and their contents."""
+    os.makedirs(directory, exist_ok=True)
+    cert_path = os.path.join(directory, f"{name}-fullchain.pem")
+    key_path = os.path.join(directory, f"{name}-privkey.pem")
+    tls_config.generate_private_key(key_path, "ecdsa")
+    subprocess.run(["openssl", "req", "-new", "-x509", "-key", key_path, "-out", cert_path,
+                    "-days", "1", "-subj", f"/CN={name}"], check=True, capture_output=True)
+    with open(cert_path, 'rb') as f:
+        cert = f.read()
+    with open(key_path, 'rb') as f:
+        key = f.read()
+    return (cert_path, key_path), (key, cert)
+
+def split_chain(chain):
+    """Split a chain.pem into its key and certificate parts."""
+    index = chain.index(b"-----BEGIN CERTIFICATE-----")
+    return chain[:index], chain[index:]
+
+def test_readers_never_see_a_mixed_pair(cert_dir, tmp_path):
+    sources = [make_pair(str(tmp_path / "src"), f"pair{i}") for i in range(2)]
+    expected = {contents for _, contents in sources}
+    
+    tls_config.deploy_certificate("example.com", *sources[0][0])
+    chain_path = os.path.join(cert_dir, "example.com", "chain.pem")
+    
+    stop = threading.Event()
+    reads = []
+    errors = []
+    
+    def reader():
+        count = 0
+        while not stop.is_set():
+            try:
+                with open(chain_path, 'rb') as f:
+                    pair = split_chain(f.read())
+            except Exception as e:
+                errors.append(e)
+                return
+            if pair not in expected:
+                errors.append(AssertionError(f"mismatched key/certificate pair after {count} reads"))
+                return
+            count += 1
+        reads.append(count)
+    
+    threads = [threading.Thread(target=reader) for _ in range(READERS)]
+    for thread in threads:
+        thread.start()
+    try:
+        for swap in range(1, SWAPS + 1):
+            assert tls_config.deploy_certificate("example.com", *sources[swap % 2][0])
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    
+    assert not errors, errors[0]
+    assert sum(reads) > 0
+
+def test_old_versions_are_pruned_after_the_grace_period(cert_dir, tmp_path, monkeypatch):
+    sources = [make_pair(str(tmp_path / "src"), f"pair{i}") for i in range(2)]
+    versions_dir = os.path.join(cert_dir, ".versions", "example.com")
+    for swap in range(4):
+        tls_config.deploy_certificate("example.com", *sources[swap % 2][0])
+    
+    # Versions superseded within the grace period are kept for readers still opening them
+    assert len(os.listdir(versions_dir)) == 4
+    
+    monkeypatch.setattr(tls_config, "CERT_VERSION_GRACE", 0)
+    tls_config.deploy_certificate("example.com", *sources[0][0])
+    assert len(os.listdir(versions_dir)) == tls_config.CERT_VERSIONS_TO_KEEP
+
+def test_unchanged_pair_is_not_redeployed(cert_dir, tmp_path):
+    paths, _ = make_pair(str(tmp_path / "src"), "pair")
+    assert tls_config.deploy_certificate("example.com", *paths)
+    assert not tls_config.deploy_certificate("example.com", *paths)
+
+def test_legacy_directory_is_migrated(cert_dir, tmp_path):
+    legacy_dir = os.path.join(cert_dir, "example.com")
+    _, (key, cert) = make_pair(str(tmp_path / "src"), "legacy")
+    os.makedirs(legacy_dir)
+    with open(os.path.join(legacy_dir, "fullchain.pem"), 'wb') as f:
+        f.write(cert)
+    with open(os.path.join(legacy_dir, "privkey.pem"), 'wb') as f:
+        f.write(key)
+    
+    # The existing pair is kept rather than replaced by a new self-signed certificate
+    tls_config.create_self_signed_cert("example.com", cert_dir)
+    
+    assert os.path.islink(legacy_dir)
+    with open(os.path.join(legacy_dir, "chain.pem"), 'rb') as f:
+        assert split_chain(f.read()) == (key, cert)
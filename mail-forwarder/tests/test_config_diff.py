@@ -0,0 +1,117 @@
+"""
+Table-driven tests for the configuration diff engine: a changed environment
+variable maps to the configure steps, services and artifacts it affects.
+"""
+
+from dataclasses import fields, is_dataclass
+from fnmatch import fnmatchcase
+
+import pytest
+
+from config import ARTIFACTS, FIELD_ARTIFACTS, Configuration, ConfigDiff, FieldChange, diff_configs, \
+    from_environment, to_dict
+
+BASE_ENV = {
+    "SMTP_HOSTNAME": "mail.example.com",
+    "ACME_EMAIL": "admin@example.com",
+    "FORWARD_RULES": "info@example.com:me@example.net;sales@example.com:me@example.net",
+}
+
+POSTFIX_MAPS = {"/etc/postfix/virtual", "/etc/postfix/virtual_domains"}
+DKIM_TABLES = {"/etc/opendkim/key_table", "/etc/opendkim/key_table-ed25519", "/etc/opendkim/signing_table",
+               "/etc/opendkim/signing_table-ed25519", "/etc/opendkim/trusted_hosts", "/etc/opendkim/keys"}
+SUPERVISOR_CONF = "/etc/supervisor/conf.d/mail-forwarder.conf"
+
+CASES = [
+    # (changed variables, expected steps, expected services, expected artifacts)
+    pytest.param({"FORWARD_RULES": BASE_ENV["FORWARD_RULES"] + ";support@example.com:me@example.net"},
+                 {"postfix"}, {"postfix"}, POSTFIX_MAPS, id="add-rule"),
+    pytest.param({"FORWARD_RULES": "info@example.com:me@example.net"},
+                 {"postfix"}, {"postfix"}, POSTFIX_MAPS, id="remove-rule"),
+    pytest.param({"FORWARD_RULES": "sales@example.com:me@example.net;info@example.com:me@example.net"},
+                 set(), set(), set(), id="reorder-rules"),
+    # A rule for a new domain also extends the auto-configured DKIM and TLS domains
+    pytest.param({"FORWARD_RULES": BASE_ENV["FORWARD_RULES"] + ";info@example.org:me@example.net"},
+                 {"postfix", "opendkim", "tls"}, {"postfix", "opendkim"},
+                 POSTFIX_MAPS | DKIM_TABLES | {"/etc/postfix/main.cf", "/etc/postfix/certs", "/etc/postfix/tls_sni"},
+                 id="add-rule-for-new-domain"),
+    pytest.param({"DKIM_ISOLATE_LISTENERS": "true"},
+                 {"postfix", "supervisor"}, {"postfix", "supervisor"},
+                 {"/etc/postfix/main.cf", "/etc/postfix/master.cf", SUPERVISOR_CONF}, id="dkim-isolate-listeners"),
+    pytest.param({"DKIM_INSTANCES": "4"},
+                 {"postfix", "supervisor"}, {"postfix", "supervisor"},
+                 {"/etc/postfix/main.cf", "/etc/postfix/master.cf", SUPERVISOR_CONF}, id="dkim-instances-legacy"),
+    pytest.param({"DKIM_SELECTOR": "s2024"},
+                 {"opendkim"}, {"opendkim"},
+                 DKIM_TABLES - {"/etc/opendkim/trusted_hosts"} | {"/etc/opendkim/opendkim.conf"}, id="dkim-selector"),
+    pytest.param({"SRS_EXCLUDE_DOMAINS": "example.net"},
+                 {"postfix", "supervisor"}, {"postsrsd", "supervisor"},
+                 {"/etc/default/postsrsd", SUPERVISOR_CONF}, id="srs-exclude-domains"),
+    # srs.enabled matches the section wildcard first and still gets its own main.cf entry
+    pytest.param({"SRS_ENABLED": "false"},
+                 {"postfix", "supervisor"}, {"postfix", "postsrsd", "supervisor"},
+                 {"/etc/default/postsrsd", SUPERVISOR_CONF, "/etc/postfix/main.cf"}, id="srs-enabled"),
+    # logging.file has its own entry, so the logging.* wildcard must not add anything
+    pytest.param({"MAIL_LOG_FILE": "/var/log/postfix.log"},
+                 {"supervisor", "fail2ban"}, {"supervisor", "fail2ban"},
+                 {SUPERVISOR_CONF, "/etc/fail2ban/jail.d/postfix.conf"}, id="mail-log-file"),
+    pytest.param({"SMTP_RELAY_HOST": "relay.example.net"},
+                 {"postfix"}, {"postfix"},
+                 {"/etc/postfix/main.cf", "/etc/postfix/transport", "/etc/postfix/sasl_passwd"}, id="smtp-relay-host"),
+    # The relay timeouts are set on the relay pool's own transport, not for every smtp client
+    pytest.param({"SMTP_RELAY_TIMEOUT": "5"},
+                 {"postfix"}, {"postfix"}, {"/etc/postfix/master.cf"}, id="smtp-relay-timeout"),
+    pytest.param({"ACME_EMAIL": "certs@example.com"},
+                 {"tls"}, {"postfix"}, {"/etc/postfix/certs"}, id="acme-email"),
+    pytest.param({"TLS_CHALLENGE_TYPE": "http"},
+                 {"tls", "supervisor"}, {"postfix", "supervisor"}, {"/etc/postfix/certs", SUPERVISOR_CONF},
+                 id="tls-challenge-type"),
+]
+
+@pytest.mark.parametrize("changed,steps,services,artifacts", CASES)
+def test_changed_variable_maps_to_steps_services_and_artifacts(changed, steps, services, artifacts):
+    diff = diff_configs(from_environment(BASE_ENV), from_environment({**BASE_ENV, **changed}))
+
+    assert diff.artifacts == artifacts
+    assert diff.steps == steps
+    assert diff.services == services
+    assert bool(diff) == bool(artifacts)
+    for step in ("postfix", "opendkim", "tls", "fail2ban", "supervisor"):
+        assert diff.affects(step) == (step in steps)
+    for artifact in ARTIFACTS:
+        assert diff.regenerates(artifact) == (artifact in artifacts)
+
+def test_rule_changes_are_reported():
+    old = from_environment(BASE_ENV)
+    new = from_environment({**BASE_ENV, "FORWARD_RULES": "info@example.com:other@example.net"})
+    diff = diff_configs(old, new)
+
+    assert [rule.destination for rule in diff.added_rules] == ["other@example.net"]
+    assert sorted(rule.source for rule in diff.removed_rules) == ["info@example.com", "sales@example.com"]
+    assert diff.sections == {"forwarding_rules"}
+    assert diff.changed("forwarding_rules") and not diff.changed("smtp.*")
+
+def test_unknown_field_maps_to_everything():
+    diff = ConfigDiff(changes=[FieldChange("smtp.not_a_field", 1, 2)])
+
+    assert diff.artifacts == set(ARTIFACTS)
+    assert diff.steps == {step for step, _ in ARTIFACTS.values()}
+
+def test_field_without_artifacts_changes_nothing():
+    diff = ConfigDiff(changes=[FieldChange("debug", False, True)])
+
+    assert diff and diff.artifacts == set() and diff.steps == set()
+
+def test_identical_configurations_have_no_diff():
+    assert not diff_configs(from_environment(BASE_ENV), from_environment(BASE_ENV))
+
+def test_mapping_only_names_known_artifacts():
+    for pattern, paths in FIELD_ARTIFACTS:
+        assert set(paths) <= set(ARTIFACTS), pattern
+
+def test_every_field_has_a_mapping():
+    data = to_dict(Configuration())
+    for f in fields(Configuration):
+        paths = [f"{f.name}.{key}" for key in data[f.name]] if is_dataclass(f.type) else [f.name]
+        for path in paths:
+            assert any(fnmatchcase(path, pattern) for pattern, _ in FIELD_ARTIFACTS), f"{path} has no mapping"
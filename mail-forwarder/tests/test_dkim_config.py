@@ -0,0 +1,95 @@
+"""
+Tests for the rendered OpenDKIM configuration in each DKIM key algorithm mode.
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("jinja2")
+
+import dkim_config
+from config import Configuration
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "opendkim")
+
+@pytest.fixture
+def conf_dir(tmp_path, monkeypatch):
+    """Render into tmp_path instead of /etc/opendkim."""
+    monkeypatch.setattr(dkim_config, "TEMPLATES_DIR", TEMPLATES_DIR)
+    monkeypatch.setattr(dkim_config, "OPENDKIM_CONF_DIR", str(tmp_path))
+    monkeypatch.setattr(dkim_config, "OPENDKIM_KEYS_DIR", str(tmp_path / "keys"))
+    return tmp_path
+
+def render(conf_dir, key_algorithm):
+    config = Configuration()
+    config.dkim.domains = {"example.com"}
+    config.dkim.key_algorithm = key_algorithm
+    dkim_config.create_opendkim_configs(config)
+    return {name: (conf_dir / name).read_text() for name in os.listdir(conf_dir) if name != "keys"}
+
+def setting(conf, name):
+    return [line.split()[1] for line in conf.splitlines() if line.split()[:1] == [name]]
+
+def entries(table):
+    return [line for line in table.splitlines() if line and not line.startswith("#")]
+
+@pytest.mark.parametrize("key_algorithm,signature_algorithm,selector", [
+    ("rsa", "rsa-sha256", "mail"),
+    ("ed25519", "ed25519-sha256", "mail-ed25519"),
+])
+def test_single_algorithm(conf_dir, key_algorithm, signature_algorithm, selector):
+    files = render(conf_dir, key_algorithm)
+
+    assert sorted(files) == ["key_table", "opendkim.conf", "signing_table"]
+    conf = files["opendkim.conf"]
+    assert setting(conf, "SignatureAlgorithm") == [signature_algorithm]
+    assert setting(conf, "Mode") == ["sv"]
+    assert setting(conf, "Socket") == ["local:/var/run/opendkim/opendkim.sock"]
+    assert entries(files["key_table"]) == [
+        f"{selector}._domainkey.example.com example.com:{selector}:{conf_dir}/keys/example.com/{selector}.private"]
+    assert entries(files["signing_table"]) == [f"*@example.com {selector}._domainkey.example.com"]
+
+def test_dual_runs_one_signer_per_algorithm(conf_dir):
+    files = render(conf_dir, "dual")
+
+    assert sorted(files) == ["key_table", "key_table-ed25519", "opendkim-ed25519.conf", "opendkim.conf",
+                             "signing_table", "signing_table-ed25519"]
+
+    rsa, ed25519 = files["opendkim.conf"], files["opendkim-ed25519.conf"]
+    assert setting(rsa, "SignatureAlgorithm") == ["rsa-sha256"]
+    assert setting(ed25519, "SignatureAlgorithm") == ["ed25519-sha256"]
+    # Only one of them verifies inbound mail
+    assert setting(rsa, "Mode") == ["sv"] and setting(ed25519, "Mode") == ["s"]
+    assert setting(ed25519, "Socket") == ["local:/var/run/opendkim/opendkim-ed25519.sock"]
+    assert setting(rsa, "KeyTable") == [str(conf_dir / "key_table")]
+    assert setting(ed25519, "KeyTable") == [str(conf_dir / "key_table-ed25519")]
+    assert setting(ed25519, "SigningTable") == [str(conf_dir / "signing_table-ed25519")]
+
+    # Each signer only sees the keys of its own algorithm
+    assert entries(files["signing_table"]) == ["*@example.com mail._domainkey.example.com"]
+    assert entries(files["signing_table-ed25519"]) == ["*@example.com mail-ed25519._domainkey.example.com"]
+    assert entries(files["key_table"]) == [
+        f"mail._domainkey.example.com example.com:mail:{conf_dir}/keys/example.com/mail.private"]
+    assert entries(files["key_table-ed25519"]) == [
+        f"mail-ed25519._domainkey.example.com example.com:mail-ed25519:{conf_dir}/keys/example.com/mail-ed25519.private"]
+
+def test_leaving_dual_removes_the_second_signer(conf_dir):
+    render(conf_dir, "dual")
+    files = render(conf_dir, "rsa")
+
+    assert sorted(files) == ["key_table", "opendkim.conf", "signing_table"]
+
+@pytest.mark.parametrize("key_algorithm,isolate,listener,expected", [
+    ("rsa", False, "smtp", "unix:/var/run/opendkim/opendkim.sock"),
+    ("dual", False, "smtp", "unix:/var/run/opendkim/opendkim.sock,unix:/var/run/opendkim/opendkim-ed25519.sock"),
+    ("dual", True, "submission",
+     "unix:/var/run/opendkim/opendkim-1.sock,unix:/var/run/opendkim/opendkim-ed25519-1.sock"),
+    ("ed25519", True, "non_smtpd", "unix:/var/run/opendkim/opendkim-3.sock"),
+])
+def test_milters_chain_every_signer(key_algorithm, isolate, listener, expected):
+    config = Configuration()
+    config.dkim.key_algorithm = key_algorithm
+    config.dkim.isolate_listeners = isolate
+
+    assert config.dkim.milters_for(listener) == expected
@@ -0,0 +1,129 @@
+"""
+Tests for the rendered relay configuration: the relay pool's randmap, its
+timeouts on the dedicated master.cf transport, and the sender relay maps.
+"""
+
+import os
+
+import pytest
+
+pytest.importorskip("jinja2")
+
+import postfix_config
+import utils
+from config import from_environment
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates", "postfix")
+
+BASE_ENV = {
+    "SMTP_HOSTNAME": "mail.example.com",
+    "ACME_EMAIL": "admin@example.com",
+    "FORWARD_RULES": "info@example.com:me@example.net",
+    "SRS_ENABLED": "false",
+    "SMTP_RELAY_TIMEOUT": "7",
+}
+
+SENDER_RELAYS = "example.com=smtp.provider1.com:587:user:password;example.net=smtp.provider2.com:2525"
+
+@pytest.fixture
+def conf_dir(tmp_path, monkeypatch):
+    """Render into tmp_path instead of /etc/postfix, without running postmap or reloading Postfix."""
+    monkeypatch.setattr(postfix_config, "TEMPLATES_DIR", TEMPLATES_DIR)
+    monkeypatch.setattr(postfix_config, "POSTFIX_CONF_DIR", str(tmp_path))
+    for name in ("VIRTUAL_ALIAS_FILE", "VIRTUAL_DOMAINS_FILE", "TRANSPORT_MAP_FILE", "SASL_PASSWD_FILE",
+                 "SENDER_RELAY_FILE", "SENDER_TRANSPORT_FILE"):
+        path = tmp_path / os.path.basename(getattr(postfix_config, name))
+        monkeypatch.setattr(postfix_config, name, str(path))
+    monkeypatch.setattr(postfix_config, "render_template",
+                        lambda template, output, context, service=None: utils.render_template(template, output, context))
+    monkeypatch.setattr(postfix_config.subprocess, "run", lambda args, **kwargs: open(f"{args[-1]}.db", "w").close())
+    return tmp_path
+
+def render(conf_dir, **env):
+    config = from_environment({**BASE_ENV, **env})
+    config.validate()
+    postfix_config.configure_postfix(config)
+    return {name: (conf_dir / name).read_text() for name in os.listdir(conf_dir) if not name.endswith(".db")}
+
+def setting(conf, name):
+    return [line.split(" = ", 1)[1] for line in conf.splitlines() if line.startswith(f"{name} = ")]
+
+def service(master_cf, name, kind="unix"):
+    """A master.cf service entry with its -o overrides, or None."""
+    lines = master_cf.splitlines()
+    for i, line in enumerate(lines):
+        if line.split()[:2] == [name, kind]:
+            overrides = []
+            for option in lines[i + 1:]:
+                if not option.startswith("  -o "):
+                    break
+                overrides.append(option[len("  -o "):])
+            return line.split(), overrides
+    return None
+
+def entries(table):
+    return [line for line in table.splitlines() if line and not line.startswith("#")]
+
+def test_single_relay_is_the_relayhost(conf_dir):
+    files = render(conf_dir, SMTP_RELAY_HOST="relay.example.net", SMTP_RELAY_PORT="587")
+
+    assert setting(files["main.cf"], "relayhost") == ["[relay.example.net]:587"]
+    assert setting(files["main.cf"], "sender_dependent_default_transport_maps") == []
+    assert service(files["master.cf"], "relaypool") is None
+
+def test_two_relays_fail_over_to_each_other(conf_dir):
+    files = render(conf_dir, SMTP_RELAYS="smtp1.example.com:587;smtp2.example.com:2525")
+
+    assert setting(files["main.cf"], "relayhost") == []
+    assert setting(files["main.cf"], "sender_dependent_default_transport_maps") == [
+        "randmap:{{relaypool:[smtp1.example.com]:587, [smtp2.example.com]:2525}, "
+        "{relaypool:[smtp2.example.com]:2525, [smtp1.example.com]:587}}"]
+
+def test_weighted_relays_repeat_by_weight_and_fail_over_by_weight(conf_dir):
+    files = render(conf_dir, SMTP_RELAYS="a.example.com:587:1;b.example.com:587:3;c.example.com:587:2")
+
+    assert setting(files["main.cf"], "sender_dependent_default_transport_maps") == [
+        "randmap:{"
+        "{relaypool:[a.example.com]:587, [b.example.com]:587, [c.example.com]:587}, "
+        + ", ".join(["{relaypool:[b.example.com]:587, [c.example.com]:587, [a.example.com]:587}"] * 3) + ", "
+        + ", ".join(["{relaypool:[c.example.com]:587, [b.example.com]:587, [a.example.com]:587}"] * 2) + "}"]
+
+def test_relay_timeouts_only_apply_to_the_relay_pool_transport(conf_dir):
+    files = render(conf_dir, SMTP_RELAYS="smtp1.example.com:587;smtp2.example.com:587",
+                   SMTP_DELIVERY_POOLS="slow:2:example.org",
+                   SMTP_FALLBACK_RELAY_HOST="fallback.example.net")
+
+    main_cf, master_cf = files["main.cf"], files["master.cf"]
+    assert "smtp_connect_timeout" not in main_cf and "smtp_helo_timeout" not in main_cf
+    assert service(master_cf, "relaypool") == (
+        ["relaypool", "unix", "-", "-", "y", "-", "-", "smtp"],
+        ["syslog_name=postfix/relaypool", "smtp_connect_timeout=7s", "smtp_helo_timeout=7s"])
+    assert service(master_cf, "smtp") == (["smtp", "unix", "-", "-", "y", "-", "-", "smtp"], [])
+    assert service(master_cf, "slow") == (["slow", "unix", "-", "-", "y", "-", "2", "smtp"],
+                                          ["syslog_name=postfix/slow"])
+    assert entries(files["transport"]) == ["example.org slow:[smtp1.example.com]:587, [smtp2.example.com]:587"]
+
+def test_sender_relays_with_a_single_relay(conf_dir):
+    files = render(conf_dir, SMTP_RELAY_HOST="relay.example.net", SMTP_SENDER_RELAYS=SENDER_RELAYS)
+
+    assert setting(files["main.cf"], "sender_dependent_relayhost_maps") == [
+        f"hash:{conf_dir}/sender_relay"]
+    assert setting(files["main.cf"], "sender_dependent_default_transport_maps") == []
+    assert entries(files["sender_relay"]) == ["@example.com [smtp.provider1.com]:587",
+                                              "@example.net [smtp.provider2.com]:2525"]
+    assert "sender_transport" not in files
+
+def test_sender_relays_are_listed_in_front_of_the_randmap(conf_dir):
+    files = render(conf_dir, SMTP_RELAYS="smtp1.example.com:587:2;smtp2.example.com:587",
+                   SMTP_SENDER_RELAYS=SENDER_RELAYS)
+
+    assert setting(files["main.cf"], "sender_dependent_default_transport_maps") == [
+        f"hash:{conf_dir}/sender_transport, randmap:{{"
+        "{relaypool:[smtp1.example.com]:587, [smtp2.example.com]:587}, "
+        "{relaypool:[smtp1.example.com]:587, [smtp2.example.com]:587}, "
+        "{relaypool:[smtp2.example.com]:587, [smtp1.example.com]:587}}"]
+    # Sender relays are single relays, so they keep the default smtp transport and its timeouts
+    assert entries(files["sender_transport"]) == ["@example.com smtp:[smtp.provider1.com]:587",
+                                                  "@example.net smtp:[smtp.provider2.com]:2525"]
+    assert entries(files["sender_relay"]) == ["@example.com [smtp.provider1.com]:587",
+                                              "@example.net [smtp.provider2.com]:2525"]
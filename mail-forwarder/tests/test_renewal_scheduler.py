@@ -0,0 +1,125 @@
+"""
+Tests for the renewal scheduling, backoff and batching in renewal_scheduler.
+"""
+
+import subprocess
+
+import pytest
+
+import renewal_scheduler
+from renewal_scheduler import CertificateState, DAY_SECONDS, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS
+
+NOW = 1_700_000_000.0
+RENEWAL_DAYS = 7
+STAGGER_DAYS = 3
+
+def expiring_in(days):
+    return NOW + days * DAY_SECONDS
+
+def test_certificate_outside_the_window_is_not_scheduled():
+    state = {}
+    due = renewal_scheduler.schedule_renewals({"a.example": expiring_in(30)}, state, NOW, RENEWAL_DAYS, STAGGER_DAYS)
+
+    assert due == []
+    assert state["a.example"].scheduled_at is None
+
+@pytest.mark.parametrize("days_left", [10, 9, 8.5, 7.01])
+def test_slot_is_inside_the_window(days_left):
+    expires_at = expiring_in(days_left)
+    deadline = expires_at - RENEWAL_DAYS * DAY_SECONDS
+    for _ in range(50):
+        state = {}
+        renewal_scheduler.schedule_renewals({"a.example": expires_at}, state, NOW, RENEWAL_DAYS, STAGGER_DAYS)
+        assert NOW <= state["a.example"].scheduled_at <= deadline
+
+def test_certificate_past_the_deadline_is_due_now():
+    state = {}
+    due = renewal_scheduler.schedule_renewals({"a.example": expiring_in(2)}, state, NOW, RENEWAL_DAYS, STAGGER_DAYS)
+
+    assert due == ["a.example"]
+    assert state["a.example"].scheduled_at == NOW
+
+def test_due_certificates_are_sorted_by_urgency_and_respect_backoff():
+    inventory = {"late.example": expiring_in(5), "urgent.example": expiring_in(1), "waiting.example": expiring_in(3)}
+    state = {"waiting.example": CertificateState("waiting.example", inventory["waiting.example"],
+                                                 scheduled_at=NOW - 1, next_attempt_at=NOW + 60, failures=1)}
+
+    due = renewal_scheduler.schedule_renewals(inventory, state, NOW, RENEWAL_DAYS, STAGGER_DAYS)
+
+    assert due == ["urgent.example", "late.example"]
+
+def test_state_resets_when_the_certificate_was_renewed():
+    state = {"a.example": CertificateState("a.example", expiring_in(2), scheduled_at=NOW - 1,
+                                           next_attempt_at=NOW + 3600, failures=3, last_error="boom")}
+
+    due = renewal_scheduler.schedule_renewals({"a.example": expiring_in(90)}, state, NOW, RENEWAL_DAYS, STAGGER_DAYS)
+
+    assert due == []
+    assert state["a.example"] == CertificateState("a.example", expiring_in(90))
+
+def test_unmanaged_certificates_are_forgotten():
+    state = {"gone.example": CertificateState("gone.example", expiring_in(30))}
+    renewal_scheduler.schedule_renewals({}, state, NOW, RENEWAL_DAYS, STAGGER_DAYS)
+
+    assert state == {}
+
+def test_backoff_doubles_and_is_capped():
+    entry = CertificateState("a.example", expiring_in(2))
+    delays = []
+    for _ in range(10):
+        renewal_scheduler.record_failure(entry, NOW, "failed")
+        delays.append(entry.next_attempt_at - NOW)
+
+    assert RETRY_BASE_SECONDS * 0.8 <= delays[0] <= RETRY_BASE_SECONDS * 1.2
+    assert 2 * RETRY_BASE_SECONDS * 0.8 <= delays[1] <= 2 * RETRY_BASE_SECONDS * 1.2
+    assert all(delay <= RETRY_MAX_SECONDS * 1.2 for delay in delays)
+    assert delays[-1] >= RETRY_MAX_SECONDS * 0.8
+    assert entry.failures == 10 and entry.last_error == "failed"
+
+def test_success_clears_the_backoff():
+    entry = CertificateState("a.example", expiring_in(2), next_attempt_at=NOW + 3600, failures=4, last_error="x")
+    renewal_scheduler.record_success(entry, NOW)
+
+    assert (entry.failures, entry.last_error, entry.next_attempt_at, entry.last_renewed_at) == (0, None, 0.0, NOW)
+
+@pytest.fixture
+def certbot(monkeypatch):
+    """Record certbot runs and Postfix stops/starts; domains in `failing` fail the given methods."""
+    calls = []
+    failing = {}
+
+    def renew_certificate(domain, challenges):
+        method = "tls-alpn" if "tls-alpn-01" in challenges[0] else "http"
+        calls.append((domain, method))
+        if method in failing.get(domain, ()):
+            raise subprocess.CalledProcessError(1, "certbot")
+
+    monkeypatch.setattr(renewal_scheduler, "renew_certificate", renew_certificate)
+    monkeypatch.setattr(renewal_scheduler.supervisor_client, "stop", lambda program: calls.append(("stop", program)))
+    monkeypatch.setattr(renewal_scheduler.supervisor_client, "start",
+                        lambda program, wait=False: calls.append(("start", program)))
+    return calls, failing
+
+def test_postfix_is_stopped_once_per_batch(certbot):
+    calls, _ = certbot
+    results = renewal_scheduler.renew_certificates(["a.example", "b.example"], "tls-alpn")
+
+    assert results == {"a.example": None, "b.example": None}
+    assert calls == [("stop", "postfix"), ("a.example", "tls-alpn"), ("b.example", "tls-alpn"), ("start", "postfix")]
+
+def test_http_challenge_leaves_postfix_alone(certbot):
+    calls, _ = certbot
+    renewal_scheduler.renew_certificates(["a.example"], "http")
+
+    assert calls == [("a.example", "http")]
+
+def test_fallback_only_retries_failed_certificates(certbot):
+    calls, failing = certbot
+    failing["b.example"] = {"http"}
+    failing["c.example"] = {"http", "tls-alpn"}
+
+    results = renewal_scheduler.renew_certificates(["a.example", "b.example", "c.example"], "http")
+
+    assert results["a.example"] is None and results["b.example"] is None and results["c.example"]
+    assert calls[3:] == [("stop", "postfix"), ("b.example", "tls-alpn"), ("c.example", "tls-alpn"),
+                         ("start", "postfix")]
@@ -0,0 +1,79 @@
+"""
+Tests for the configuration snapshot decision in snapshot.py.
+"""
+
+import os
+
+import pytest
+
+import snapshot
+from config import Configuration
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    """Keep the snapshot, its inputs and the captured files below tmp_path."""
+    generated = tmp_path / "etc" / "postfix"
+    generated.mkdir(parents=True)
+    (generated / "main.cf").write_text("myhostname = mail.example.com\n")
+    live = tmp_path / "live"
+    live.mkdir()
+
+    monkeypatch.setattr(snapshot, "STATE_DIR", str(tmp_path / "state"))
+    monkeypatch.setattr(snapshot, "SNAPSHOT_FILE", str(tmp_path / "state" / "snapshot.tar"))
+    monkeypatch.setattr(snapshot, "SNAPSHOT_META_FILE", str(tmp_path / "state" / "snapshot.json"))
+    monkeypatch.setattr(snapshot, "CODE_DIRS", [])
+    monkeypatch.setattr(snapshot, "DKIM_KEYS_DIR", str(tmp_path / "keys"))
+    monkeypatch.setattr(snapshot, "LETSENCRYPT_LIVE_DIR", str(live))
+    monkeypatch.setattr(snapshot, "SNAPSHOT_PATHS", [str(generated)])
+    return live
+
+def make_config(use_letsencrypt=True, key_algorithm="rsa"):
+    config = Configuration()
+    config.security.fail2ban_enabled = False
+    config.tls.domains = {"mail.example.com"}
+    config.tls.use_letsencrypt = use_letsencrypt
+    config.tls.key_algorithm = key_algorithm
+    return config
+
+def issue(live, cert_name):
+    os.makedirs(live / cert_name)
+    (live / cert_name / "privkey.pem").write_text("key")
+    (live / cert_name / "fullchain.pem").write_text("cert")
+
+def test_snapshot_is_not_saved_while_letsencrypt_falls_back(paths):
+    config = make_config()
+    snapshot.save_snapshot(config)
+
+    assert not os.path.exists(snapshot.SNAPSHOT_META_FILE)
+    assert not snapshot.restore_snapshot(config)
+
+def test_snapshot_is_restored_once_issued(paths):
+    config = make_config()
+    issue(paths, "mail.example.com")
+    snapshot.save_snapshot(config)
+
+    assert snapshot.restore_snapshot(config)
+
+def test_every_lineage_must_be_issued(paths):
+    config = make_config(key_algorithm="dual")
+    issue(paths, "mail.example.com")
+
+    assert snapshot.missing_letsencrypt_certificates(config) == ["mail.example.com-ecdsa"]
+    snapshot.save_snapshot(config)
+    assert not os.path.exists(snapshot.SNAPSHOT_META_FILE)
+
+def test_self_signed_only_is_snapshotted(paths):
+    config = make_config(use_letsencrypt=False)
+    snapshot.save_snapshot(config)
+
+    assert snapshot.restore_snapshot(config)
+
+def test_snapshot_is_not_restored_when_a_certificate_disappears(paths):
+    config = make_config()
+    issue(paths, "mail.example.com")
+    snapshot.save_snapshot(config)
+
+    os.remove(paths / "mail.example.com" / "fullchain.pem")
+    os.remove(paths / "mail.example.com" / "privkey.pem")
+
+    assert not snapshot.restore_snapshot(config)
@@ -0,0 +1,161 @@
+"""
+Tests for the native SRS server: compatibility with addresses minted by
+postsrsd (libsrs2), exclusions, the rewrite cache and the socketmap parser.
+"""
+
+import asyncio
+
+import pytest
+
+import srs_server
+from srs_server import LRUCache, SRSRewriter, SocketmapServer, DAY_SECONDS, MAX_REQUEST_LENGTH
+
+# postsrsd's own unit test vector: secret "tops3cr3t", day 18261 (2019-12-31, timestamp "2V")
+SECRET = "tops3cr3t"
+NOW = 18261 * DAY_SECONDS + 3600
+POSTSRSD_SRS0 = "SRS0=XjO9=2V=otherdomain.com=test@example.com"
+# The same address wrapped by a second hop with the libsrs2 SRS1 construction, HMAC over (host, "=" + user)
+POSTSRSD_SRS1 = "SRS1=yMb7=example.com==XjO9=2V=otherdomain.com=test@forwarder.net"
+
+def test_forward_matches_postsrsd():
+    rewriter = SRSRewriter("example.com", [SECRET])
+
+    assert rewriter.forward("test@otherdomain.com", NOW) == POSTSRSD_SRS0
+
+def test_reverse_accepts_postsrsd_addresses():
+    rewriter = SRSRewriter("example.com", [SECRET])
+
+    assert rewriter.reverse(POSTSRSD_SRS0, NOW) == "test@otherdomain.com"
+
+def test_srs0_is_wrapped_into_srs1():
+    rewriter = SRSRewriter("forwarder.net", [SECRET])
+
+    assert rewriter.forward(POSTSRSD_SRS0, NOW) == POSTSRSD_SRS1
+    assert rewriter.reverse(POSTSRSD_SRS1, NOW) == "SRS0=XjO9=2V=otherdomain.com=test@example.com"
+
+def test_srs1_keeps_pointing_at_the_srs0_host():
+    rewriter = SRSRewriter("third.org", [SECRET])
+
+    assert rewriter.forward(POSTSRSD_SRS1, NOW) == "SRS1=yMb7=example.com==XjO9=2V=otherdomain.com=test@third.org"
+
+def test_hash_and_case_folding():
+    rewriter = SRSRewriter("example.com", [SECRET])
+
+    # The hash is computed over lower-cased parts, the address keeps its case
+    assert rewriter.forward("TEST@OtherDomain.COM", NOW) == "SRS0=XjO9=2V=OtherDomain.COM=TEST@example.com"
+    # Mail systems may lower-case the whole address on the way back
+    assert rewriter.reverse(POSTSRSD_SRS0.lower(), NOW) == "test@otherdomain.com"
+    assert rewriter.reverse(POSTSRSD_SRS0.upper(), NOW) == "TEST@OTHERDOMAIN.COM"
+
+def test_reverse_rejects_bad_hash_expired_and_foreign_addresses():
+    rewriter = SRSRewriter("example.com", [SECRET])
+
+    assert rewriter.reverse("SRS0=XjO8=2V=otherdomain.com=test@example.com", NOW) is None
+    assert rewriter.reverse(POSTSRSD_SRS0, NOW + 22 * DAY_SECONDS) is None
+    assert rewriter.reverse(POSTSRSD_SRS0, NOW + 21 * DAY_SECONDS) == "test@otherdomain.com"
+    assert rewriter.reverse("SRS0=XjO9=2V=otherdomain.com=test@other.example", NOW) is None
+    assert rewriter.reverse("SRS0=XjO9=2V=otherdomain.com@example.com", NOW) is None
+
+def test_retired_secrets_still_reverse():
+    rewriter = SRSRewriter("example.com", ["new-secret", SECRET])
+
+    assert rewriter.reverse(POSTSRSD_SRS0, NOW) == "test@otherdomain.com"
+    assert rewriter.forward("test@otherdomain.com", NOW) != POSTSRSD_SRS0
+
+def test_timestamp_wraps_around():
+    rewriter = SRSRewriter("example.com", [SECRET])
+    minted = rewriter.forward("test@otherdomain.com", 1023 * DAY_SECONDS)
+
+    assert rewriter.reverse(minted, 1025 * DAY_SECONDS) == "test@otherdomain.com"
+
+@pytest.mark.parametrize("sender,excluded", [
+    ("user@excluded.org", True),
+    ("user@EXCLUDED.ORG", True),
+    ("user@sub.excluded.org", False),
+    ("user@example.net", False),
+    ("user@sub.example.net", True),
+    ("user@deep.sub.example.net", True),
+    ("user@notexample.net", False),
+    ("user@example.com", True),  # The SRS domain itself
+])
+def test_exclusions(sender, excluded):
+    rewriter = SRSRewriter("example.com", [SECRET], ["excluded.org", ".example.net"])
+
+    assert (rewriter.forward(sender, NOW) is None) == excluded
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert (cache.hits, cache.misses) == (3, 1)
+
+def test_forward_lookups_are_cached_per_day(monkeypatch):
+    server = SocketmapServer(SRSRewriter("example.com", [SECRET]), cache_size=1)
+    monkeypatch.setattr(srs_server.time, "time", lambda: NOW)
+
+    assert server.lookup("forward", "test@otherdomain.com") == ("OK", POSTSRSD_SRS0)
+    assert server.lookup("forward", "test@otherdomain.com") == ("OK", POSTSRSD_SRS0)
+    assert server.cache.hits == 1
+    assert server.lookup("reverse", POSTSRSD_SRS0) == ("OK", "test@otherdomain.com")
+    assert server.lookup("forward", "user@example.com") == ("NOTFOUND", "")
+    assert server.lookup("other", "x")[0] == "PERM"
+
+def read_netstring(data: bytes, limit: int = 2 ** 16):
+    async def read():
+        reader = asyncio.StreamReader(limit=limit)
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await SocketmapServer(SRSRewriter("example.com", [SECRET]))._read_netstring(reader)
+    return asyncio.run(read())
+
+def test_netstring_parser():
+    assert read_netstring(b"7:forward,") == b"forward"
+    assert read_netstring(b"") is None
+
+@pytest.mark.parametrize("data,error", [
+    (b"7:forward;", ValueError),  # Missing ","
+    (b"x:forward,", ValueError),  # Not a length
+    (b"%d:" % (MAX_REQUEST_LENGTH + 1), ValueError),  # Longer than Postfix ever sends
+    (b"9" * 100, asyncio.LimitOverrunError),  # No ":" within the buffer limit
+    (b"20:forward,", asyncio.IncompleteReadError),  # Connection closed mid-request
+])
+def test_netstring_parser_errors(data, error):
+    with pytest.raises(error):
+        read_netstring(data, limit=64)
+
+class FakeWriter:
+    def __init__(self):
+        self.data = b""
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+@pytest.mark.parametrize("garbage", [b"9" * 100, b"7:forward;"])
+def test_handle_answers_then_closes_on_a_bad_request(garbage, monkeypatch):
+    monkeypatch.setattr(srs_server.time, "time", lambda: NOW)
+
+    async def handle():
+        reader = asyncio.StreamReader(limit=64)
+        request = b"forward test@otherdomain.com"
+        reader.feed_data(b"%d:%s," % (len(request), request) + garbage)
+        reader.feed_eof()
+        writer = FakeWriter()
+        await SocketmapServer(SRSRewriter("example.com", [SECRET])).handle(reader, writer)
+        return writer
+
+    writer = asyncio.run(handle())
+    assert writer.closed
+    reply = f"OK {POSTSRSD_SRS0}".encode()
+    assert writer.data == b"%d:%s," % (len(reply), reply)
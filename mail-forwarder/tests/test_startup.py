@@ -0,0 +1,20 @@
+"""
+Startup regression test: each entrypoint command's imports are compared with
+the checked-in baseline in benchmarks/startup_baseline.json.
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import startup_benchmark
+
+BASELINE = startup_benchmark.load_baseline()
+
+@pytest.mark.parametrize("command", sorted(BASELINE["commands"]))
+def test_command_imports_match_baseline(command):
+    _, problems = startup_benchmark.check(command, BASELINE)
+    assert not problems, f"{command}: {'; '.join(problems)}"
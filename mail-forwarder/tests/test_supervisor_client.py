@@ -0,0 +1,19 @@
+"""
+Tests for the supervisord client.
+"""
+
+import supervisor_client
+
+def test_wait_for_running_returns_when_nothing_is_watched(monkeypatch):
+    monkeypatch.setattr(supervisor_client, "is_available", lambda: True)
+    monkeypatch.setattr(supervisor_client, "get_process_states", lambda: {"postfix": "STARTING"})
+
+    assert supervisor_client.wait_for_running(timeout=5, programs=["srs-server"])
+
+def test_wait_for_running_fails_on_fatal(monkeypatch):
+    states = iter([{"postfix": "STARTING"}, {"postfix": "STARTING"}, {"postfix": "FATAL"}])
+    monkeypatch.setattr(supervisor_client, "is_available", lambda: True)
+    monkeypatch.setattr(supervisor_client, "get_process_states", lambda: next(states))
+    monkeypatch.setattr(supervisor_client, "POLL_INTERVAL", 0)
+
+    assert not supervisor_client.wait_for_running(timeout=5)